@@ -0,0 +1,99 @@
+"""
+BookSerializer vs the BookRowSerializer fast path.
+
+Seeds a throwaway SQLite database with benchmarks.seed and, for each row
+count, times query + serialize + JSON render of the newest N books three ways:
+
+  model          Book.objects as BookListView queries it (owner fetched per row
+                 by StringRelatedField)
+  model+join     the same with select_related('owner')
+  values         .values() rows through BookRowSerializer
+
+The fragment cache is switched off so every run pays the full serializer
+cost, and each run checks that the rendered bytes are identical.
+
+    python -m benchmarks.book_list_fast_path --rows 100 1000 10000 --iterations 10
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'borrowedwords.settings')
+
+import django  # noqa: E402
+
+from benchmarks.page_latency import percentile  # noqa: E402
+
+
+def strategies(context):
+    from books.models import Book
+    from books.serializers import BookRowSerializer, BookSerializer
+
+    newest = Book.objects.order_by('-created_at', '-id')
+    return {
+        'model': lambda n: BookSerializer(
+            newest[:n], many=True, context=context).data,
+        'model+join': lambda n: BookSerializer(
+            newest.select_related('owner')[:n], many=True, context=context).data,
+        'values': lambda n: BookRowSerializer(
+            newest.values(*BookRowSerializer.value_columns())[:n], context=context).data,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+    from benchmarks.seed import seed
+    from books.serializers import BookSerializer
+
+    setup_test_environment()
+    logging.getLogger('utils.timing').setLevel(logging.WARNING)
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+    db_file.close()
+    connection.settings_dict['TEST']['NAME'] = db_file.name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    BookSerializer.fragment_cache = False
+
+    try:
+        seed(users=50, books=max(args.rows), transactions=0, seed=args.seed)
+        context = {'request': APIRequestFactory().get('/api/books/')}
+        renderer = JSONRenderer()
+
+        print(f"{'rows':>7}  {'path':<12}{'p50 ms':>10}{'p95 ms':>10}{'µs/row':>9}{'speed-up':>10}")
+        for rows in args.rows:
+            rendered = {}
+            medians = {}
+            for name, build in strategies(context).items():
+                renderer.render(build(rows))  # warm-up
+                samples = []
+                for _ in range(args.iterations):
+                    start = time.perf_counter()
+                    body = renderer.render(build(rows))
+                    samples.append((time.perf_counter() - start) * 1000)
+                rendered[name] = body
+                medians[name] = statistics.median(samples)
+                print(f'{rows:>7}  {name:<12}{medians[name]:>10.2f}'
+                      f'{percentile(samples, 95):>10.2f}'
+                      f'{medians[name] * 1000 / rows:>9.1f}'
+                      f"{medians['model'] / medians[name]:>9.1f}x")
+            if len(set(rendered.values())) != 1:
+                raise RuntimeError(f'Rendered output differs at {rows} rows')
+    finally:
+        connection.creation.destroy_test_db(db_file.name, verbosity=0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
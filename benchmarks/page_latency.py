@@ -0,0 +1,151 @@
+"""
+Page latency benchmark for the two APIClient transports.
+
+Seeds a throwaway SQLite database, logs in through the real login page and
+times the template views once with the in-process transport and once with
+the HTTP transport against a local threaded WSGI server.
+
+    python -m benchmarks.page_latency --iterations 50 --books 200
+"""
+import argparse
+import logging
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'borrowedwords.settings')
+
+import django  # noqa: E402
+
+
+PASSWORD = 'bench-pass-123'
+
+
+def seed(book_count):
+    from entities.models import User
+    from books.models import Book
+    from transactions.models import BorrowTransaction
+
+    owner = User.objects.create_user('bench_owner', 'owner@example.com', PASSWORD,
+                                     location='Nairobi')
+    borrower = User.objects.create_user('bench_borrower', 'borrower@example.com', PASSWORD,
+                                        location='Nairobi')
+
+    genres = [choice for choice, _ in Book.GENRE_CHOICES]
+    Book.objects.bulk_create([
+        Book(owner=owner, title=f'Book {i}', author=f'Author {i % 37}',
+             description='A perfectly ordinary book. ' * 5,
+             genre=genres[i % len(genres)], location=owner.location)
+        for i in range(book_count)
+    ])
+
+    books = list(Book.objects.all()[:20])
+    BorrowTransaction.objects.bulk_create([
+        BorrowTransaction(book=book, borrower=borrower, lender=owner, status='PENDING')
+        for book in books
+    ])
+    return owner, books[0]
+
+
+def start_server():
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def setup(self):
+            super().setup()
+            # Like gunicorn/uwsgi; without it keep-alive connections stall on
+            # Nagle + delayed ACK because wsgiref writes headers and body separately
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def time_pages(pages, iterations, username):
+    from django.test import Client
+
+    client = Client()
+    response = client.post('/login/', {'username': username, 'password': PASSWORD})
+    if response.status_code != 302:
+        raise RuntimeError('Benchmark login failed')
+
+    results = {}
+    for path in pages:
+        client.get(path)  # warm-up
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = client.get(path)
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 500:
+                raise RuntimeError(f'{path} returned {response.status_code}')
+        results[path] = samples
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--books', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+
+    setup_test_environment()
+    # Keep the per-request timing lines out of the output
+    logging.getLogger('utils.timing').setLevel(logging.WARNING)
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+    db_file.close()
+    connection.settings_dict['TEST']['NAME'] = db_file.name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    try:
+        owner, book = seed(args.books)
+        pages = ['/', '/books/', f'/books/{book.id}/', '/my-books/',
+                 '/transactions/', '/dashboard/']
+
+        server = start_server()
+        report = {}
+        try:
+            for transport in ('inprocess', 'http'):
+                settings.API_CLIENT_TRANSPORT = transport
+                settings.API_BASE_URL = f'http://127.0.0.1:{server.server_port}'
+                report[transport] = time_pages(pages, args.iterations, owner.username)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        print(f"{'page':<22}{'transport':<12}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+        for path in pages:
+            for transport, results in report.items():
+                samples = results[path]
+                print(f"{path:<22}{transport:<12}"
+                      f"{statistics.median(samples):>10.2f}"
+                      f"{percentile(samples, 95):>10.2f}"
+                      f"{statistics.mean(samples):>10.2f}")
+    finally:
+        connection.creation.destroy_test_db(db_file.name, verbosity=0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
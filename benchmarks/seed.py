@@ -0,0 +1,116 @@
+"""
+Deterministic data generator for benchmarks.
+
+Builds users, books and borrow transactions with bulk_create in a realistic
+mix: most loans are finished, a fair share are pending or rejected, and books
+that are currently lent out are marked unavailable. The same `seed` always
+produces the same rows.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+PASSWORD = 'bench-pass-123'
+
+# (status, weight) for generated transactions
+STATUS_MIX = [
+    ('COMPLETED', 40),
+    ('PENDING', 15),
+    ('REJECTED', 15),
+    ('ACCEPTED', 12),
+    ('CANCELLED', 10),
+    ('RETURNED', 5),
+    ('BORROWED', 3),
+]
+
+TITLE_WORDS = ['Night', 'River', 'Empire', 'Garden', 'Shadow', 'Winter', 'Silent',
+               'Glass', 'Salt', 'Crown', 'Orchard', 'Harbour', 'Letters', 'Storm',
+               'Atlas', 'Ember', 'Lantern', 'Paper', 'Stone', 'Tide']
+SURNAMES = ['Achebe', 'Adichie', 'Ngugi', 'Austen', 'Herbert', 'Tolkien', 'Le Guin',
+            'Morrison', 'Orwell', 'Woolf', 'Okri', 'Gyasi', 'Ishiguro', 'Atwood']
+LOCATIONS = ['Nairobi', 'Mombasa', 'Kisumu', 'Nakuru', 'Eldoret']
+
+
+def seed(users=50, books=1000, transactions=3000, seed=0):
+    """Create the rows and return (users, books, transactions) lists"""
+    from entities.models import User
+    from books.models import Book
+    from transactions.models import BorrowTransaction
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(PASSWORD)
+
+    new_users = [
+        User(username=f'bench_user_{i}', email=f'bench_user_{i}@example.com',
+             password=password, location=rng.choice(LOCATIONS))
+        for i in range(users)
+    ]
+    for user in new_users:
+        user.set_coordinates()  # bulk_create skips save()
+    created_users = User.objects.bulk_create(new_users)
+
+    genres = [choice for choice, _ in Book.GENRE_CHOICES]
+    conditions = [choice for choice, _ in Book.CONDITION_CHOICES]
+    new_books = []
+    for i in range(books):
+        owner = created_users[i % users]
+        title = ' '.join(rng.sample(TITLE_WORDS, rng.randint(2, 4)))
+        new_books.append(Book(
+            owner=owner,
+            title=f'{title} {i}',
+            author=f'{rng.choice("ABCDEFGHJKLMNPRSTW")}. {rng.choice(SURNAMES)}',
+            description=f'A story of {title.lower()} set in {owner.location}. ' * 3,
+            genre=rng.choice(genres),
+            condition=rng.choice(conditions),
+            daily_rental_price=Decimal(rng.randint(20, 300)) / 100,
+            location=owner.location,
+            latitude=owner.latitude,
+            longitude=owner.longitude,
+            geohash=owner.geohash,
+        ))
+    created_books = Book.objects.bulk_create(new_books)
+
+    statuses = [status for status, _ in STATUS_MIX]
+    weights = [weight for _, weight in STATUS_MIX]
+    on_loan = set()
+    new_transactions = []
+    for _ in range(transactions):
+        book = rng.choice(created_books)
+        index = rng.randrange(users)
+        if created_users[index].pk == book.owner_id:
+            index = (index + 1) % users
+        borrower = created_users[index]
+        status = rng.choices(statuses, weights)[0]
+        if status in ('ACCEPTED', 'BORROWED', 'RETURNED'):
+            # One open loan per book
+            if book.pk in on_loan:
+                status = 'COMPLETED'
+            else:
+                on_loan.add(book.pk)
+
+        requested = now - timedelta(days=rng.randint(0, 365), minutes=rng.randint(0, 1440))
+        transaction = BorrowTransaction(
+            book=book, borrower=borrower, lender_id=book.owner_id, status=status)
+        if status in ('ACCEPTED', 'BORROWED', 'RETURNED', 'COMPLETED'):
+            transaction.accept_date = requested + timedelta(days=1)
+            transaction.due_date = (transaction.accept_date + timedelta(days=14)).date()
+        if status in ('RETURNED', 'COMPLETED'):
+            transaction.return_date = transaction.accept_date + timedelta(days=rng.randint(1, 20))
+            transaction.final_rental_fee = book.daily_rental_price * max(
+                1, (transaction.return_date - transaction.accept_date).days)
+        new_transactions.append((transaction, requested))
+
+    created_transactions = BorrowTransaction.objects.bulk_create(
+        [transaction for transaction, _ in new_transactions])
+    # request_date is auto_now_add; spread it over the past year afterwards
+    for transaction, requested in new_transactions:
+        transaction.request_date = requested
+    BorrowTransaction.objects.bulk_update(
+        created_transactions, ['request_date'], batch_size=500)
+
+    Book.objects.filter(pk__in=on_loan).update(is_available=False)
+    return created_users, created_books, created_transactions
@@ -0,0 +1,353 @@
+"""
+Offline API benchmark suite.
+
+Seeds a throwaway SQLite database with benchmarks.seed, then runs each
+scenario through the full middleware stack with DRF's test client:
+
+  book_list, book_search, book_filter   BookListView, served from the
+                                        catalogue cache after the warm-up
+  book_list_cold, book_search_cold,     the same with the cache cleared before
+  book_filter_cold                      each request, so the listing's queries
+                                        are measured
+  transaction_list                      TransactionListView
+  dashboard_cold, dashboard_warm        user_dashboard (cache cleared / kept)
+  stats_cold                            transaction_stats (cache cleared)
+  accept_return_flow                    accept -> mark-returned -> confirm-return
+                                        driven from --threads threads at once
+
+For every scenario it reports p50/p95/p99/mean latency, throughput, SQL
+queries per request and peak traced memory (from one extra tracemalloc run,
+so tracing does not skew the timings) as JSON, and compares the result with a
+stored baseline.
+
+    python -m benchmarks.suite                              # print + compare
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --save-baseline              # refresh the baseline
+    python -m benchmarks.suite --fail-on-regression         # exit 1 on regressions
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'borrowedwords.settings')
+
+import django  # noqa: E402
+
+BASELINE = Path(__file__).with_name('baseline.json')
+
+# Only these metrics count as regressions; the rest are informational
+LATENCY_METRIC = 'p95_ms'
+QUERY_METRIC = 'queries_per_request'
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class QueryCounter:
+    """Count SQL statements on this thread's connection"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def api_client(user):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def call(client, method, path, expected=(200,)):
+    response = getattr(client, method)(path)
+    if response.status_code not in expected:
+        raise RuntimeError(f'{method.upper()} {path} returned {response.status_code}')
+    return response
+
+
+class Scenario:
+    """A request repeated `iterations` times on one thread"""
+
+    def __init__(self, name, client, path, before=None):
+        self.name = name
+        self.client = client
+        self.path = path
+        self.before = before
+
+    def run_once(self):
+        if self.before:
+            self.before()
+        start = time.perf_counter()
+        call(self.client, 'get', self.path)
+        return time.perf_counter() - start
+
+    def run(self, iterations):
+        from django.db import connection
+
+        self.run_once()  # warm-up
+        counter = QueryCounter()
+        samples = []
+        started = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            for _ in range(iterations):
+                samples.append(self.run_once())
+        elapsed = time.perf_counter() - started
+        return summarize(samples, elapsed, counter.count / iterations,
+                         peak_memory(self.run_once))
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def summarize(samples, elapsed, queries, peak_bytes, **extra):
+    ms = [sample * 1000 for sample in samples]
+    return {
+        'requests': len(samples),
+        'p50_ms': round(statistics.median(ms), 2),
+        'p95_ms': round(percentile(ms, 95), 2),
+        'p99_ms': round(percentile(ms, 99), 2),
+        'mean_ms': round(statistics.mean(ms), 2),
+        'throughput_rps': round(len(samples) / elapsed, 1),
+        'queries_per_request': round(queries, 2),
+        'peak_memory_kb': round(peak_bytes / 1024, 1),
+        **extra,
+    }
+
+
+def prepare_flows(count):
+    """One fresh pending request per available book, for the accept/return flow"""
+    from books.models import Book
+    from entities.models import User
+    from transactions.models import BorrowTransaction
+
+    users = list(User.objects.filter(username__startswith='bench_user_'))
+    books = list(Book.objects.filter(is_available=True).exclude(
+        transactions__status='PENDING').select_related('owner')[:count])
+    flows = []
+    for i, book in enumerate(books):
+        borrower = next(user for user in users[i % len(users):] + users
+                        if user.pk != book.owner_id)
+        flows.append(BorrowTransaction(book=book, borrower=borrower, lender=book.owner))
+    BorrowTransaction.objects.bulk_create(flows)
+    return flows
+
+
+def run_flow(flow, samples, counts, lock):
+    from django.db import connection
+
+    lender, borrower = api_client(flow.lender), api_client(flow.borrower)
+    base = f'/api/transactions/{flow.pk}'
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        steps = [(lender, 'accept'), (borrower, 'mark-returned'), (lender, 'confirm-return')]
+        timings = []
+        for client, action in steps:
+            start = time.perf_counter()
+            call(client, 'post', f'{base}/{action}/')
+            timings.append(time.perf_counter() - start)
+    with lock:
+        samples.extend(timings)
+        counts.append(counter.count)
+
+
+def run_concurrent_flows(flows, threads):
+    from django.db import connections
+
+    samples, counts, lock = [], [], threading.Lock()
+
+    def worker(chunk):
+        try:
+            for flow in chunk:
+                run_flow(flow, samples, counts, lock)
+        finally:
+            connections.close_all()
+
+    chunks = [flows[i::threads] for i in range(threads)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for future in [pool.submit(worker, chunk) for chunk in chunks]:
+            future.result()
+    elapsed = time.perf_counter() - started
+    return samples, counts, elapsed
+
+
+def accept_return_flow(flow_count, threads):
+    flows = prepare_flows(flow_count + 1)
+    # Untimed warm-up flow, then one traced flow for memory
+    run_flow(flows[0], [], [], threading.Lock())
+    samples, counts, elapsed = run_concurrent_flows(flows[1:], threads)
+
+    traced = prepare_flows(1)
+    peak = peak_memory(lambda: run_flow(traced[0], [], [], threading.Lock()))
+    result = summarize(samples, elapsed, sum(counts) / len(samples), peak,
+                       threads=threads, flows=len(flows) - 1)
+    result['flows_per_second'] = round(result['flows'] / elapsed, 1)
+    return result
+
+
+def build_scenarios():
+    from django.core.cache import cache
+    from django.db.models import Count
+    from books.models import Book
+    from entities.models import User
+
+    # The busiest users, so the per-user pages have real data behind them
+    lender = User.objects.annotate(
+        lent=Count('lent_transactions')).order_by('-lent').first()
+    borrower = User.objects.annotate(
+        borrowed=Count('borrowed_transactions')).order_by('-borrowed').first()
+    term = Book.objects.values_list('title', flat=True).first().split()[0]
+    genre = Book.objects.values_list('genre', flat=True).first()
+
+    reader = api_client(borrower)
+    owner = api_client(lender)
+    listings = [
+        ('book_list', '/api/books/'),
+        ('book_search', f'/api/books/?search={term.lower()}'),
+        ('book_filter',
+         f'/api/books/?genre={genre}&is_available=true&ordering=daily_rental_price'),
+    ]
+    return [
+        *(Scenario(name, reader, path) for name, path in listings),
+        *(Scenario(f'{name}_cold', reader, path, before=cache.clear)
+          for name, path in listings),
+        Scenario('transaction_list', owner, '/api/transactions/'),
+        Scenario('dashboard_cold', owner, '/api/transactions/dashboard/',
+                 before=cache.clear),
+        Scenario('dashboard_warm', owner, '/api/transactions/dashboard/'),
+        Scenario('stats_cold', owner, '/api/transactions/stats/', before=cache.clear),
+    ]
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    """Rows of (scenario, metric, baseline, current, change, regressed)"""
+    rows = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric in (LATENCY_METRIC, QUERY_METRIC, 'throughput_rps', 'peak_memory_kb'):
+            before, after = previous.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if metric == LATENCY_METRIC:
+                # Sub-millisecond endpoints jitter by large percentages
+                regressed = change > tolerance and after - before > min_delta_ms
+            elif metric == QUERY_METRIC:
+                regressed = after > before
+            else:
+                regressed = False
+            rows.append((name, metric, before, after, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--transactions', type=int, default=5000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--flows', type=int, default=40,
+                        help='Accept/return flows spread over the threads')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report to this file')
+    parser.add_argument('--baseline', default=str(BASELINE))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Store this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed p95 slowdown against the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                        help='Ignore p95 slowdowns smaller than this many ms')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    from benchmarks.seed import seed
+
+    setup_test_environment()
+    # One timing line per request would drown the report
+    logging.getLogger('utils.timing').setLevel(logging.WARNING)
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+    db_file.close()
+    connection.settings_dict['TEST']['NAME'] = db_file.name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+    try:
+        started = time.perf_counter()
+        seed(args.users, args.books, args.transactions, seed=args.seed)
+        seed_seconds = time.perf_counter() - started
+
+        results = {
+            'meta': {
+                'users': args.users, 'books': args.books,
+                'transactions': args.transactions, 'iterations': args.iterations,
+                'threads': args.threads, 'seed': args.seed,
+                'seed_seconds': round(seed_seconds, 2),
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'django': django.get_version(),
+            },
+            'scenarios': {},
+        }
+        for scenario in build_scenarios():
+            results['scenarios'][scenario.name] = scenario.run(args.iterations)
+        results['scenarios']['accept_return_flow'] = accept_return_flow(
+            args.flows, args.threads)
+    finally:
+        connection.creation.destroy_test_db(db_file.name, verbosity=0)
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(report + '\n')
+    print(report)
+
+    regressions = []
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        baseline_path.write_text(report + '\n')
+        print(f'\nBaseline saved to {baseline_path}')
+    elif baseline_path.exists():
+        rows = compare(results, json.loads(baseline_path.read_text()),
+                       args.tolerance, args.min_delta_ms)
+        print(f"\n{'scenario':<22}{'metric':<22}{'baseline':>12}{'current':>12}{'change':>9}")
+        for name, metric, before, after, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            print(f'{name:<22}{metric:<22}{before:>12}{after:>12}{change:>+9.0%}{flag}')
+            if regressed:
+                regressions.append((name, metric))
+
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
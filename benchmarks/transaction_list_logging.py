@@ -0,0 +1,141 @@
+"""
+Logging overhead benchmark for transaction_list_view.
+
+Seeds a throwaway SQLite database with a lender, a borrower and 1,000
+transactions, then times the /transactions/ page under three logging setups:
+
+  full-debug   DEBUG level, payloads dumped in full and unsampled: what the
+               old print() calls did on every request
+  sampled      DEBUG level, payloads truncated and 10% of dumps sampled
+  default      INFO level (the shipped configuration)
+
+Log output goes to a temporary file, as stdout would under a process manager.
+
+    python -m benchmarks.transaction_list_logging --transactions 1000 --iterations 30
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'borrowedwords.settings')
+
+import django  # noqa: E402
+
+from benchmarks.page_latency import PASSWORD, percentile  # noqa: E402
+
+PROJECT_LOGGERS = ('books', 'entities', 'transactions', 'utils')
+
+MODES = {
+    # level, payload max chars, payload sample rate
+    'full-debug': (logging.DEBUG, None, 1.0),
+    'sampled': (logging.DEBUG, 1000, 0.1),
+    'default': (logging.INFO, 1000, 1.0),
+}
+
+
+def seed(transaction_count):
+    from entities.models import User
+    from books.models import Book
+    from transactions.models import BorrowTransaction
+
+    lender = User.objects.create_user('bench_lender', 'lender@example.com', PASSWORD)
+    borrower = User.objects.create_user('bench_borrower', 'borrower@example.com', PASSWORD)
+
+    books = Book.objects.bulk_create([
+        Book(owner=lender, title=f'Book {i}', author=f'Author {i % 37}',
+             description='A perfectly ordinary book. ' * 5)
+        for i in range(min(transaction_count, 200))
+    ])
+    statuses = ['PENDING', 'REJECTED', 'COMPLETED', 'CANCELLED']
+    BorrowTransaction.objects.bulk_create([
+        BorrowTransaction(book=books[i % len(books)], borrower=borrower, lender=lender,
+                          status=statuses[i % len(statuses)])
+        for i in range(transaction_count)
+    ])
+    return lender
+
+
+def configure(mode, stream):
+    from django.conf import settings
+    from utils.log import PayloadSampleFilter
+
+    level, max_chars, sample_rate = MODES[mode]
+    for name in PROJECT_LOGGERS:
+        logging.getLogger(name).setLevel(level)
+    settings.LOG_PAYLOAD_MAX_CHARS = max_chars
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(stream)
+        for log_filter in handler.filters:
+            if isinstance(log_filter, PayloadSampleFilter):
+                log_filter.rate = sample_rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--transactions', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument(
+        '--page-size', type=int, default=None,
+        help='Transactions rendered per page (default: all of them, as '
+             'before the list was paginated)')
+    args = parser.parse_args(argv)
+
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment
+    from transactions.views import TransactionPagination
+
+    setup_test_environment()
+    # Keep the per-request timing lines out of the output
+    logging.getLogger('utils.timing').setLevel(logging.WARNING)
+    db_file = tempfile.NamedTemporaryFile(suffix='.sqlite3', delete=False)
+    db_file.close()
+    connection.settings_dict['TEST']['NAME'] = db_file.name
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    log_file = tempfile.TemporaryFile('w+')
+
+    try:
+        lender = seed(args.transactions)
+        TransactionPagination.page_size = args.page_size or args.transactions
+
+        client = Client()
+        response = client.post('/login/', {'username': lender.username, 'password': PASSWORD})
+        if response.status_code != 302:
+            raise RuntimeError('Benchmark login failed')
+
+        report = {}
+        for mode in MODES:
+            configure(mode, log_file)
+            client.get('/transactions/')  # warm-up
+            log_file.seek(0)
+            log_file.truncate()
+            samples = []
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                response = client.get('/transactions/')
+                samples.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200:
+                    raise RuntimeError(f'/transactions/ returned {response.status_code}')
+            log_file.flush()
+            report[mode] = (samples, log_file.tell() / args.iterations)
+
+        print(f"{'mode':<14}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'log KB/req':>12}")
+        for mode, (samples, log_bytes) in report.items():
+            print(f"{mode:<14}"
+                  f"{statistics.median(samples):>10.2f}"
+                  f"{percentile(samples, 95):>10.2f}"
+                  f"{statistics.mean(samples):>10.2f}"
+                  f"{log_bytes / 1024:>12.1f}")
+    finally:
+        log_file.close()
+        connection.creation.destroy_test_db(db_file.name, verbosity=0)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,9 +5,18 @@ from .models import Book
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'owner',
-                    'is_available', 'daily_rental_price']
+                    'is_available', 'daily_rental_price', 'pending_requests',
+                    'last_request_date']
     list_filter = ['genre', 'condition', 'is_available']
     search_fields = ['title', 'author', 'owner__username']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('owner')
+        return super().get_queryset(request).select_related('owner').with_request_stats()
+
+    @admin.display(description='Pending requests', ordering='pending_requests_count')
+    def pending_requests(self, obj):
+        return obj.get_pending_requests_count()
+
+    @admin.display(description='Last request', ordering='last_request_date')
+    def last_request_date(self, obj):
+        return obj.last_request_date
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BooksConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'books'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_migrate
+        from .models import Book, release_cover_file
+        from .search import repair_search_index
+        from . import signals  # noqa: F401
+
+        post_migrate.connect(repair_search_index, sender=self)
+        post_delete.connect(release_cover_file, sender=Book)
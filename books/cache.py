@@ -0,0 +1,131 @@
+"""
+Versioned response cache for the public book listing.
+
+Every cached BookListView page is keyed on a catalogue version token plus
+the normalized query. Any write to a Book or BorrowTransaction replaces the
+token (books/signals.py, and the code paths that write with
+queryset.update() or bulk_create), so every cached page becomes unreachable
+at once: invalidation is a single cache.set() and nothing is scanned or
+deleted. Orphaned entries simply expire.
+
+The token is a fresh nanosecond timestamp rather than a counter, so an
+evicted or cleared version key can never come back with an old value and
+revive stale pages. Only get/set/add/incr are used, which every Django cache
+backend (locmem, file-based, memcached, redis) supports.
+"""
+import hashlib
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction as db_transaction
+
+CATALOGUE_CACHE_TIMEOUT = getattr(settings, 'CATALOGUE_CACHE_TIMEOUT', 5 * 60)
+
+VERSION_KEY = 'books:catalogue:version'
+# Hit/miss counters per cached view, so one view's traffic doesn't hide the
+# other's ratio; keys are books:<counter>:hits and books:<counter>:misses
+LISTING_COUNTER = 'catalogue'
+FACETS_COUNTER = 'facets'
+COUNTERS = (LISTING_COUNTER, FACETS_COUNTER)
+
+
+def get_catalogue_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version():
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def bump_catalogue_version_on_commit():
+    """
+    Bump now, so this connection never reads its own stale page, and again
+    once the write commits, so a page another request cached from the
+    pre-commit rows under the first bump is superseded as well.
+    """
+    bump_catalogue_version()
+    db_transaction.on_commit(bump_catalogue_version)
+
+
+_deferred = ContextVar('deferred_cache_invalidation', default=False)
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    Silence the per-row cache signal handlers (books/signals.py,
+    transactions/signals.py) for a bulk write. The caller then bumps the
+    catalogue version and drops the user caches once for all the rows.
+    """
+    token = _deferred.set(True)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+
+
+def invalidation_deferred():
+    return _deferred.get()
+
+
+def normalize_query(params, allowed):
+    """
+    Canonical form of the query parameters that affect the listing: unknown
+    and blank parameters are dropped and keys are sorted, so `?genre=SCI_FI&x=1`
+    and `?x=&genre=SCI_FI` share an entry.
+    """
+    items = []
+    for key in sorted(set(params) & set(allowed)):
+        values = [value.strip() for value in params.getlist(key) if value.strip()]
+        if values:
+            items.append((key, values))
+    return items
+
+
+def listing_cache_key(version, *parts):
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return f'books:list:{version}:{digest}'
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:  # missing or evicted
+        if not cache.add(key, 1, None):
+            cache.incr(key)
+
+
+def _counter_keys(counter):
+    return f'books:{counter}:hits', f'books:{counter}:misses'
+
+
+def record_hit(counter=LISTING_COUNTER):
+    _count(_counter_keys(counter)[0])
+
+
+def record_miss(counter=LISTING_COUNTER):
+    _count(_counter_keys(counter)[1])
+
+
+def catalogue_cache_stats(counter=LISTING_COUNTER):
+    hits_key, misses_key = _counter_keys(counter)
+    hits = cache.get(hits_key, 0)
+    misses = cache.get(misses_key, 0)
+    total = hits + misses
+    return {
+        'version': cache.get(VERSION_KEY),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 3) if total else None,
+    }
+
+
+def reset_catalogue_cache_stats(counter=LISTING_COUNTER):
+    cache.delete_many(_counter_keys(counter))
@@ -0,0 +1,130 @@
+"""
+Cover image renditions.
+
+Every cover gets fixed-size copies next to the original in the cover
+storage, named after it: `book_covers/dune.jpg` produces
+`book_covers/dune.thumb.jpg`, `book_covers/dune.thumb.webp`,
+`book_covers/dune.detail.jpg` and `book_covers/dune.detail.webp`. The names
+that were written are recorded in `Book.cover_renditions`, so serializing a
+list never has to stat the media directory. Books without renditions fall
+back to the original.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# name: bounding box (width, height); covers are portrait, roughly 2:3
+RENDITIONS = {
+    'thumb': (200, 300),
+    'detail': (600, 900),
+}
+JPEG_QUALITY = 82
+WEBP_QUALITY = 80
+
+
+def rendition_name(source_name, rendition, extension):
+    stem, _ = posixpath.splitext(source_name)
+    return f'{stem}.{rendition}.{extension}'
+
+
+def source_stem(name):
+    """The shared stem of a cover file and its renditions"""
+    stem, extension = posixpath.splitext(name)
+    base, rendition = posixpath.splitext(stem)
+    if rendition[1:] in RENDITIONS and extension in ('.jpg', '.webp'):
+        return base
+    return stem
+
+
+def _encode(image, format):
+    buffer = BytesIO()
+    if format == 'WEBP':
+        image.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    else:
+        image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def generate_renditions(storage, source_name, force=False):
+    """
+    Write every rendition of `source_name` to `storage` and return the
+    {key: name} map for Book.cover_renditions. Existing files are reused
+    unless `force`. Returns {} if the source is missing or not an image.
+    """
+    names = {}
+    todo = []
+    for rendition, size in RENDITIONS.items():
+        for key, extension, format in ((rendition, 'jpg', 'JPEG'),
+                                       (f'{rendition}_webp', 'webp', 'WEBP')):
+            name = rendition_name(source_name, rendition, extension)
+            names[key] = name
+            if force or not storage.exists(name):
+                todo.append((name, size, format))
+    if not todo:
+        return names
+
+    try:
+        with storage.open(source_name, 'rb') as source:
+            image = Image.open(source)
+            # Let the JPEG decoder downscale while decoding: much faster
+            # and lighter on memory for multi-megapixel photos
+            image.draft('RGB', max(RENDITIONS.values()))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+        logger.warning('Cannot generate renditions for cover %s', source_name,
+                       exc_info=True)
+        return {}
+
+    # Largest first, so each smaller size is scaled from the previous one
+    for name, size, format in sorted(todo, key=lambda item: item[1], reverse=True):
+        resized = image.copy()
+        resized.thumbnail(size, Image.Resampling.LANCZOS)
+        if force and storage.exists(name):
+            storage.delete(name)
+        # Content-hash storage would rename the file; keep the derived name
+        save = getattr(storage, 'save_as', storage.save)
+        saved = save(name, ContentFile(_encode(resized, format)))
+        if saved != name:
+            # Storage picked another name (e.g. a race); record what exists
+            for key, value in names.items():
+                if value == name:
+                    names[key] = saved
+    return names
+
+
+def rendition_urls(book):
+    """{key: url} for the book's cover, with the original standing in for
+    renditions that have not been generated"""
+    return cover_urls(book.cover_image.storage, book.cover_image.name,
+                      book.cover_renditions)
+
+
+def cover_urls(storage, name, renditions):
+    """rendition_urls() from the raw column values"""
+    if not name:
+        return {}
+    original = storage.url(name)
+    renditions = renditions or {}
+
+    urls = {'original': original}
+    for rendition in RENDITIONS:
+        name = renditions.get(rendition)
+        urls[rendition] = storage.url(name) if name else original
+        webp = renditions.get(f'{rendition}_webp')
+        urls[f'{rendition}_webp'] = storage.url(webp) if webp else None
+
+    if renditions:
+        urls['srcset'] = ', '.join(
+            f'{urls[rendition]} {width}w' for rendition, (width, _) in RENDITIONS.items())
+        urls['webp_srcset'] = ', '.join(
+            f'{urls[f"{rendition}_webp"]} {width}w'
+            for rendition, (width, _) in RENDITIONS.items()
+            if urls[f'{rendition}_webp'])
+    else:
+        urls['srcset'] = urls['webp_srcset'] = None
+    return urls
@@ -0,0 +1,161 @@
+"""
+Bulk catalogue import.
+
+Rows are read one at a time from a CSV or JSON-lines stream, validated with
+BookSerializer's field rules (choices, price bounds, lengths) and inserted
+with one bulk_create per batch, so memory stays flat however long the file
+is. The FTS index is kept in step by its insert trigger inside each
+bulk_create, and the owner's cached dashboard is invalidated once per batch
+rather than by a post_save signal per book.
+
+Batches commit as they fill, so a file that turns out to be undecodable or
+broken CSV halfway through is not rolled back: the import stops there, keeps
+what was already inserted and reports the failure as a row error, so the
+caller knows which rows made it in.
+"""
+import csv
+import json
+
+from django.db import transaction as db_transaction
+from rest_framework import serializers
+
+from .cache import bump_catalogue_version_on_commit
+from .models import Book
+from .serializers import BookSerializer
+
+FORMATS = ('csv', 'jsonl')
+DEFAULT_BATCH_SIZE = 500
+# Per-row errors kept for the report; later failures are only counted
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(filename, default='csv'):
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+
+def read_rows(stream, format):
+    """
+    Yield (row_number, data) pairs from a binary or text stream. Malformed
+    JSON lines are yielded as (row_number, None) so they show up in the
+    report instead of aborting the import.
+    """
+    if format not in FORMATS:
+        raise ImportFormatError(f'Unsupported format: {format}')
+    lines = _text_lines(stream)
+
+    if format == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            # Blank cells mean "not given", so model defaults apply
+            yield reader.line_num, {
+                key.strip(): value for key, value in row.items()
+                if key and value not in (None, '')
+            }
+    else:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError:
+                data = None
+            yield number, data if isinstance(data, dict) else None
+
+
+def _text_lines(stream):
+    """Lines of a text, binary or uploaded file, decoded, without a BOM"""
+    first = True
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+        # Reading stopped early on an unreadable stream
+        self.aborted = False
+
+    def add_error(self, row, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'batches': self.batches,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+            'aborted': self.aborted,
+        }
+
+
+def import_books(rows, owner, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """Validate and insert `rows` for `owner`; returns an ImportResult"""
+    # One serializer for every row: its fields are built once and
+    # run_validation() applies the same rules as is_valid()
+    serializer = BookSerializer()
+    result = ImportResult()
+    batch = []
+    number = 0
+
+    try:
+        for number, data in rows:
+            if data is None:
+                result.add_error(number, {'non_field_errors': ['Malformed row']})
+                continue
+            try:
+                validated = serializer.run_validation(data)
+            except serializers.ValidationError as e:
+                result.add_error(number, e.detail)
+                continue
+
+            validated.pop('owner', None)
+            book = Book(owner=owner, **validated)
+            if not book.location:
+                # Book.save() would fetch the owner for this on every row
+                book.location = owner.location
+            book.set_coordinates()
+            batch.append(book)
+            if len(batch) >= batch_size:
+                _flush(batch, owner, result, dry_run)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        # Earlier batches are committed already; the rows read so far stand
+        result.add_error(number + 1, {'non_field_errors': [
+            f'Unreadable from this row on, import stopped: {e}']})
+        result.aborted = True
+
+    if batch:
+        _flush(batch, owner, result, dry_run)
+    return result
+
+
+def _flush(batch, owner, result, dry_run):
+    from transactions.cache import invalidate_user_caches
+
+    if not dry_run:
+        with db_transaction.atomic():
+            Book.objects.bulk_create(batch)
+            db_transaction.on_commit(lambda: invalidate_user_caches(owner.pk))
+            bump_catalogue_version_on_commit()
+    result.created += len(batch)
+    result.batches += 1
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from books.cache import COUNTERS, catalogue_cache_stats, reset_catalogue_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Show hit/miss counters of the cached book listings and facets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Zero the counters afterwards')
+
+    def handle(self, *args, **options):
+        for counter in COUNTERS:
+            stats = catalogue_cache_stats(counter)
+            ratio = stats['hit_ratio']
+            self.stdout.write(
+                f"{counter}: hits={stats['hits']} misses={stats['misses']} "
+                f"hit_ratio={'n/a' if ratio is None else f'{ratio:.1%}'} "
+                f"version={stats['version']}")
+        if options['reset']:
+            for counter in COUNTERS:
+                reset_catalogue_cache_stats(counter)
+            self.stdout.write(self.style.SUCCESS('Counters reset'))
@@ -0,0 +1,80 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from books.covers import source_stem
+from books.models import Book, CoverFile
+
+
+class Command(BaseCommand):
+    help = 'Delete cover files (and their renditions) that no book references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=500,
+            help='Files checked against the database per query')
+        parser.add_argument(
+            '--grace-minutes', type=int, default=60,
+            help='Keep files younger than this; their book may not be saved yet')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be deleted without deleting it')
+
+    def handle(self, *args, **options):
+        field = Book._meta.get_field('cover_image')
+        storage = field.storage
+        start = time.monotonic()
+
+        # Bulk writes bypass the per-save counting; never trust stale counts
+        # with deletes
+        CoverFile.recount()
+        protected = {source_stem(field.default)} if field.default else set()
+        cutoff = time.time() - options['grace_minutes'] * 60
+
+        scanned = deleted = freed = 0
+        chunk = []
+        for entry in self.walk(storage.path(field.upload_to)):
+            scanned += 1
+            if entry.stat().st_mtime > cutoff:
+                continue
+            name = os.path.relpath(entry.path, storage.location).replace(os.sep, '/')
+            chunk.append((name, entry.stat().st_size))
+            if len(chunk) >= options['chunk_size']:
+                count, size = self.collect(chunk, storage, protected, options['dry_run'])
+                deleted, freed, chunk = deleted + count, freed + size, []
+        if chunk:
+            count, size = self.collect(chunk, storage, protected, options['dry_run'])
+            deleted, freed = deleted + count, freed + size
+
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {deleted} of {scanned} cover files ({freed / 1024:.1f} KiB) '
+            f'in {time.monotonic() - start:.2f}s'))
+
+    def walk(self, directory):
+        """Files under `directory`, streamed with scandir"""
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            return
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    yield from self.walk(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+    def collect(self, chunk, storage, protected, dry_run):
+        stems = {source_stem(name) for name, _ in chunk}
+        referenced = protected | set(
+            CoverFile.objects.filter(stem__in=stems, refs__gt=0)
+            .values_list('stem', flat=True))
+        orphans = [(name, size) for name, size in chunk
+                   if source_stem(name) not in referenced]
+        if not dry_run:
+            for name, _ in orphans:
+                storage.delete(name)
+            CoverFile.objects.filter(
+                name__in=[name for name, _ in orphans], refs=0).delete()
+        return len(orphans), sum(size for _, size in orphans)
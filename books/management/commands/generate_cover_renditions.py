@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from books.cache import bump_catalogue_version
+from books.covers import generate_renditions
+from books.models import Book
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail/detail/WebP renditions for existing book covers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Regenerate renditions that already exist')
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Cover files read from the database per query')
+
+    def handle(self, *args, **options):
+        storage = Book._meta.get_field('cover_image').storage
+        books = Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        if not options['force']:
+            books = books.filter(cover_renditions={})
+        # Many books share a file (the default cover), so work per file
+        names = books.order_by('cover_image').values_list(
+            'cover_image', flat=True).distinct()
+
+        start = time.monotonic()
+        covers = updated = failed = 0
+        last = ''
+        while True:
+            batch = list(names.filter(cover_image__gt=last)[:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1]
+            for name in batch:
+                renditions = generate_renditions(storage, name, force=options['force'])
+                covers += 1
+                if not renditions:
+                    failed += 1
+                    continue
+                updated += Book.objects.filter(cover_image=name).update(
+                    cover_renditions=renditions, updated_at=timezone.now())
+
+        if updated:
+            bump_catalogue_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated renditions for {covers - failed} covers '
+            f'({updated} books) in {time.monotonic() - start:.2f}s'))
+        if failed:
+            self.stdout.write(self.style.WARNING(
+                f'{failed} covers could not be read; see the log'))
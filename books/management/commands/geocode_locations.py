@@ -0,0 +1,78 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from books.cache import bump_catalogue_version
+from books.models import Book
+from entities.models import User
+from utils.geo import locate
+
+
+class Command(BaseCommand):
+    help = ('Fill latitude/longitude/geohash on users and books from their '
+            'free-text location, using the bundled gazetteer')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Distinct locations read from the database per query')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        unresolved = Counter()
+        changed = {}
+        for model in (User, Book):
+            changed[model] = self.geocode(model, options, unresolved)
+
+        if changed[Book] and not options['dry_run']:
+            bump_catalogue_version()
+        verb = 'Would update' if options['dry_run'] else 'Updated'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {changed[User]} users and {changed[Book]} books '
+            f'in {time.monotonic() - start:.2f}s'))
+        if unresolved:
+            self.stdout.write(self.style.WARNING(
+                f'{len(unresolved)} locations are not in the gazetteer '
+                f'({sum(unresolved.values())} rows)'))
+            if options['verbosity'] > 1:
+                for location, rows in unresolved.most_common(20):
+                    self.stdout.write(f'  {rows:>6}  {location}')
+
+    def geocode(self, model, options, unresolved):
+        rows = model.objects.order_by()
+        # Free text repeats a lot, so resolve each distinct value once
+        locations = rows.exclude(location__isnull=True).exclude(location='') \
+            .order_by('location').values_list('location', flat=True).distinct()
+        changed = 0
+        last = ''
+        while True:
+            batch = list(locations.filter(location__gt=last)[:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1]
+            with transaction.atomic():
+                for location in batch:
+                    latitude, longitude, geohash = locate(location)
+                    # The geohash is derived from the coordinates
+                    stale = rows.filter(location=location).exclude(geohash=geohash)
+                    if not geohash:
+                        unresolved[location] += rows.filter(location=location).count()
+                    if options['dry_run']:
+                        changed += stale.count()
+                    else:
+                        changed += stale.update(
+                            latitude=latitude, longitude=longitude, geohash=geohash)
+
+        # Locations that were cleared
+        cleared = rows.filter(Q(location__isnull=True) | Q(location='')).exclude(geohash='')
+        if options['dry_run']:
+            changed += cleared.count()
+        else:
+            changed += cleared.update(latitude=None, longitude=None, geohash='')
+        return changed
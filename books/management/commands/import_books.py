@@ -0,0 +1,66 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books.importer import (
+    DEFAULT_BATCH_SIZE, FORMATS, ImportFormatError, detect_format, import_books,
+    read_rows,
+)
+from entities.models import User
+
+
+class Command(BaseCommand):
+    help = 'Import books for an owner from a CSV or JSON-lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or '-' for stdin")
+        parser.add_argument(
+            '--owner', required=True, help='Username that will own the books')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Defaults to the file extension (.csv, .jsonl/.ndjson)')
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help='Books inserted per bulk_create')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Validate every row without writing anything')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown owner: {options['owner']}")
+
+        path = options['path']
+        format = options['format'] or detect_format(path)
+        start = time.monotonic()
+        try:
+            if path == '-':
+                result = self.run(sys.stdin, format, owner, options)
+            else:
+                with open(path, 'rb') as stream:
+                    result = self.run(stream, format, owner, options)
+        except OSError as e:
+            raise CommandError(f'Cannot read {path}: {e}')
+        except ImportFormatError as e:
+            raise CommandError(f'Invalid {format} file: {e}')
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        if result.failed > len(result.errors):
+            self.stderr.write(
+                f'... {result.failed - len(result.errors)} more rows failed')
+
+        verb = 'Validated' if options['dry_run'] else 'Imported'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {result.created} books in {result.batches} batches, '
+                f'{result.failed} rows rejected ({time.monotonic() - start:.2f}s)')
+        )
+
+    def run(self, stream, format, owner, options):
+        return import_books(
+            read_rows(stream, format), owner,
+            batch_size=options['batch_size'], dry_run=options['dry_run'])
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, DEFAULT_DB_ALIAS
+
+from books.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for books'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='Database alias to rebuild the index on')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        start = time.monotonic()
+
+        if not rebuild_search_index(connection):
+            raise CommandError(
+                f'Full-text search index is not supported on {connection.vendor}')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Rebuilt book search index in {time.monotonic() - start:.2f}s')
+        )
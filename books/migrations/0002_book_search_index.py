@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:43
+
+import books.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_search_index(apps, schema_editor):
+    books.search.rebuild_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    books.search.drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchIndex',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='books.book')),
+                ('title', models.TextField()),
+                ('author', models.TextField()),
+                ('description', models.TextField()),
+                ('isbn', models.TextField()),
+                ('document', books.search.FullTextField(db_column='books_book_fts')),
+                ('rank', models.FloatField(db_column='rank')),
+            ],
+            options={
+                'db_table': 'books_book_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
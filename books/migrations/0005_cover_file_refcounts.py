@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:08
+
+import posixpath
+
+import books.storage
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def count_existing_covers(apps, schema_editor):
+    Book = apps.get_model('books', 'Book')
+    CoverFile = apps.get_model('books', 'CoverFile')
+    counts = (Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+              .order_by().values_list('cover_image').annotate(models.Count('id')))
+    CoverFile.objects.bulk_create([
+        CoverFile(name=name, stem=posixpath.splitext(name)[0], refs=refs,
+                  updated_at=timezone.now())
+        for name, refs in counts
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_book_cover_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CoverFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('stem', models.CharField(db_index=True, max_length=255)),
+                ('refs', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='cover_image',
+            field=models.ImageField(blank=True, default='book_covers/default_cover.jpg', null=True, storage=books.storage.ContentHashStorage(), upload_to='book_covers/'),
+        ),
+        migrations.RunPython(count_existing_covers, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,33 @@
-from django.db import models
+import posixpath
+
+from django.db import models, transaction
+from django.db.models import BooleanField, ExpressionWrapper, F, OuterRef, Q, Subquery
+from django.utils.timezone import now
 from django.conf import settings
+from utils.expressions import count_subquery
+from utils.geo import GEO_FIELDS, locate
+from .search import FullTextField
+from .storage import cover_storage
+
+
+class BookQuerySet(models.QuerySet):
+    def with_request_stats(self):
+        """
+        Annotate pending_requests_count, has_pending and last_request_date
+        with correlated subqueries, so listing N books costs one query instead
+        of one per book for each flag.
+        """
+        Transaction = self.model._meta.get_field('transactions').related_model
+        requests = Transaction.objects.filter(book=OuterRef('pk')).order_by()
+
+        return self.annotate(
+            pending_requests_count=count_subquery(
+                requests.filter(status='PENDING')),
+            has_pending=ExpressionWrapper(
+                Q(pending_requests_count__gt=0), output_field=BooleanField()),
+            last_request_date=Subquery(
+                requests.order_by('-request_date').values('request_date')[:1]),
+        )
 
 
 class Book(models.Model):
@@ -50,29 +78,196 @@ class Book(models.Model):
         max_digits=6, decimal_places=2, default=0.50)
     cover_image = models.ImageField(
         upload_to='book_covers/',
+        storage=cover_storage,
         blank=True,
         null=True,
         default='book_covers/default_cover.jpg'
     )
+    # {rendition key: storage name}, filled by books.covers on upload
+    cover_renditions = models.JSONField(default=dict, blank=True, editable=False)
     is_available = models.BooleanField(default=True)
     location = models.CharField(max_length=100, blank=True, null=True)
+    # Resolved from `location` on save (utils/geo.py); backfill existing rows
+    # with `manage.py geocode_locations`
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Newest-first listing for everyone / the keyset cursor
+            # (id is spelled out so the tie-breaker needs no extra sort)
+            models.Index(fields=['-created_at', '-id'], name='book_recent_idx'),
+            # Anonymous visitors only ever see available books
+            models.Index(fields=['-created_at', '-id'],
+                         name='book_available_recent_idx',
+                         condition=models.Q(is_available=True)),
+            # Browse page genre filter, signed in (all books) and anonymous.
+            # Django emits a bare `WHERE is_available` for booleans, which
+            # SQLite only matches against a partial index condition, not as
+            # a leading equality column.
+            models.Index(fields=['genre', '-created_at', '-id'],
+                         name='book_genre_recent_idx'),
+            models.Index(fields=['genre', '-created_at', '-id'],
+                         name='book_avail_genre_recent_idx',
+                         condition=models.Q(is_available=True)),
+            # "My books" page
+            models.Index(fields=['owner', '-created_at', '-id'],
+                         name='book_owner_recent_idx'),
+            # ?near= prunes with geohash prefix ranges, signed in and anonymous
+            models.Index(fields=['geohash'], name='book_geohash_idx'),
+            models.Index(fields=['geohash'], name='book_avail_geohash_idx',
+                         condition=models.Q(is_available=True)),
+        ]
+
     def __str__(self):
         return f"{self.title} by {self.author}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored cover name, so save() can move its CoverFile reference
+        instance._saved_cover = instance.__dict__.get('cover_image')
+        return instance
+
     def save(self, *args, **kwargs):
         # Auto-populate location from owner if not set
         if not self.location and self.owner.location:
             self.location = self.owner.location
+        self.set_coordinates()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'location' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *GEO_FIELDS}
+        new_cover = bool(self.cover_image) and not self.cover_image._committed
+        if new_cover:
+            self.cover_renditions = {}
         super().save(*args, **kwargs)
+        if new_cover:
+            self.generate_cover_renditions()
+
+        previous = getattr(self, '_saved_cover', None)
+        current = self.cover_image.name or None
+        if 'cover_image' in self.__dict__ and current != previous:
+            CoverFile.retain(current)
+            CoverFile.release(previous)
+            self._saved_cover = current
+
+    def set_coordinates(self):
+        self.latitude, self.longitude, self.geohash = locate(self.location)
+
+    def generate_cover_renditions(self, force=False):
+        """Write the thumbnail/detail/WebP copies of the current cover"""
+        from .cache import bump_catalogue_version_on_commit
+        from .covers import generate_renditions
+
+        if not self.cover_image:
+            return
+        self.cover_renditions = generate_renditions(
+            self.cover_image.storage, self.cover_image.name, force=force)
+        # Not save(), which would re-fire post_save; updated_at still moves so
+        # conditional GETs see the new cover_images
+        self.updated_at = now()
+        Book.objects.filter(pk=self.pk).update(
+            cover_renditions=self.cover_renditions, updated_at=self.updated_at)
+        bump_catalogue_version_on_commit()
 
     @property
     def has_pending_requests(self):
         """Check if this book has any pending borrow requests"""
+        if hasattr(self, 'has_pending'):  # from with_request_stats()
+            return self.has_pending
         return self.transactions.filter(status='PENDING').exists()
 
     def get_pending_requests_count(self):
         """Get count of pending borrow requests"""
+        if hasattr(self, 'pending_requests_count'):  # from with_request_stats()
+            return self.pending_requests_count
         return self.transactions.filter(status='PENDING').count()
+
+
+class CoverFile(models.Model):
+    """
+    Reference count of one file in the cover storage. Book.save() and
+    Book deletes keep it current; bulk writes skip signals, so `gc_covers`
+    recounts from the Book table before deleting anything.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    # Name without extension; renditions (`<stem>.thumb.jpg`) share it
+    stem = models.CharField(max_length=255, db_index=True)
+    refs = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs})"
+
+    @staticmethod
+    def stem_of(name):
+        return posixpath.splitext(name)[0]
+
+    @classmethod
+    def retain(cls, name):
+        if not name:
+            return
+        if cls.objects.filter(name=name).update(refs=F('refs') + 1, updated_at=now()):
+            return
+        _, created = cls.objects.get_or_create(
+            name=name, defaults={'stem': cls.stem_of(name), 'refs': 1})
+        if not created:  # lost a race with another first reference
+            cls.objects.filter(name=name).update(refs=F('refs') + 1, updated_at=now())
+
+    @classmethod
+    def release(cls, name):
+        if name:
+            cls.objects.filter(name=name, refs__gt=0).update(
+                refs=F('refs') - 1, updated_at=now())
+
+    @classmethod
+    def recount(cls):
+        """Rebuild every count from the Book table; returns rows touched"""
+        counts = dict(
+            Book.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+            .order_by().values_list('cover_image').annotate(models.Count('id')))
+        rows = [cls(name=name, stem=cls.stem_of(name), refs=refs, updated_at=now())
+                for name, refs in counts.items()]
+        with transaction.atomic():
+            cls.objects.exclude(name__in=counts).filter(refs__gt=0).update(
+                refs=0, updated_at=now())
+            cls.objects.bulk_create(
+                rows, batch_size=500, update_conflicts=True,
+                unique_fields=['name'], update_fields=['refs', 'updated_at'])
+        return len(rows)
+
+
+def release_cover_file(sender, instance, **kwargs):
+    """post_delete: the book no longer references its cover"""
+    if 'cover_image' in instance.__dict__:
+        CoverFile.release(instance.cover_image.name)
+
+
+class BookSearchIndex(models.Model):
+    """
+    Read-only mapping of the FTS5 table that mirrors Book's text columns.
+    The table and its sync triggers live in books/search.py; query it through
+    `Book.objects.filter(search_index__document__match=...)`.
+    """
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search_index'
+    )
+    title = models.TextField()
+    author = models.TextField()
+    description = models.TextField()
+    isbn = models.TextField()
+    document = FullTextField(db_column='books_book_fts')
+    rank = models.FloatField(db_column='rank')
+
+    class Meta:
+        managed = False
+        db_table = 'books_book_fts'
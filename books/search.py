@@ -0,0 +1,167 @@
+"""
+SQLite FTS5 full-text index for books.
+
+`books_book_fts` is an external-content FTS5 table over the title, author,
+description and isbn columns of `books_book`. Triggers keep it in step with
+every INSERT/UPDATE/DELETE, so plain saves, deletes and bulk operations
+(bulk_create, queryset.update/delete) are all covered without Python hooks.
+"""
+from django.db import connections, models
+from django.db.models import F
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+FTS_TABLE = 'books_book_fts'
+BOOK_TABLE = 'books_book'
+FTS_COLUMNS = ('title', 'author', 'description', 'isbn')
+
+_columns = ', '.join(FTS_COLUMNS)
+_new_values = ', '.join(f'new.{column}' for column in FTS_COLUMNS)
+_old_values = ', '.join(f'old.{column}' for column in FTS_COLUMNS)
+_changed = ' OR '.join(
+    f'old.{column} IS NOT new.{column}' for column in FTS_COLUMNS)
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_columns},
+        content='{BOOK_TABLE}', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {BOOK_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {BOOK_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON {BOOK_TABLE}
+    WHEN {_changed} OR old.id IS NOT new.id BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+_available = {}
+
+
+def supports_search_index(connection):
+    """FTS5 is SQLite only; other databases keep DRF's LIKE search"""
+    return connection.vendor == 'sqlite'
+
+
+def ensure_search_index(connection):
+    """
+    Create the FTS table and sync triggers if missing. Safe to call repeatedly;
+    SQLite drops a table's triggers when a migration rebuilds that table, so
+    this also runs after every migrate.
+    """
+    if not supports_search_index(connection):
+        return False
+    with connection.cursor() as cursor:
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+    _available[connection.alias] = True
+    return True
+
+
+def rebuild_search_index(connection):
+    """Recreate the index contents from books_book in a single statement"""
+    if not ensure_search_index(connection):
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return True
+
+
+def drop_search_index(connection):
+    if not supports_search_index(connection):
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+    _available.pop(connection.alias, None)
+
+
+def repair_search_index(sender, using, **kwargs):
+    """post_migrate hook: put back triggers dropped by a table rebuild"""
+    connection = connections[using]
+    _available.pop(using, None)
+    if search_index_available(connection):
+        ensure_search_index(connection)
+
+
+def search_index_available(connection):
+    if connection.alias not in _available:
+        available = False
+        if supports_search_index(connection):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [FTS_TABLE])
+                available = cursor.fetchone() is not None
+        _available[connection.alias] = available
+    return _available[connection.alias]
+
+
+def build_match_query(terms):
+    """
+    Turn user search terms into an FTS5 query: every term must match, and
+    the last characters typed act as a prefix ("tolk" finds "Tolkien").
+    Terms are quoted so FTS5 syntax (AND, NEAR, *, -) is taken literally.
+    """
+    phrases = []
+    for term in terms:
+        term = term.strip()
+        if term:
+            phrases.append('"%s"*' % term.replace('"', '""'))
+    return ' '.join(phrases)
+
+
+class FullTextField(models.TextField):
+    """The FTS5 hidden column named after its table; only supports `match`"""
+
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter backed by the FTS5 index with BM25 ranking and prefix
+    matching. Results are ordered by relevance unless the client asked for an
+    explicit ?ordering=. Falls back to DRF's LIKE search without the index.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        match = build_match_query(self.get_search_terms(request))
+        if not match:
+            return queryset
+
+        if not search_index_available(connections[queryset.db]):
+            return super().filter_queryset(request, queryset, view)
+
+        queryset = queryset.filter(
+            search_index__document__match=match
+        ).annotate(search_rank=F('search_index__rank'))
+
+        if not request.query_params.get(api_settings.ORDERING_PARAM):
+            # bm25() scores are negative, lower is more relevant
+            queryset = queryset.order_by('search_rank')
+        return queryset
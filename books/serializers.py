@@ -1,26 +1,101 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.utils.serializer_helpers import ReturnList
+from entities.serializers import PublicUserSerializer
+from utils.fragments import FragmentCacheMixin
+from utils.geo import GEO_FIELDS
+from utils.sparse import SparseFieldsMixin
+from .covers import cover_urls, rendition_urls
 from .models import Book
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookListSerializer(serializers.ListSerializer):
+    """
+    BookSerializer(many=True): creates with one bulk_create and updates with
+    one bulk_update. For updates `instance` is the list of books being
+    edited and each item of the input carries its book's `id`.
+    """
+
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            # Validate each item against its own book (partial updates,
+            # field-level rules that look at the current values)
+            if not hasattr(self, '_instances'):
+                self._instances = {book.pk: book for book in self.instance}
+            self.child.instance = self._instances.get(_book_id(data))
+        return super().run_child_validation(data)
+
+    def create(self, validated_data):
+        books = []
+        for attrs in validated_data:
+            book = Book(**attrs)
+            if not book.location and book.owner.location:
+                book.location = book.owner.location
+            book.set_coordinates()  # bulk_create skips save()
+            books.append(book)
+        return Book.objects.bulk_create(books)
+
+    def update(self, instances, validated_data):
+        by_id = {book.pk: book for book in instances}
+        now = timezone.now()
+        fields = {'updated_at'}
+        books = []
+        for item, attrs in zip(self.initial_data, validated_data):
+            book = by_id[_book_id(item)]
+            for field, value in attrs.items():
+                setattr(book, field, value)
+            if 'location' in attrs:
+                book.set_coordinates()
+                fields.update(GEO_FIELDS)
+            book.updated_at = now
+            fields.update(attrs)
+            books.append(book)
+        Book.objects.bulk_update(books, sorted(fields))
+        return books
+
+
+def _book_id(data):
+    try:
+        return int(data.get('id'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class BookSerializer(SparseFieldsMixin, FragmentCacheMixin, serializers.ModelSerializer):
     owner = serializers.StringRelatedField(
         read_only=True)  # Show username instead of ID
     cover_image_url = serializers.SerializerMethodField()
+    cover_images = serializers.SerializerMethodField()
+
+    # ?expand=owner
+    expandable_fields = {'owner': lambda: PublicUserSerializer(read_only=True)}
+    sparse_sources = {
+        'owner': ['owner__username'],
+        'cover_image_url': ['cover_image'],
+        'cover_images': ['cover_image', 'cover_renditions'],
+    }
 
     class Meta:
         model = Book
         fields = [
             'id', 'owner', 'title', 'author', 'isbn', 'description',
             'genre', 'condition', 'daily_rental_price', 'cover_image',
-            'cover_image_url', 'is_available', 'location', 'created_at'
+            'cover_image_url', 'cover_images', 'is_available', 'location',
+            'created_at'
         ]
-        read_only_fields = ['owner', 'created_at', 'cover_image_url']
+        read_only_fields = ['owner', 'created_at', 'cover_image_url', 'cover_images']
+        list_serializer_class = BookListSerializer
 
     def get_cover_image_url(self, obj):
         if obj.cover_image:
             return obj.cover_image.url
         return None
 
+    def get_cover_images(self, obj):
+        # original, thumb, detail, thumb_webp, detail_webp, srcset, webp_srcset
+        return rendition_urls(obj) or None
+
     def validate_daily_rental_price(self, value):
         if value < 0:
             raise serializers.ValidationError(
@@ -33,3 +108,98 @@ class BookSerializer(serializers.ModelSerializer):
         # Set the owner to the current user
         validated_data['owner'] = self.context['request'].user
         return super().create(validated_data)
+
+
+class OwnerBookSerializer(BookSerializer):
+    """
+    BookSerializer plus borrow-request info for the owner's own views.
+    Expects a queryset from Book.objects.with_request_stats().
+    """
+    # Request counts change without the book's updated_at moving
+    fragment_cache = False
+
+    pending_requests_count = serializers.IntegerField(
+        source='get_pending_requests_count', read_only=True)
+    has_pending_requests = serializers.BooleanField(read_only=True)
+    last_request_date = serializers.DateTimeField(read_only=True, default=None)
+
+    class Meta(BookSerializer.Meta):
+        fields = BookSerializer.Meta.fields + [
+            'pending_requests_count', 'has_pending_requests', 'last_request_date'
+        ]
+        read_only_fields = BookSerializer.Meta.read_only_fields + [
+            'pending_requests_count', 'has_pending_requests', 'last_request_date'
+        ]
+
+
+class BookRowSerializer:
+    """
+    Read-only fast path for book listings: the same output as
+    BookSerializer(many=True), built from `.values()` rows instead of model
+    instances.
+
+    The converters are BookSerializer's own bound fields, looked up once, so
+    every value goes through the identical to_representation() and only the
+    per-row model instantiation, related-object lookups and field dispatch
+    are skipped. BooksFastPathTests compares the rendered bytes.
+    """
+    # Serializer field -> .values() column, where the names differ
+    columns = {'owner': 'owner__username'}
+    extra_columns = ['cover_renditions']
+
+    def __init__(self, instance=None, context=None):
+        self.instance = instance
+        self.context = context or {}
+        reference = BookSerializer(context=self.context)
+        fields = reference.fields
+        image_field = Book._meta.get_field('cover_image')
+        storage = image_field.storage
+
+        def cover_image(row, convert=fields['cover_image'].to_representation,
+                        attr_class=image_field.attr_class):
+            # A FieldFile is cheap to build and keeps the URL logic DRF's
+            return convert(attr_class(None, image_field, row['cover_image']))
+
+        special = {
+            'owner': lambda row: row['owner__username'],
+            'cover_image': cover_image,
+            'cover_image_url': lambda row: (
+                storage.url(row['cover_image']) if row['cover_image'] else None),
+            'cover_images': lambda row: cover_urls(
+                storage, row['cover_image'], row['cover_renditions']) or None,
+        }
+        unknown = [name for name, field in fields.items()
+                   if name not in special and field.source != name]
+        if unknown:
+            # BookSerializer grew a field this path cannot reproduce
+            raise ImproperlyConfigured(f'BookRowSerializer cannot build {unknown}')
+
+        self.converters = []
+        for name, field in fields.items():
+            if field.write_only:
+                continue
+            if name in special:
+                self.converters.append((name, special[name]))
+            else:
+                self.converters.append((name, self._plain(name, field.to_representation)))
+
+    @staticmethod
+    def _plain(name, convert):
+        def converter(row):
+            value = row[name]
+            return None if value is None else convert(value)
+        return converter
+
+    @classmethod
+    def value_columns(cls):
+        names = [cls.columns.get(name, name) for name in BookSerializer.Meta.fields
+                 if name not in ('cover_image_url', 'cover_images')]
+        return names + cls.extra_columns
+
+    def to_representation(self, row):
+        return {name: convert(row) for name, convert in self.converters}
+
+    @property
+    def data(self):
+        return ReturnList([self.to_representation(row) for row in self.instance],
+                          serializer=self)
@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from transactions.models import BorrowTransaction
+from .cache import bump_catalogue_version_on_commit, invalidation_deferred
+from .models import Book
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+@receiver(post_save, sender=BorrowTransaction)
+@receiver(post_delete, sender=BorrowTransaction)
+def invalidate_catalogue_cache(sender, instance, **kwargs):
+    """Cached book listings are keyed on the catalogue version"""
+    if not invalidation_deferred():
+        bump_catalogue_version_on_commit()
+
+
+@receiver(pre_save, sender=User)
+def detect_owner_rename(sender, instance, update_fields=None, **kwargs):
+    instance._renamed = False
+    if instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return  # e.g. the last_login update on every sign-in
+    previous = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+    instance._renamed = previous is not None and previous != instance.username
+
+
+@receiver(post_save, sender=User)
+def touch_renamed_owners_books(sender, instance, **kwargs):
+    """
+    Book payloads show the owner's username, so a rename has to move the
+    books' updated_at: that retires their ETags, serialized fragments and
+    cached listings like any other edit.
+    """
+    if getattr(instance, '_renamed', False):
+        Book.objects.filter(owner=instance).update(updated_at=timezone.now())
+        bump_catalogue_version_on_commit()
@@ -0,0 +1,61 @@
+"""
+Content-addressed storage for book covers.
+
+Uploads are named after the SHA-256 of their bytes
+(`book_covers/3f/3fa9...c1.jpg`), so the same publisher cover uploaded by
+fifty owners is stored once, and a URL always serves the same bytes and can
+be cached forever. Files are never overwritten or deleted on save; how many
+books point at each one is tracked in `CoverFile`, and files no book uses
+any more are removed by the `gc_covers` command.
+"""
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible(path='books.storage.ContentHashStorage')
+class ContentHashStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """`upload_to` directory + two-character fan-out + digest + extension"""
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        digest = content_hash(content)
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            from django.core.files import File
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Same bytes, same name: nothing to write. Touch it so gc_covers'
+            # grace period covers a file that was orphaned until just now.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+    def save_as(self, name, content, max_length=None):
+        """Store under `name` as given, for files derived from a hashed
+        original (renditions are named after their source's stem)"""
+        return super().save(name, content, max_length=max_length)
+
+
+cover_storage = ContentHashStorage()
@@ -1,3 +1,899 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APIClient
+
+from entities.models import User
+from transactions.models import BorrowTransaction
+from utils import geo
+from utils.geo import within_radius
+from utils.testing import QueryPlanAssertions
+from .cache import catalogue_cache_stats
+from .models import Book, CoverFile
+from .search import FTS_TABLE, build_match_query
+from .views import BookListView
+
+
+class BookQueryPlanTests(QueryPlanAssertions, TestCase):
+    """The hot Book queries must be served by an index, not a table scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+
+    def test_owner_books_newest_first(self):
+        self.assertUsesIndex(
+            Book.objects.filter(owner=self.owner).order_by('-created_at', '-id'),
+            'book_owner_recent_idx', allow_sort=False)
+
+    def test_catalogue_newest_first(self):
+        self.assertUsesIndex(
+            Book.objects.order_by('-created_at', '-id'),
+            'book_recent_idx', allow_sort=False)
+
+    def test_available_books_newest_first(self):
+        self.assertUsesIndex(
+            Book.objects.filter(is_available=True).order_by('-created_at', '-id'),
+            'book_available_recent_idx', allow_sort=False)
+
+    def test_genre_filter_newest_first(self):
+        self.assertUsesIndex(
+            Book.objects.filter(genre='FICTION').order_by('-created_at', '-id'),
+            'book_genre_recent_idx', allow_sort=False)
+
+    def test_available_genre_filter_newest_first(self):
+        self.assertUsesIndex(
+            Book.objects.filter(is_available=True, genre='FICTION')
+            .order_by('-created_at', '-id'),
+            'book_avail_genre_recent_idx', allow_sort=False)
+
+    def test_near_prunes_with_geohash(self):
+        self.assertUsesIndex(within_radius(Book.objects.all(), -1.2864, 36.8172, 10),
+                             'book_geohash_idx')
+
+
+class BookRequestStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.books = [
+            Book.objects.create(owner=cls.owner, title=f'Book {i}', author='Anon')
+            for i in range(3)
+        ]
+        for status in ('PENDING', 'PENDING', 'REJECTED'):
+            BorrowTransaction.objects.create(
+                book=cls.books[0], borrower=cls.borrower, lender=cls.owner,
+                status=status)
+
+    def test_annotations_replace_per_row_queries(self):
+        with self.assertNumQueries(1):
+            books = {book.pk: book for book in Book.objects.with_request_stats()}
+            busy, idle = books[self.books[0].pk], books[self.books[1].pk]
+
+            self.assertTrue(busy.has_pending_requests)
+            self.assertEqual(busy.get_pending_requests_count(), 2)
+            self.assertIsNotNone(busy.last_request_date)
+            self.assertFalse(idle.has_pending_requests)
+            self.assertEqual(idle.get_pending_requests_count(), 0)
+            self.assertIsNone(idle.last_request_date)
+
+    def test_my_books_query_count_is_constant(self):
+        api = APIClient()
+        api.force_authenticate(self.owner)
+        with self.assertNumQueries(1):
+            data = api.get('/api/books/my-books/').json()
+
+        counts = {book['title']: book['pending_requests_count']
+                  for book in data['results']}
+        self.assertEqual(counts, {'Book 0': 2, 'Book 1': 0, 'Book 2': 0})
+
+
+class BookImportTests(TestCase):
+    csv_data = (
+        'title,author,genre,condition,daily_rental_price,isbn\n'
+        'Dune,Frank Herbert,SCI_FI,GOOD,1.50,\n'
+        'Emma,Jane Austen,NOVELLA,GOOD,1.00,\n'
+        'Ulysses,James Joyce,FICTION,FAIR,-2,\n'
+        '"Things Fall Apart",Chinua Achebe,FICTION,NEW,0.75,9780385474542\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            'owner', password='pass12345!', location='Nairobi')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.owner)
+
+    def upload(self, name, content):
+        if isinstance(content, str):
+            content = content.encode()
+        upload = SimpleUploadedFile(name, content)
+        return self.api.post('/api/books/import/', {'file': upload}, format='multipart')
+
+    def test_csv_upload_reports_rejected_rows(self):
+        response = self.upload('books.csv', self.csv_data)
+        self.assertEqual(response.status_code, 201)
+
+        report = response.json()
+        self.assertEqual((report['created'], report['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in report['errors']], [3, 4])
+        self.assertIn('genre', report['errors'][0]['errors'])
+        self.assertIn('daily_rental_price', report['errors'][1]['errors'])
+
+        book = Book.objects.get(title='Things Fall Apart')
+        self.assertEqual(book.owner, self.owner)
+        self.assertEqual(book.location, 'Nairobi')
+        # The FTS trigger indexed the bulk-inserted rows
+        results = self.api.get('/api/books/?search=achebe').json()['results']
+        self.assertEqual([b['title'] for b in results], ['Things Fall Apart'])
+
+    def test_rows_are_inserted_in_batches(self):
+        rows = ''.join(
+            f'{{"title": "Book {i}", "author": "Author", "daily_rental_price": "1.00"}}\n'
+            for i in range(25))
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'books.jsonl')
+        with open(path, 'w') as f:
+            f.write(rows + 'not json\n')
+
+        out, err = StringIO(), StringIO()
+        # owner lookup + (savepoint, insert, release) per batch of 10
+        with self.assertNumQueries(1 + 3 * 3):
+            call_command('import_books', path, '--owner', 'owner', '--batch-size', '10',
+                         stdout=out, stderr=err)
+        self.assertIn('Imported 25 books in 3 batches, 1 rows rejected', out.getvalue())
+        self.assertIn('Row 26', err.getvalue())
+        self.assertEqual(Book.objects.filter(owner=self.owner).count(), 25)
+
+    def test_requires_authentication(self):
+        self.api.force_authenticate(None)
+        self.assertEqual(self.upload('books.csv', self.csv_data).status_code, 401)
+
+    def test_unreadable_stream_reports_the_rows_already_inserted(self):
+        content = b'title,author\nDune,Herbert\nEmma,Austen\n\xff\xfeUlysses,Joyce\nKim,Kipling\n'
+        response = self.upload('books.csv', content)
+        self.assertEqual(response.status_code, 201)
+        report = response.json()
+        self.assertEqual((report['created'], report['failed'], report['aborted']), (2, 1, True))
+        self.assertEqual(report['errors'][0]['row'], 4)
+        self.assertIn('import stopped', report['errors'][0]['errors']['non_field_errors'][0])
+        self.assertEqual(sorted(Book.objects.values_list('title', flat=True)), ['Dune', 'Emma'])
+
+        response = self.upload('books.csv', b'\xff\xfe\x00title,author\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual((response.json()['created'], response.json()['aborted']), (0, True))
+
+
+class BookBulkApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            'owner', password='pass12345!', location='Nairobi')
+        cls.other = User.objects.create_user('other', password='pass12345!')
+        cls.books = [
+            Book.objects.create(owner=cls.owner, title=f'Book {i}', author='Author')
+            for i in range(3)
+        ]
+        cls.foreign = Book.objects.create(owner=cls.other, title='Theirs', author='X')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.owner)
+
+    def test_bulk_create(self):
+        payload = [
+            {'title': f'New {i}', 'author': 'Author', 'daily_rental_price': '1.00'}
+            for i in range(5)
+        ]
+        # savepoint, one INSERT, release
+        with self.assertNumQueries(3):
+            response = self.api.post('/api/books/', payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()), 5)
+        self.assertEqual(
+            Book.objects.filter(title__startswith='New', location='Nairobi').count(), 5)
+
+    def test_bulk_create_validates_every_item(self):
+        payload = [{'title': 'Fine', 'author': 'A'},
+                   {'title': 'Bad', 'author': 'A', 'daily_rental_price': '-1'}]
+        response = self.api.post('/api/books/', payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[0], {})
+        self.assertIn('daily_rental_price', response.json()[1])
+        self.assertFalse(Book.objects.filter(title='Fine').exists())
+
+    def test_bulk_update(self):
+        payload = [{'id': book.pk, 'is_available': False, 'daily_rental_price': '2.50'}
+                   for book in self.books]
+        # owner check + savepoint, UPDATE, release
+        with self.assertNumQueries(4):
+            response = self.api.patch('/api/books/', payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Book.objects.filter(owner=self.owner, is_available=False,
+                                daily_rental_price='2.50').count(), 3)
+
+    def test_bulk_writes_refuse_other_owners_books(self):
+        payload = [{'id': self.books[0].pk, 'title': 'Mine'},
+                   {'id': self.foreign.pk, 'title': 'Stolen'}]
+        response = self.api.patch('/api/books/', payload, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            self.api.delete('/api/books/', [self.foreign.pk], format='json').status_code, 403)
+        self.assertEqual(
+            self.api.delete('/api/books/', [999999], format='json').status_code, 404)
+        self.assertEqual(Book.objects.filter(title__in=['Mine', 'Stolen']).count(), 0)
+        self.assertTrue(Book.objects.filter(pk=self.foreign.pk).exists())
+
+    def test_bulk_delete(self):
+        ids = [book.pk for book in self.books[:2]]
+        response = self.api.delete(f'/api/books/?ids={ids[0]},{ids[1]}')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Book.objects.filter(owner=self.owner)), [self.books[2]])
+
+    def test_bulk_delete_rejects_non_list_ids(self):
+        digits = ''.join(str(book.pk) for book in self.books[:2])
+        for body in ({'ids': digits}, {'ids': self.books[0].pk}, str(self.books[0].pk)):
+            response = self.api.delete('/api/books/', body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertEqual(Book.objects.filter(owner=self.owner).count(), 3)
+
+        response = self.api.delete('/api/books/', {'ids': [self.books[0].pk]}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+    def test_bulk_delete_invalidates_caches_once(self):
+        for book in self.books:
+            BorrowTransaction.objects.create(book=book, borrower=self.other, lender=self.owner)
+        ids = [book.pk for book in self.books]
+        with mock.patch('books.views.invalidate_user_caches') as invalidate, \
+                mock.patch('transactions.signals.invalidate_user_caches') as per_loan, \
+                mock.patch('transactions.signals.invalidate_book_caches') as per_book, \
+                mock.patch('books.cache.bump_catalogue_version') as bump, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.api.delete('/api/books/', ids, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Book.objects.filter(pk__in=ids).exists())
+        invalidate.assert_called_once_with(self.owner.pk, self.other.pk)
+        per_loan.assert_not_called()
+        per_book.assert_not_called()
+        self.assertEqual(bump.call_count, 2)  # now and on commit
+
+        # Single deletes still go through the signals
+        foreign_pk = self.foreign.pk
+        with mock.patch('transactions.signals.invalidate_book_caches') as per_book:
+            self.foreign.delete()
+        per_book.assert_called_once_with([foreign_pk], self.other.pk)
+
+
+def make_image(size=(1200, 1800), format='JPEG'):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 80, 40)).save(buffer, format)
+    return buffer.getvalue()
+
+
+class CoverRenditionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media.name
+
+    def test_upload_generates_renditions(self):
+        from PIL import Image
+
+        book = Book.objects.create(
+            owner=self.owner, title='Dune', author='Herbert',
+            cover_image=SimpleUploadedFile('dune.jpg', make_image(), 'image/jpeg'))
+        book.refresh_from_db()
+
+        self.assertEqual(set(book.cover_renditions),
+                         {'thumb', 'thumb_webp', 'detail', 'detail_webp'})
+        storage = book.cover_image.storage
+        with storage.open(book.cover_renditions['thumb']) as f:
+            self.assertEqual(Image.open(f).size, (200, 300))
+        with storage.open(book.cover_renditions['detail_webp']) as f:
+            image = Image.open(f)
+            self.assertEqual((image.format, image.size), ('WEBP', (600, 900)))
+
+        client = APIClient()
+        data = client.get(f'/api/books/{book.pk}/').json()
+        images = data['cover_images']
+        stem = book.cover_image.name.rsplit('.', 1)[0]
+        self.assertTrue(images['thumb'].endswith(stem + '.thumb.jpg'))
+        self.assertEqual(images['original'], data['cover_image_url'])
+        self.assertIn(' 200w', images['srcset'])
+        self.assertIn(stem + '.detail.webp 600w', images['webp_srcset'])
+
+    def test_missing_renditions_fall_back_to_original(self):
+        book = Book.objects.create(owner=self.owner, title='Old', author='A')
+        data = APIClient().get(f'/api/books/{book.pk}/').json()
+        self.assertEqual(data['cover_images']['thumb'], data['cover_image_url'])
+        self.assertIsNone(data['cover_images']['thumb_webp'])
+        self.assertIsNone(data['cover_images']['srcset'])
+
+    def test_backfill_command_processes_shared_covers_once(self):
+        os.makedirs(os.path.join(self.media_root, 'book_covers'))
+        with open(os.path.join(self.media_root, 'book_covers', 'default_cover.jpg'), 'wb') as f:
+            f.write(make_image((400, 600)))
+        Book.objects.bulk_create([
+            Book(owner=self.owner, title=f'Book {i}', author='A') for i in range(3)])
+
+        out = StringIO()
+        call_command('generate_cover_renditions', stdout=out)
+        self.assertIn('for 1 covers (3 books)', out.getvalue())
+        self.assertFalse(Book.objects.filter(cover_renditions={}).exists())
+
+        out = StringIO()
+        call_command('generate_cover_renditions', stdout=out)
+        self.assertIn('for 0 covers', out.getvalue())
+
+
+class CoverStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, title, content, filename='cover.jpg'):
+        return Book.objects.create(
+            owner=self.owner, title=title, author='A',
+            cover_image=SimpleUploadedFile(filename, content, 'image/jpeg'))
+
+    def refs(self, name):
+        return CoverFile.objects.get(name=name).refs
+
+    def test_identical_uploads_share_one_file(self):
+        image = make_image((300, 450))
+        first = self.upload('One', image, 'front.JPG')
+        second = self.upload('Two', image, 'scan.jpg')
+        other = self.upload('Three', make_image((310, 450)))
+
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertNotEqual(first.cover_image.name, other.cover_image.name)
+        self.assertRegex(first.cover_image.name, r'^book_covers/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(self.refs(first.cover_image.name), 2)
+
+        second.delete()
+        self.assertEqual(self.refs(first.cover_image.name), 1)
+        first.cover_image = 'book_covers/default_cover.jpg'
+        first.save()
+        self.assertEqual(self.refs(other.cover_image.name), 1)
+        self.assertEqual(self.refs('book_covers/default_cover.jpg'), 1)
+        self.assertEqual(CoverFile.objects.get(
+            name=second.cover_image.name).refs, 0)
+
+    def test_gc_deletes_orphans_and_their_renditions_only(self):
+        kept = self.upload('Kept', make_image((300, 450)))
+        dropped = self.upload('Dropped', make_image((320, 450)))
+        storage = kept.cover_image.storage
+        orphan_files = [dropped.cover_image.name, *dropped.cover_renditions.values()]
+        # A queryset update bypasses the counts; gc_covers recounts first
+        Book.objects.filter(pk=dropped.pk).update(cover_image=kept.cover_image.name)
+
+        out = StringIO()
+        call_command('gc_covers', '--grace-minutes=0', '--chunk-size=3', stdout=out)
+        self.assertIn('Deleted 5 of 10 cover files', out.getvalue())
+        for name in orphan_files:
+            self.assertFalse(storage.exists(name), name)
+        self.assertTrue(storage.exists(kept.cover_image.name))
+        self.assertTrue(storage.exists(kept.cover_renditions['thumb_webp']))
+        self.assertEqual(self.refs(kept.cover_image.name), 2)
+
+        # Young files are left alone
+        self.upload('New', make_image((330, 450))).delete()
+        out = StringIO()
+        call_command('gc_covers', stdout=out)
+        self.assertIn('Deleted 0 of', out.getvalue())
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.owner, title='Dune', author='Herbert')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_detail_not_modified_until_updated(self):
+        url = f'/api/books/{self.book.pk}/'
+        first = self.client.get(url)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+        self.assertIn('Last-Modified', first)
+
+        with self.assertNumQueries(1):
+            second = self.revalidate(url, first)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        self.book.title = 'Dune Messiah'
+        self.book.save()
+        third = self.revalidate(url, first)
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(third.json()['title'], 'Dune Messiah')
+
+    def test_list_changes_on_insert_and_delete(self):
+        url = '/api/books/?genre=FICTION'
+        first = self.client.get(url)
+        # Served from the catalogue cache without touching the database
+        with self.assertNumQueries(0):
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+        # Uncached: one aggregate; no page query, no serialization
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(url, first).status_code, 304)
+
+        other = Book.objects.create(owner=self.owner, title='Emma', author='Austen')
+        second = self.client.get(url)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+
+        Book.objects.filter(pk=other.pk).delete()
+        self.assertEqual(self.revalidate(url, second).status_code, 200)
+        self.assertNotEqual(self.client.get('/api/books/?genre=SCI_FI')['ETag'], first['ETag'])
+
+    def test_list_ignores_if_modified_since_after_delete(self):
+        older = Book.objects.create(owner=self.owner, title='Emma', author='Austen')
+        Book.objects.filter(pk=older.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        self.book.save()  # newest row
+        url = '/api/books/'
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        since = http_date(time.time() + 60)
+
+        older.delete()
+        for cached in (False, True):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=since)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['X-Cache'], 'HIT' if cached else 'MISS')
+            self.assertEqual([book['title'] for book in response.json()['results']], ['Dune'])
+
+    def test_api_client_revalidates_with_cached_validator(self):
+        from django.test import RequestFactory
+        from utils.api_client import APIClient as PageAPIClient, validator_cache
+
+        validator_cache.clear()
+        self.addCleanup(validator_cache.clear)
+        page_request = RequestFactory().get('/books/')
+
+        first = PageAPIClient(page_request, transport='inprocess').get('/books/')
+        cache.clear()
+        with self.assertNumQueries(1):
+            second = PageAPIClient(page_request, transport='inprocess').get('/books/')
+        self.assertEqual(second, first)
+        self.assertEqual(second['results'][0]['title'], 'Dune')
+
+        Book.objects.filter(pk=self.book.pk).update(title='Changed', updated_at=timezone.now())
+        third = PageAPIClient(page_request, transport='inprocess').get('/books/')
+        self.assertEqual(third['results'][0]['title'], 'Changed')
+
+
+class CatalogueCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.owner, title='Dune', author='Herbert')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def titles(self, response):
+        return [book['title'] for book in response.json()['results']]
+
+    def test_hits_after_first_request_with_normalized_params(self):
+        first = self.client.get('/api/books/?genre=FICTION&ordering=title')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/books/?utm_source=x&ordering=title&genre=FICTION&search=')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.client.get('/api/books/?genre=SCI_FI')['X-Cache'], 'MISS')
+
+        stats = catalogue_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        out = StringIO()
+        call_command('catalogue_cache_stats', stdout=out)
+        self.assertIn('hit_ratio=33.3%', out.getvalue())
+
+    def test_book_and_transaction_writes_bump_the_version(self):
+        from transactions import services
+
+        self.assertEqual(self.titles(self.client.get('/api/books/')), ['Dune'])
+        Book.objects.create(owner=self.owner, title='Emma', author='Austen')
+        response = self.client.get('/api/books/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(self.titles(response), ['Emma', 'Dune'])
+
+        # Accepting a loan hides the book from anonymous visitors, through
+        # a queryset.update() that sends no Book signal
+        loan = BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.owner)
+        self.client.get('/api/books/')
+        services.accept_request(loan.pk, self.owner)
+        self.assertEqual(self.titles(self.client.get('/api/books/')), ['Emma'])
+
+        self.client.force_authenticate(self.borrower)
+        self.assertEqual(self.titles(self.client.get('/api/books/')), ['Emma', 'Dune'])
+
+    def test_file_based_backend(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                        'LOCATION': location}}):
+            self.assertEqual(self.client.get('/api/books/')['X-Cache'], 'MISS')
+            self.assertEqual(self.client.get('/api/books/')['X-Cache'], 'HIT')
+            self.book.save()
+            self.assertEqual(self.client.get('/api/books/')['X-Cache'], 'MISS')
+            self.assertEqual(catalogue_cache_stats()['hits'], 1)
+
+    def test_scheme_is_part_of_the_key(self):
+        Book.objects.create(owner=self.owner, title='Emma', author='Austen')
+        plain = self.client.get('/api/books/?page_size=1')
+        secure = self.client.get('/api/books/?page_size=1', secure=True)
+        self.assertEqual(secure['X-Cache'], 'MISS')
+        self.assertTrue(plain.json()['next'].startswith('http://testserver/'))
+        self.assertTrue(secure.json()['next'].startswith('https://testserver/'))
+        self.assertEqual(self.client.get('/api/books/?page_size=1', secure=True)['X-Cache'], 'HIT')
+
+
+class BooksFastPathTests(TestCase):
+    """BookRowSerializer must render exactly what BookSerializer renders"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!', location='Nairobi')
+        cls.other = User.objects.create_user('other', password='pass12345!')
+        books = [
+            Book(owner=cls.owner, title='Dune', author='Herbert', isbn='9780441013593',
+                 description='Spice', genre='SCI_FI', daily_rental_price=Decimal('1.5'),
+                 cover_renditions={'thumb': 'book_covers/ab/ab.thumb.jpg',
+                                   'thumb_webp': 'book_covers/ab/ab.thumb.webp'},
+                 cover_image='book_covers/ab/ab.jpg'),
+            Book(owner=cls.other, title='Emma', author='Austen', cover_image='',
+                 is_available=False),
+            Book(owner=cls.owner, title='Dune Messiah', author='Herbert', condition='POOR',
+                 daily_rental_price=Decimal('0.10')),
+        ]
+        books += [Book(owner=cls.other, title=f'Filler {i}', author='Anon') for i in range(5)]
+        Book.objects.bulk_create(books)
+
+    def fetch(self, url, fast, client):
+        cache.clear()
+        with mock.patch.object(BookListView, 'fast_path', fast):
+            return client.get(url)
+
+    def assertSameBytes(self, url, client):
+        slow = self.fetch(url, False, client)
+        fast = self.fetch(url, True, client)
+        self.assertEqual(slow.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return slow.json()
+
+    def test_byte_identical_across_pages_orderings_and_search(self):
+        anonymous, signed_in = APIClient(), APIClient()
+        signed_in.force_authenticate(self.other)
+        for client in (anonymous, signed_in):
+            for url in ('/api/books/?page_size=3', '/api/books/?ordering=-daily_rental_price',
+                        '/api/books/?search=dune', '/api/books/?genre=SCI_FI&ordering=title'):
+                data = self.assertSameBytes(url, client)
+                # Follow the cursor in both directions
+                if data['next']:
+                    data = self.assertSameBytes(data['next'], client)
+                    if data['previous']:
+                        self.assertSameBytes(data['previous'], client)
+
+    def test_fast_path_skips_model_instances(self):
+        with mock.patch.object(BookListView, 'fast_path', True), \
+                mock.patch.object(Book, 'from_db', side_effect=AssertionError):
+            self.assertEqual(APIClient().get('/api/books/').status_code, 200)
+
+
+class SparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            'owner', email='owner@example.com', password='pass12345!', location='Nairobi')
+        Book.objects.create(owner=cls.owner, title='Dune', author='Herbert',
+                            description='Spice ' * 50)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def test_fields_trim_payload_and_columns(self):
+        with self.assertNumQueries(2) as queries:
+            sparse = self.api.get('/api/books/?fields=id,title,owner')
+        self.assertEqual(sparse.json()['results'], [
+            {'id': Book.objects.get().pk, 'owner': 'owner', 'title': 'Dune'}])
+        page_sql = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"description"', page_sql)
+        self.assertNotIn('"email"', page_sql)
+        # Cached separately from the full page
+        full = self.api.get('/api/books/')
+        self.assertIn('description', full.json()['results'][0])
+
+    def test_expand_owner_shows_public_fields_only(self):
+        response = self.api.get('/api/books/?expand=owner')
+        owner = response.json()['results'][0]['owner']
+        self.assertEqual(owner['username'], 'owner')
+        self.assertEqual(owner['location'], 'Nairobi')
+        self.assertNotIn('email', owner)
+
+        response = self.api.get('/api/books/?expand=owner&fields=title,owner.username')
+        self.assertEqual(response.json()['results'], [{'owner': {'username': 'owner'}, 'title': 'Dune'}])
+
+    def test_unknown_names_are_rejected(self):
+        for query in ('fields=id,nope', 'fields=title.x', 'expand=title', 'expand=owner.id'):
+            response = self.api.get(f'/api/books/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_fast_path_steps_aside(self):
+        with mock.patch.object(BookListView, 'fast_path', True):
+            response = self.api.get('/api/books/?fields=id,cover_images')
+        self.assertEqual(list(response.json()['results'][0]), ['id', 'cover_images'])
+
+
+class NearbyBooksTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!',
+                                             location='Westlands, Nairobi')
+        for title, location in (('Here', ''), ('Karen', 'Karen'), ('Thika', 'Thika'),
+                                ('Mombasa', 'Mombasa'), ('Nowhere', 'Atlantis')):
+            Book.objects.create(owner=cls.owner, title=title, author='A', location=location)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+
+    def titles(self, query):
+        response = self.api.get(f'/api/books/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [book['title'] for book in response.json()['results']]
+
+    def test_save_geocodes_owner_and_books(self):
+        self.assertEqual(self.owner.geohash, geo.encode(-1.2676, 36.8108))
+        here = Book.objects.get(title='Here')
+        self.assertEqual(here.location, 'Westlands, Nairobi')
+        self.assertEqual((here.latitude, here.longitude), (-1.2676, 36.8108))
+        self.assertEqual(Book.objects.get(title='Nowhere').geohash, '')
+
+        self.owner.location = 'Kisumu'
+        self.owner.save(update_fields=['location'])
+        self.owner.refresh_from_db()
+        self.assertEqual(self.owner.latitude, -0.0917)
+
+    def test_near_filters_and_sorts_by_distance(self):
+        self.assertEqual(self.titles('near=-1.2864,36.8172'), ['Here'])  # 10 km
+        self.assertEqual(self.titles('near=-1.2864,36.8172&radius_km=15'), ['Here', 'Karen'])
+        self.assertEqual(self.titles('near=Nairobi&radius_km=50'), ['Here', 'Karen', 'Thika'])
+        self.assertEqual(self.titles('near=Nairobi&radius_km=50&ordering=-distance'),
+                         ['Thika', 'Karen', 'Here'])
+        self.assertEqual(self.titles('near=Nairobi&radius_km=50&ordering=title'),
+                         ['Here', 'Karen', 'Thika'])
+        self.assertEqual(self.titles('near=Mombasa&radius_km=100'), ['Mombasa'])
+
+    def test_distance_cursor(self):
+        first = self.api.get('/api/books/?near=Nairobi&radius_km=500&page_size=2').json()
+        second = self.api.get(first['next']).json()
+        self.assertEqual([b['title'] for b in first['results'] + second['results']],
+                         ['Here', 'Karen', 'Thika', 'Mombasa'])
+
+    def test_invalid_parameters(self):
+        for query in ('near=Atlantis', 'near=91,0', 'near=Nairobi&radius_km=0',
+                      'near=Nairobi&radius_km=5000', 'near=Nairobi&radius_km=far'):
+            self.assertEqual(self.api.get(f'/api/books/?{query}').status_code, 400, query)
+
+    def test_backfill_command(self):
+        # Rows written around save(), e.g. before the columns existed
+        Book.objects.update(latitude=None, longitude=None, geohash='')
+        User.objects.update(latitude=None, longitude=None, geohash='')
+        out = StringIO()
+        call_command('geocode_locations', '--dry-run', stdout=out)
+        self.assertIn('Would update 1 users and 4 books', out.getvalue())
+        self.assertFalse(Book.objects.exclude(geohash='').exists())
+
+        call_command('geocode_locations', stdout=out)
+        self.assertEqual(Book.objects.exclude(geohash='').count(), 4)
+        self.assertIn('1 locations are not in the gazetteer', out.getvalue())
+        self.assertEqual(self.titles('near=Nairobi&radius_km=15'), ['Here', 'Karen'])
+
+
+class BookFacetsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+        for genre, condition, price, available in (
+                ('SCI_FI', 'GOOD', '0.40', True), ('SCI_FI', 'NEW', '1.00', True),
+                ('FICTION', 'GOOD', '2.50', False), ('MYSTERY', 'POOR', '7.00', True)):
+            Book.objects.create(owner=cls.owner, title=f'{genre} {condition}', author='A',
+                                genre=genre, condition=condition,
+                                daily_rental_price=Decimal(price), is_available=available)
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.owner)
+
+    def facets(self, query=''):
+        response = self.api.get(f'/api/books/facets/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        counts = {name: {item.get('value', item.get('min')): item['count']
+                         for item in items if item['count']}
+                  for name, items in data['facets'].items()}
+        return data['count'], counts
+
+    def listed(self, query):
+        return len(self.api.get(f'/api/books/?{query}').json()['results'])
+
+    def test_one_grouped_query_per_facet(self):
+        with self.assertNumQueries(4):
+            total, counts = self.facets()
+        self.assertEqual(total, 4)
+        self.assertEqual(counts['genre'], {'SCI_FI': 2, 'FICTION': 1, 'MYSTERY': 1})
+        self.assertEqual(counts['is_available'], {True: 3, False: 1})
+        self.assertEqual(counts['price'], {'0.00': 1, '1.00': 1, '2.00': 1, '5.00': 1})
+
+    def test_counts_agree_with_listing(self):
+        query = 'genre=SCI_FI&condition=GOOD&is_available=true&min_price=0.1'
+        total, counts = self.facets(query)
+        self.assertEqual(total, self.listed(query))
+        # A facet ignores its own selection: the other genres stay visible
+        self.assertEqual(counts['genre'], {'SCI_FI': 1})
+        self.assertEqual(counts['condition'], {'GOOD': 1, 'NEW': 1})
+        self.assertEqual(counts['genre']['SCI_FI'],
+                         self.listed('condition=GOOD&is_available=true&min_price=0.1&genre=SCI_FI'))
+
+        total, counts = self.facets('genre=SCI_FI')
+        self.assertEqual(total, 2)
+        self.assertEqual(counts['genre'], {'SCI_FI': 2, 'FICTION': 1, 'MYSTERY': 1})
+        self.assertEqual(self.listed('max_price=1'), 2)
+
+    def test_cached_with_catalogue_version(self):
+        self.facets()
+        with self.assertNumQueries(0):
+            total, _ = self.facets()
+        self.assertEqual(total, 4)
+        Book.objects.create(owner=self.owner, title='New', author='A', genre='SCI_FI')
+        total, counts = self.facets()
+        self.assertEqual((total, counts['genre']['SCI_FI']), (5, 3))
+
+        # Counted apart from the listing's hits and misses
+        self.assertEqual(catalogue_cache_stats('facets')['hits'], 1)
+        self.assertEqual(catalogue_cache_stats('facets')['misses'], 2)
+        self.assertEqual(catalogue_cache_stats()['hits'], 0)
+        out = StringIO()
+        call_command('catalogue_cache_stats', stdout=out)
+        self.assertIn('facets: hits=1 misses=2 hit_ratio=33.3%', out.getvalue())
+        self.assertIn('catalogue: hits=0 misses=0 hit_ratio=n/a', out.getvalue())
+
+    def test_anonymous_and_invalid(self):
+        _, counts = self.facets()
+        self.assertEqual(counts['is_available'], {True: 3, False: 1})
+        self.api.force_authenticate(None)
+        total, counts = self.facets()
+        self.assertEqual((total, counts['is_available']), (3, {True: 3}))
+        self.assertEqual(self.api.get('/api/books/facets/?min_price=abc').status_code, 400)
+
+
+class FullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+        cls.hobbit = Book.objects.create(owner=cls.owner, title='The Hobbit', author='J.R.R. Tolkien')
+        cls.dune = Book.objects.create(owner=cls.owner, title='Dune', author='Frank Herbert',
+                                       description='Dune, the desert planet. Dune.')
+        cls.guide = Book.objects.create(
+            owner=cls.owner, title='Desert Guide', author='Anon',
+            description='Deserts of the world, from the Sahara to the Namib, '
+                        'with a chapter on the planet in Dune and many others.')
+
+    def setUp(self):
+        self.api = APIClient()
+
+    def matches(self, *terms):
+        return set(Book.objects.filter(
+            search_index__document__match=build_match_query(terms)).values_list('title', flat=True))
+
+    def search(self, query):
+        cache.clear()  # the listing cache would answer repeated searches
+        response = self.api.get('/api/books/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [book['title'] for book in response.json()['results']]
+
+    def test_build_match_query(self):
+        self.assertEqual(build_match_query(['tolk']), '"tolk"*')
+        self.assertEqual(build_match_query([' dune ', '', 'AND', 'say "hi"']),
+                         '"dune"* "AND"* "say ""hi"""*')
+        self.assertEqual(build_match_query(['  ']), '')
+
+    def test_prefix_matching_and_syntax_is_literal(self):
+        self.assertEqual(self.matches('tolk'), {'The Hobbit'})
+        self.assertEqual(self.matches('hob', 'tolkien'), {'The Hobbit'})
+        self.assertEqual(self.search('dune AND'), ['Desert Guide'])  # "and" is a word here
+        for query in ('NEAR(dune', '-dune', 'dune*', '"dune', 'title:dune', '(', '^'):
+            self.assertIn(self.search(query), ([], ['Dune', 'Desert Guide']), query)
+
+    def test_index_follows_insert_update_delete_and_bulk_update(self):
+        book = Book.objects.create(owner=self.owner, title='Things Fall Apart', author='Achebe')
+        self.assertEqual(self.matches('achebe'), {'Things Fall Apart'})
+
+        book.title = 'Arrow of God'
+        book.save()
+        self.assertEqual(self.matches('things'), set())
+        self.assertEqual(self.matches('arrow'), {'Arrow of God'})
+
+        book.author, self.hobbit.author = 'Chinua Achebe', 'Chinua'
+        Book.objects.bulk_update([book, self.hobbit], ['author'])
+        self.assertEqual(self.matches('chinua'), {'Arrow of God', 'The Hobbit'})
+        self.assertEqual(self.matches('tolkien'), set())
+
+        Book.objects.filter(pk=book.pk).update(description='Umuaro')
+        self.assertEqual(self.matches('umuaro'), {'Arrow of God'})
+
+        book.delete()
+        self.assertEqual(self.matches('arrow'), set())
+        self.assertEqual(self.matches('chinua'), {'The Hobbit'})
+
+    def test_ranked_by_bm25_unless_ordering_given(self):
+        self.assertEqual(self.search('dune'), ['Dune', 'Desert Guide'])
+        self.assertEqual(self.search('sahara dune'), ['Desert Guide'])
+        response = self.api.get('/api/books/', {'search': 'dune', 'ordering': 'title'})
+        self.assertEqual([book['title'] for book in response.json()['results']],
+                         ['Desert Guide', 'Dune'])
+
+    def test_rebuild_search_index_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        self.assertEqual(self.matches('dune'), set())
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Rebuilt book search index', out.getvalue())
+        self.assertEqual(self.matches('dune'), {'Dune', 'Desert Guide'})
+
+    def test_like_fallback_without_index(self):
+        with mock.patch('books.search.search_index_available', return_value=False):
+            # Substrings match under LIKE but not FTS5, which matches from word starts
+            self.assertEqual(self.search('olkie'), ['The Hobbit'])
+            self.assertEqual(sorted(self.search('dune')), ['Desert Guide', 'Dune'])
+        self.assertEqual(self.search('olkie'), [])
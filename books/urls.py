@@ -4,6 +4,8 @@ from . import views
 
 urlpatterns = [
     path('', views.BookListView.as_view(), name='api-book-list'),
+    path('facets/', views.BookFacetsView.as_view(), name='api-book-facets'),
     path('<int:pk>/', views.BookDetailView.as_view(), name='api-book-detail'),
     path('my-books/', views.MyBooksListView.as_view(), name='api-my-books'),
+    path('import/', views.api_import_books, name='api-book-import'),
 ]
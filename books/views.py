@@ -1,16 +1,46 @@
+import logging
+from decimal import Decimal
+
+from django.conf import settings
 from django.contrib import messages
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from rest_framework import generics, permissions, filters
+from rest_framework import generics, permissions, filters, status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.parsers import MultiPartParser
 from django_filters.rest_framework import DjangoFilterBackend
+from django.core.cache import cache
+from django.db.models import Case, Count, Value, When
+from django_filters.utils import translate_validation
+from rest_framework.settings import api_settings
+from .cache import (
+    CATALOGUE_CACHE_TIMEOUT, FACETS_COUNTER, bump_catalogue_version_on_commit,
+    deferred_invalidation, get_catalogue_version, listing_cache_key, normalize_query,
+    record_hit, record_miss,
+)
+from .importer import ImportFormatError, detect_format, import_books, read_rows
 from .models import Book
-from .serializers import BookSerializer
+from .serializers import (
+    BookListSerializer, BookRowSerializer, BookSerializer, OwnerBookSerializer,
+)
 from .permissions import IsOwnerOrReadOnly
+from .search import FullTextSearchFilter
 import django_filters
+from django.db import transaction
 from django.shortcuts import redirect, render, get_object_or_404
 from utils.api_client import APIClient
+from utils.conditional import ConditionalGetMixin, check_not_modified
 from utils.decorators import jwt_login_required
+from utils.geo import NearFilter
+from utils.log import payload
+from utils.pagination import KeysetPagination, cursor_page_links
+from utils.sparse import FIELDS_PARAM, EXPAND_PARAM, SparseQuerysetMixin
+from transactions.cache import invalidate_book_caches, invalidate_user_caches
+from transactions.models import BorrowTransaction
+from urllib.parse import urlencode
+
+logger = logging.getLogger(__name__)
 
 
 def home_view(request):
@@ -21,21 +51,24 @@ def home_view(request):
     try:
         # Get recent books for the homepage
         books_data = api_client.get('/books/?ordering=-created_at&limit=8')
-        print(f"DEBUG - Home API Response: {books_data}")
+        logger.debug('Home API response: %s', payload(books_data))
+
+        if isinstance(books_data, dict) and 'results' in books_data:
+            books_data = books_data['results']
 
         # Ensure we have a list and filter out any invalid books
         if isinstance(books_data, list):
             recent_books = [book for book in books_data if book.get('id')]
         elif isinstance(books_data, dict) and 'detail' in books_data:
             # API returned an error, likely authentication required
-            print(
-                f"DEBUG - API Error (will use empty books): {books_data['detail']}")
+            logger.info('Home API error (will use empty books): %s',
+                        books_data['detail'])
             recent_books = []
         else:
             recent_books = []
 
-    except Exception as e:
-        print(f"Error loading books: {e}")  # For debugging
+    except Exception:
+        logger.exception('Error loading books')
         recent_books = []
 
     context = {
@@ -51,7 +84,7 @@ def dashboard_view(request):
     api_client = APIClient(request)
 
     try:
-        dashboard_data = api_client.get('/dashboard/')
+        dashboard_data = api_client.get('/transactions/dashboard/')
     except Exception as e:
         dashboard_data = {}
         messages.error(request, 'Error loading dashboard')
@@ -67,30 +100,41 @@ def dashboard_view(request):
 def my_books_view(request):
     """User's own books"""
     api_client = APIClient(request)
+    page_links = {}
+
+    endpoint = '/books/my-books/'
+    cursor = request.GET.get('cursor', '')
+    if cursor:
+        endpoint += '?' + urlencode({'cursor': cursor})
 
     try:
-        my_books = api_client.get('/books/my-books/')
-        print(f"DEBUG - My Books API Response: {my_books}")  # Debug line
+        my_books = api_client.get(endpoint)
+        logger.debug('My Books API response: %s', payload(my_books))
+
+        if isinstance(my_books, dict) and 'results' in my_books:
+            page_links = cursor_page_links(request, my_books)
+            my_books = my_books['results']
 
         if isinstance(my_books, dict) and 'error' in my_books:
-            print(f"DEBUG - API Error: {my_books['error']}")
+            logger.warning('My Books API error: %s', my_books['error'])
             my_books = []
             messages.error(request, 'Error loading your books')
         elif not isinstance(my_books, list):
-            print(f"DEBUG - Unexpected response type: {type(my_books)}")
+            logger.warning('Unexpected My Books response type: %s', type(my_books))
             my_books = []
-    except Exception as e:
-        print(f"DEBUG - Exception: {e}")
+    except Exception:
+        logger.exception('Error loading my books')
         my_books = []
         messages.error(request, 'Error loading your books')
 
     # Filter out books without IDs
     valid_books = [book for book in my_books if book and book.get('id')]
-    print(f"DEBUG - Valid books: {valid_books}")  # Debug line
+    logger.debug('Valid books: %d', len(valid_books))
 
     context = {
         'books': valid_books,
-        'user': request.session.get('user', {})
+        'user': request.session.get('user', {}),
+        **page_links
     }
     return render(request, 'books/my_books.html', context)
 
@@ -112,15 +156,15 @@ def add_book_view(request):
                 'isbn': request.POST.get('isbn', ''),
             }
 
-            print(f"DEBUG - Sending book data: {book_data}")
+            logger.debug('Sending book data: %s', payload(book_data))
 
             response = api_client.post('/books/', book_data)
-            print(f"DEBUG - API Response: {response}")
+            logger.debug('Add book API response: %s', payload(response))
 
             if isinstance(response, dict) and 'error' in response:
                 error_msg = response['error']
                 messages.error(request, f'Error adding book: {error_msg}')
-                print(f"DEBUG - API Error: {error_msg}")
+                logger.warning('Add book API error: %s', error_msg)
             else:
                 messages.success(request, 'Book added successfully!')
                 return redirect('my_books')
@@ -128,7 +172,7 @@ def add_book_view(request):
         except Exception as e:
             error_msg = f'Error adding book: {str(e)}'
             messages.error(request, error_msg)
-            print(f"DEBUG - Exception: {error_msg}")
+            logger.exception('Error adding book')
 
     context = {
         'genres': ['FICTION', 'SCI_FI', 'MYSTERY', 'ROMANCE', 'FANTASY', 'HISTORICAL', 'BIOGRAPHY', 'OTHER'],
@@ -154,7 +198,7 @@ def edit_book_view(request, book_id):
                 'is_available': 'is_available' in request.POST,
             }
 
-            print(f"DEBUG - Editing book {book_id} with data: {book_data}")
+            logger.debug('Editing book %s with data: %s', book_id, payload(book_data))
 
             response = api_client.put(f'/books/{book_id}/', book_data)
 
@@ -170,72 +214,72 @@ def edit_book_view(request, book_id):
     return redirect('my_books')
 
 
+TRANSACTION_LIST_FIELDS = ','.join([
+    'id', 'status', 'request_date', 'due_date', 'is_overdue', 'estimated_fee',
+    'book.title', 'borrower.username', 'lender.username',
+])
+
+
 @jwt_login_required
 def transaction_list_view(request):
     """User's transactions with detailed debugging"""
     api_client = APIClient(request)
 
-    # Debug session and user info
     user_data = request.session.get('user', {})
-    print(f"DEBUG - Current User: {user_data}")
-    print(f"DEBUG - User ID: {user_data.get('id')}")
-    print(f"DEBUG - Username: {user_data.get('username')}")
+    logger.debug('Transactions for user %s (%s)',
+                 user_data.get('id'), user_data.get('username'))
 
     transaction_type = request.GET.get('type', '')
+    cursor = request.GET.get('cursor', '')
+    page_links = {}
+
     endpoint = '/transactions/'
-    if transaction_type:
-        endpoint += f'?type={transaction_type}'
+    params = {key: value for key, value in (
+        ('type', transaction_type), ('cursor', cursor)) if value}
+    # Only what transaction_list.html shows
+    params['fields'] = TRANSACTION_LIST_FIELDS
+    endpoint += '?' + urlencode(params)
 
     try:
         transactions_data = api_client.get(endpoint)
-        print(f"DEBUG - Raw Transactions API Response: {transactions_data}")
-        print(f"DEBUG - Transactions Response Type: {type(transactions_data)}")
+        logger.debug('Transactions API response: %s', payload(transactions_data))
+
+        if isinstance(transactions_data, dict) and 'results' in transactions_data:
+            page_links = cursor_page_links(request, transactions_data)
+            transactions_data = transactions_data['results']
 
         # Handle different response types
         if isinstance(transactions_data, dict):
             if 'detail' in transactions_data:
-                print(f"DEBUG - API Error: {transactions_data['detail']}")
+                logger.warning('Transactions API error: %s', transactions_data['detail'])
                 messages.error(
                     request, f'Error loading transactions: {transactions_data["detail"]}')
                 transactions = []
             elif 'error' in transactions_data:
-                print(
-                    f"DEBUG - API General Error: {transactions_data['error']}")
+                logger.warning('Transactions API error: %s', transactions_data['error'])
                 messages.error(request, f'Error: {transactions_data["error"]}')
                 transactions = []
             else:
-                print(f"DEBUG - Unexpected dictionary structure")
+                logger.warning('Unexpected transactions response structure')
                 transactions = []
         elif isinstance(transactions_data, list):
             transactions = transactions_data
-            print(f"DEBUG - Found {len(transactions)} transactions")
-
-            # Debug each transaction
-            for i, transaction in enumerate(transactions):
-                print(f"DEBUG - Transaction {i}:")
-                print(f"  ID: {transaction.get('id')}")
-                print(f"  Status: {transaction.get('status')}")
-                print(f"  Book: {transaction.get('book', {}).get('title')}")
-                print(
-                    f"  Borrower: {transaction.get('borrower', {}).get('username')}")
-                print(
-                    f"  Lender: {transaction.get('lender', {}).get('username')}")
-                print(f"  Request Date: {transaction.get('request_date')}")
+            logger.debug('Found %d transactions', len(transactions))
         else:
-            print(f"DEBUG - Unexpected response type")
+            logger.warning('Unexpected transactions response type: %s',
+                           type(transactions_data))
             transactions = []
             messages.error(request, 'Unexpected response from server')
 
-    except Exception as e:
-        print(f"DEBUG - Transactions Exception: {str(e)}")
-        import traceback
-        print(f"DEBUG - Transactions Traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception('Error loading transactions')
         transactions = []
         messages.error(request, 'Error loading transactions')
 
     context = {
         'transactions': transactions if isinstance(transactions, list) else [],
-        'transaction_type': transaction_type
+        'transaction_type': transaction_type,
+        **page_links
     }
     return render(request, 'transactions/transaction_list.html', context)
 
@@ -247,22 +291,25 @@ def book_list_view(request):
     # Get query parameters for filtering
     search = request.GET.get('search', '')
     genre = request.GET.get('genre', '')
+    cursor = request.GET.get('cursor', '')
+    page_links = {}
 
     endpoint = '/books/'
-    params = []
-    if search:
-        params.append(f'search={search}')
-    if genre:
-        params.append(f'genre={genre}')
+    params = {key: value for key, value in (
+        ('search', search), ('genre', genre), ('cursor', cursor)) if value}
 
     if params:
-        endpoint += '?' + '&'.join(params)
+        endpoint += '?' + urlencode(params)
 
-    print(f"DEBUG - Final API Endpoint: {endpoint}")
+    logger.debug('Book list API endpoint: %s', endpoint)
 
     try:
         books_data = api_client.get(endpoint)
-        print(f"DEBUG - Raw API Response: {books_data}")
+        logger.debug('Book list API response: %s', payload(books_data))
+
+        if isinstance(books_data, dict) and 'results' in books_data:
+            page_links = cursor_page_links(request, books_data)
+            books_data = books_data['results']
 
         # Check if we got an authentication error even after refresh
         if isinstance(books_data, dict) and 'detail' in books_data:
@@ -278,62 +325,70 @@ def book_list_view(request):
         if isinstance(books_data, list):
             valid_books = [
                 book for book in books_data if book and book.get('id')]
-            print(f"DEBUG - Valid books count: {len(valid_books)}")
+            logger.debug('Valid books count: %d', len(valid_books))
         else:
             valid_books = []
             messages.error(request, 'Error loading books')
 
-    except Exception as e:
-        print(f"DEBUG - Exception: {e}")
+    except Exception:
+        logger.exception('Error loading book list')
         valid_books = []
         messages.error(request, 'Error loading books')
 
     context = {
         'books': valid_books,
         'search_query': search,
-        'selected_genre': genre
+        'selected_genre': genre,
+        'genres': genre_options(api_client, params),
+        **page_links
     }
     return render(request, 'books/book_list.html', context)
 
 
+def genre_options(api_client, params):
+    """Genre dropdown entries, with book counts when the facets call works"""
+    params = {key: value for key, value in params.items() if key != 'cursor'}
+    try:
+        facets = api_client.get('/books/facets/?' + urlencode(params))
+        return facets['facets']['genre']
+    except Exception:
+        logger.exception('Error loading book facets')
+        return [{'value': value, 'label': label, 'count': None}
+                for value, label in Book.GENRE_CHOICES]
+
+
 @jwt_login_required
 def book_detail_view(request, book_id):
     """Book detail page with proper error handling"""
     api_client = APIClient(request)
 
-    print(f"DEBUG - Book Detail - Book ID: {book_id}")
-
     try:
         book_data = api_client.get(f'/books/{book_id}/')
-        print(f"DEBUG - Book Detail API Response: {book_data}")
+        logger.debug('Book %s API response: %s', book_id, payload(book_data))
 
         # Handle different response types
         if isinstance(book_data, dict):
             if 'detail' in book_data:
                 # API returned an error
                 error_msg = book_data['detail']
-                print(f"DEBUG - Book Detail API Error: {error_msg}")
+                logger.info('Book %s API error: %s', book_id, error_msg)
                 messages.error(request, f'Book not found: {error_msg}')
                 return redirect('book_list')
             elif 'id' in book_data:
                 # Valid book data
                 book = book_data
-                print(f"DEBUG - Book data validated, ID: {book['id']}")
             else:
                 # Unexpected dictionary structure
-                print(f"DEBUG - Unexpected book data structure: {book_data}")
+                logger.warning('Unexpected book data structure: %s',
+                               payload(book_data))
                 messages.error(request, 'Unexpected book data format')
                 return redirect('book_list')
         else:
             # Unexpected response type
-            print(f"DEBUG - Unexpected book response type: {type(book_data)}")
+            logger.warning('Unexpected book response type: %s', type(book_data))
             messages.error(request, 'Unable to load book details')
             return redirect('book_list')
 
-        # Debug the book owner structure
-        print(f"DEBUG - Book owner data: {book.get('owner')}")
-        print(f"DEBUG - Book owner type: {type(book.get('owner'))}")
-
         # Check if user can borrow this book
         user_data = request.session.get('user', {})
         user_id = user_data.get('id')
@@ -351,12 +406,6 @@ def book_detail_view(request, book_id):
 
         book_available = book.get('is_available', False)
 
-        print(f"DEBUG - User data from session: {user_data}")
-        print(f"DEBUG - User ID: {user_id}")
-        print(f"DEBUG - Owner ID: {owner_id}")
-        print(f"DEBUG - Owner username: {owner_username}")
-        print(f"DEBUG - Book available: {book_available}")
-
         is_own_book = (owner_username == user_username) or (
             owner_id == user_username)
 
@@ -366,12 +415,12 @@ def book_detail_view(request, book_id):
             book_available
         )
 
-        print(f"DEBUG - Final can_borrow: {can_borrow}")
+        logger.debug('Book %s: user %s, owner %s (%s), available %s, can_borrow %s',
+                     book_id, user_id, owner_id, owner_username, book_available,
+                     can_borrow)
 
-    except Exception as e:
-        print(f"DEBUG - Book Detail Exception: {str(e)}")
-        import traceback
-        print(f"DEBUG - Book Detail Traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception('Error loading book %s', book_id)
         messages.error(request, 'Error loading book details')
         return redirect('book_list')
 
@@ -389,12 +438,10 @@ def borrow_book_view(request, book_id):
     """Handle book borrowing requests"""
     api_client = APIClient(request)
 
-    print(f"DEBUG - Borrow attempt for book ID: {book_id}")
-
     try:
         # Create borrow request
         response = api_client.post('/transactions/', {'book_id': book_id})
-        print(f"DEBUG - Borrow API Response: {response}")
+        logger.debug('Borrow book %s API response: %s', book_id, payload(response))
 
         if isinstance(response, dict):
             messages.success(request, 'Borrow request sent successfully!')
@@ -404,8 +451,8 @@ def borrow_book_view(request, book_id):
         else:
             messages.error(request, 'Failed to send borrow request')
 
-    except Exception as e:
-        print(f"DEBUG - Borrow Exception: {e}")
+    except Exception:
+        logger.exception('Error requesting book %s', book_id)
         messages.error(request, 'Error sending borrow request')
 
     return redirect('book_detail', book_id=book_id)
@@ -424,20 +471,29 @@ class BookFilter(django_filters.FilterSet):
         fields = ['genre', 'condition', 'is_available']
 
 
-class BookListView(generics.ListCreateAPIView):
+class BookListView(SparseQuerysetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     serializer_class = BookSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
+    # ?near= and search run last so their orderings (distance, relevance)
+    # win over the default ordering; relevance wins when both are given
     filter_backends = [DjangoFilterBackend,
-                       filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['title', 'author', 'description']
-    filterset_fields = ['genre', 'condition', 'is_available']
+                       filters.OrderingFilter, NearFilter, FullTextSearchFilter]
+    search_fields = ['title', 'author', 'description']  # LIKE fallback
+    filterset_class = BookFilter
     ordering_fields = ['created_at', 'daily_rental_price', 'title']
     ordering = ['-created_at']  # Default ordering: newest first
+    # Cursors are built from the ordering columns
+    sparse_required_columns = ordering_fields
+    bulk_max_items = 100
+    # Serialize GET pages from .values() rows with BookRowSerializer
+    fast_path = getattr(settings, 'BOOK_LIST_FAST_PATH', False)
 
     def get_queryset(self):
-        queryset = Book.objects.all()
+        # owner is rendered as the username on every row
+        queryset = Book.objects.select_related('owner')
 
-        # Location-based filtering (simple implementation)
+        # Free-text match on the location; ?near= is the indexed alternative
         user_location = self.request.query_params.get('location', None)
         if user_location:
             queryset = queryset.filter(location__icontains=user_location)
@@ -449,23 +505,298 @@ class BookListView(generics.ListCreateAPIView):
         # Show all books to authenticated users, but we'll handle availability in frontend
         return queryset
 
-    def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
-
+    def list(self, request, *args, **kwargs):
+        """
+        Pages are cached under the catalogue version (books/cache.py), with
+        their validators, so a hit costs no query at all and still answers
+        If-None-Match with a 304.
+        """
+        key = self.get_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            record_hit()
+            data, headers = cached
+            response = check_not_modified(request, headers) or Response(data)
+            response['X-Cache'] = 'HIT'
+            return self.add_validators(response, headers)
+
+        record_miss()
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            headers = {'ETag': response['ETag']} if response.has_header('ETag') else {}
+            cache.set(key, (response.data, headers), CATALOGUE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def get_filter_params(self):
+        """Query parameters that decide which books are listed"""
+        return {*self.filterset_class.base_filters, 'location', api_settings.SEARCH_PARAM,
+                NearFilter.near_param, NearFilter.radius_param}
+
+    def get_cache_key(self):
+        request = self.request
+        paginator = self.paginator
+        allowed = {*self.get_filter_params(), api_settings.ORDERING_PARAM,
+                   paginator.cursor_query_param, paginator.page_size_query_param,
+                   paginator.limit_query_param, FIELDS_PARAM, EXPAND_PARAM}
+        # The version is read before the rows, so a page built from rows a
+        # concurrent write is changing is filed under the version it replaces
+        return listing_cache_key(
+            get_catalogue_version(),
+            request.user.is_authenticated,  # anonymous visitors see fewer books
+            request.build_absolute_uri('/'),  # next/previous links are absolute
+            request.accepted_media_type,
+            normalize_query(request.query_params, allowed))
+
+    def use_fast_path(self):
+        # Sparse fieldsets trim the queryset instead
+        return (self.fast_path and self.request.method == 'GET'
+                and not self.sparse_params())
+
+    def paginate_queryset(self, queryset):
+        if self.use_fast_path():
+            # Annotations too: the search rank is part of the cursor
+            queryset = queryset.values(
+                *BookRowSerializer.value_columns(), *queryset.query.annotations)
+        return super().paginate_queryset(queryset)
+
+    def serialize_page(self, objects):
+        if self.use_fast_path():
+            return BookRowSerializer(
+                objects, context=self.get_serializer_context()).data
+        return super().serialize_page(objects)
+
+    def get_serializer(self, *args, **kwargs):
+        # A JSON array is a bulk request; BookListSerializer does the writes
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+            kwargs['max_length'] = self.bulk_max_items
+        return super().get_serializer(*args, **kwargs)
 
-class BookDetailView(generics.RetrieveUpdateDestroyAPIView):
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            serializer.save(owner=self.request.user)
+            if isinstance(serializer, BookListSerializer):
+                # bulk_create sends no post_save signals
+                transaction.on_commit(
+                    lambda: invalidate_user_caches(self.request.user.pk))
+                bump_catalogue_version_on_commit()
+
+    def patch(self, request, *args, **kwargs):
+        """Bulk partial update: [{"id": 1, "is_available": false}, ...]"""
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of {"id": ..., ...} objects'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        ids = self.get_bulk_ids(request.data)
+        books = self.get_owned_books(ids)
+
+        serializer = self.get_serializer(books, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            serializer.save()
+            transaction.on_commit(
+                lambda: invalidate_book_caches(ids, request.user.pk))
+            bump_catalogue_version_on_commit()
+        return Response(serializer.data)
+
+    def delete(self, request, *args, **kwargs):
+        """Bulk delete: a JSON list of ids, {"ids": [...]} or ?ids=1,2,3"""
+        data = request.data
+        if isinstance(data, dict):
+            data = data.get('ids')
+            if data is None:
+                data = [value for value in request.query_params.get('ids', '').split(',')
+                        if value != '']
+        if not isinstance(data, (list, tuple)):
+            # A string would otherwise be read one character at a time
+            raise ValidationError({'ids': ['Expected a list of ids.']})
+        ids = self.get_bulk_ids([{'id': value} for value in data])
+        self.get_owned_books(ids)
+
+        # Read before the cascade removes the loans
+        borrower_ids = list(BorrowTransaction.objects.filter(book_id__in=ids).order_by()
+                            .values_list('borrower_id', flat=True).distinct())
+        with transaction.atomic():
+            # Once for the whole delete rather than per row from post_delete
+            with deferred_invalidation():
+                Book.objects.filter(pk__in=ids).delete()
+            transaction.on_commit(
+                lambda: invalidate_user_caches(request.user.pk, *borrower_ids))
+            bump_catalogue_version_on_commit()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_bulk_ids(self, items):
+        if not items:
+            raise ValidationError({'ids': ['No books given.']})
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                {'ids': [f'At most {self.bulk_max_items} books per request.']})
+        try:
+            ids = [int(item['id']) for item in items]
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError({'id': ['Every item needs a numeric id.']})
+        if len(set(ids)) != len(ids):
+            raise ValidationError({'id': ['Duplicate ids.']})
+        return ids
+
+    def get_owned_books(self, ids):
+        """
+        Load every book of a bulk write in one query and apply
+        IsOwnerOrReadOnly to each: an unknown id is a 404 and someone else's
+        book a 403, before anything is written.
+        """
+        books = list(Book.objects.filter(pk__in=ids).select_related('owner'))
+        if len(books) != len(ids):
+            raise NotFound('One or more books do not exist.')
+        permission = IsOwnerOrReadOnly()
+        for book in books:
+            if not permission.has_object_permission(self.request, self, book):
+                self.permission_denied(
+                    self.request, message='You can only change your own books.')
+        return books
+
+
+class BookFacetsView(BookListView):
+    """
+    GET /api/books/facets/ takes the same filters as /api/books/ and returns
+    the number of matching books per genre, condition, availability and
+    price band, with the total.
+
+    Each facet is one grouped query over the listing's own queryset and
+    filter backends. The BookFilter parameters of the facet itself are left
+    out, so while ?genre=SCI_FI is selected the other genres still show
+    what choosing them would give. Results are cached under the catalogue
+    version, like listing pages.
+    """
+    http_method_names = ['get', 'head', 'options']
+    # Facet -> the BookFilter parameters that filter on it
+    facet_params = {
+        'genre': ['genre'],
+        'condition': ['condition'],
+        'is_available': ['is_available'],
+        'price': ['min_price', 'max_price'],
+    }
+    # Upper bounds (exclusive) of the price bands; the last band is open
+    price_bands = [Decimal('0.50'), Decimal('1.00'), Decimal('2.00'), Decimal('5.00')]
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_cache_key()
+        data = cache.get(key)
+        if data is None:
+            record_miss(FACETS_COUNTER)
+            data = self.get_facets()
+            cache.set(key, data, CATALOGUE_CACHE_TIMEOUT)
+            hit = 'MISS'
+        else:
+            record_hit(FACETS_COUNTER)
+            hit = 'HIT'
+        return Response(data, headers={'X-Cache': hit})
+
+    def get_cache_key(self):
+        request = self.request
+        return listing_cache_key(
+            get_catalogue_version(), 'facets', request.user.is_authenticated,
+            normalize_query(request.query_params, self.get_filter_params()))
+
+    def get_facets(self):
+        queryset = self.get_queryset()
+        # Search, ?near= and the like; BookFilter is applied per facet below
+        for backend in self.filter_backends:
+            if backend not in (DjangoFilterBackend, filters.OrderingFilter):
+                queryset = backend().filter_queryset(self.request, queryset, self)
+
+        facets = {}
+        total = None
+        for name, params in self.facet_params.items():
+            facets[name] = getattr(self, f'count_{name}')(
+                self.filter_books(queryset, exclude=params))
+            if total is None and not any(self.request.query_params.get(p) for p in params):
+                # Nothing filters on this facet, so its counts add up to the total
+                total = sum(item['count'] for item in facets[name])
+        if total is None:
+            total = self.filter_books(queryset).count()
+        return {'count': total, 'facets': facets}
+
+    def filter_books(self, queryset, exclude=()):
+        params = self.request.query_params.copy()
+        for param in exclude:
+            params.pop(param, None)
+        filterset = self.filterset_class(params, queryset=queryset, request=self.request)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        return filterset.qs.order_by()
+
+    def count_choices(self, queryset, field):
+        counts = dict(queryset.values_list(field).annotate(Count('pk')))
+        return [{'value': value, 'label': str(label), 'count': counts.get(value, 0)}
+                for value, label in Book._meta.get_field(field).choices]
+
+    def count_genre(self, queryset):
+        return self.count_choices(queryset, 'genre')
+
+    def count_condition(self, queryset):
+        return self.count_choices(queryset, 'condition')
+
+    def count_is_available(self, queryset):
+        counts = dict(queryset.values_list('is_available').annotate(Count('pk')))
+        return [{'value': value, 'count': counts.get(value, 0)} for value in (True, False)]
+
+    def count_price(self, queryset):
+        bands = self.price_bands
+        band = Case(*[When(daily_rental_price__lt=bound, then=Value(i))
+                      for i, bound in enumerate(bands)], default=Value(len(bands)))
+        counts = dict(queryset.annotate(price_band=band)
+                      .values_list('price_band').annotate(Count('pk')))
+        lower = [Decimal('0.00'), *bands]
+        upper = [*bands, None]
+        return [{'min': str(low), 'max': high and str(high), 'count': counts.get(i, 0)}
+                for i, (low, high) in enumerate(zip(lower, upper))]
+
+
+class BookDetailView(SparseQuerysetMixin, ConditionalGetMixin,
+                     generics.RetrieveUpdateDestroyAPIView):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
+    sparse_required_columns = ('updated_at',)
     permission_classes = [
         permissions.IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
 
 
 class MyBooksListView(generics.ListAPIView):
-    serializer_class = BookSerializer
+    serializer_class = OwnerBookSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        return Book.objects.filter(owner=self.request.user)
+        return Book.objects.filter(
+            owner=self.request.user
+        ).select_related('owner').with_request_stats()
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@parser_classes([MultiPartParser])
+def api_import_books(request):
+    """
+    Bulk-import books for the current user from an uploaded CSV or JSON-lines
+    `file`. Rows are validated like a single POST and stored in batches; the
+    response reports every rejected row.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'Upload a CSV or JSONL file as "file"'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    format = request.data.get('format') or detect_format(upload.name)
+    try:
+        result = import_books(read_rows(upload, format), request.user)
+    except ImportFormatError as e:
+        return Response({'error': f'Invalid {format} file: {e}'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(
+        result.as_dict(),
+        status=status.HTTP_201_CREATED if result.created else status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
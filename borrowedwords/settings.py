@@ -14,6 +14,8 @@ import sys
 import os
 from pathlib import Path
 
+from utils.log import parse_levels
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,21 +48,61 @@ SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 
 # Logging
+# Project modules log at LOG_LEVEL; LOG_LEVELS overrides single modules, e.g.
+# LOG_LEVELS="books.views=DEBUG,utils.api_client=WARNING". API payload dumps
+# are truncated to LOG_PAYLOAD_MAX_CHARS and only LOG_PAYLOAD_SAMPLE_RATE of
+# them are emitted. Set LOG_FILE to also write JSON lines to that file.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_PAYLOAD_MAX_CHARS = int(os.environ.get('LOG_PAYLOAD_MAX_CHARS', 1000))
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get('LOG_PAYLOAD_SAMPLE_RATE', 1.0))
+LOG_FILE = os.environ.get('LOG_FILE')
+# Per-request timing: one `utils.timing` INFO line per request and a
+# Server-Timing header, which only staff users get unless SERVER_TIMING_PUBLIC
+REQUEST_TIMING_ENABLED = os.environ.get(
+    'REQUEST_TIMING_ENABLED', str(DEBUG)).lower() in ('1', 'true', 'yes')
+SERVER_TIMING_PUBLIC = os.environ.get(
+    'SERVER_TIMING_PUBLIC', 'False').lower() in ('1', 'true', 'yes')
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sample_payloads': {
+            '()': 'utils.log.PayloadSampleFilter',
+            'rate': LOG_PAYLOAD_SAMPLE_RATE,
+        },
+    },
+    'formatters': {
+        'jsonl': {
+            '()': 'utils.log.JsonLinesFormatter',
+        },
+    },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'stream': sys.stdout,
+            'filters': ['sample_payloads'],
         },
     },
     'root': {
         'handlers': ['console'],
         'level': 'INFO',
     },
+    'loggers': {
+        name: {'level': LOG_LEVEL}
+        for name in ('books', 'entities', 'transactions', 'utils')
+    },
 }
+LOGGING['loggers'].update(parse_levels(os.environ.get('LOG_LEVELS')))
+
+if LOG_FILE:
+    LOGGING['handlers']['jsonl_file'] = {
+        'class': 'logging.handlers.WatchedFileHandler',
+        'filename': LOG_FILE,
+        'formatter': 'jsonl',
+        'filters': ['sample_payloads'],
+    }
+    LOGGING['root']['handlers'].append('jsonl_file')
 
 
 CSRF_TRUSTED_ORIGINS = ['https://milagro.pythonanywhere.com']
@@ -103,8 +145,27 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    # Keyset pagination; clients can ask for ?page_size= / ?limit= up to 100
+    'DEFAULT_PAGINATION_CLASS': 'utils.pagination.KeysetPagination',
+    'PAGE_SIZE': int(os.environ.get('API_PAGE_SIZE', 20)),
 }
 
+# How the template views reach the API: 'inprocess' dispatches straight to the
+# DRF view in the same worker, 'http' goes over the network to API_BASE_URL
+# (or the current host) for deployments where the API runs separately.
+API_CLIENT_TRANSPORT = os.environ.get('API_CLIENT_TRANSPORT', 'inprocess')
+API_BASE_URL = os.environ.get('API_BASE_URL', '')
+
+# Connection pool and (connect, read) timeouts in seconds for the 'http' transport
+API_CLIENT_POOL_SIZE = int(os.environ.get('API_CLIENT_POOL_SIZE', 10))
+API_CLIENT_CONNECT_TIMEOUT = float(
+    os.environ.get('API_CLIENT_CONNECT_TIMEOUT', 3.05))
+API_CLIENT_READ_TIMEOUT = float(os.environ.get('API_CLIENT_READ_TIMEOUT', 15))
+# GET responses remembered per user and URL for If-None-Match revalidation
+# (0 disables)
+API_CLIENT_VALIDATOR_CACHE_SIZE = int(
+    os.environ.get('API_CLIENT_VALIDATOR_CACHE_SIZE', 256))
+
 # CORS configuration (important for frontend-backend communication)
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",  # React development server
@@ -115,6 +176,7 @@ CORS_ALLOWED_ORIGINS = [
 CORS_ALLOW_ALL_ORIGINS = True
 
 MIDDLEWARE = [
+    'utils.timing.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -156,9 +218,46 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock at BEGIN so concurrent transitions queue up
+            # instead of failing with "database is locked" mid-transaction
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
+# Cache (per-user stats/dashboard documents). Local memory by default; point
+# CACHE_LOCATION at a directory to share entries between worker processes.
+# A local-memory cache only sees the invalidations made by its own process,
+# so other workers can serve stale entries until they expire: the timeouts
+# below are kept short unless the cache is shared.
+CACHE_IS_SHARED = bool(os.environ.get('CACHE_LOCATION'))
+if CACHE_IS_SHARED:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ['CACHE_LOCATION'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+TRANSACTION_STATS_CACHE_TIMEOUT = 60 * 60 if CACHE_IS_SHARED else 60
+DASHBOARD_CACHE_TIMEOUT = TRANSACTION_STATS_CACHE_TIMEOUT
+# Cached /api/books/ pages; writes invalidate them through the catalogue
+# version, the timeout only bounds how long unreachable entries linger
+CATALOGUE_CACHE_TIMEOUT = 5 * 60 if CACHE_IS_SHARED else 30
+# Serialized Book/User dicts, keyed by (pk, updated_at) (utils/fragments.py)
+FRAGMENT_CACHE_TIMEOUT = 60 * 60
+# Serialize /api/books/ pages from .values() rows (books.serializers.BookRowSerializer)
+BOOK_LIST_FAST_PATH = os.environ.get(
+    'BOOK_LIST_FAST_PATH', 'False').lower() in ('1', 'true', 'yes')
+
 # Custom user model
 AUTH_USER_MODEL = 'entities.User'
 
@@ -229,6 +328,11 @@ EMAIL_HOST_USER = 'kingscyprian89@gmail.com'
 EMAIL_HOST_PASSWORD = 'your-app-password'
 DEFAULT_FROM_EMAIL = 'noreply@borrowedwords.com'
 
+# Notification outbox, drained by `manage.py run_notification_worker`
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BASE_SECONDS = 60
+
 # For development - use console backend
 if DEBUG:
     EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from utils.geo import GEO_FIELDS, locate
 
 # Create your models here.
 
@@ -8,6 +9,26 @@ class User(AbstractUser):
     phone_number = models.CharField(max_length=15, blank=True, null=True)
     location = models.CharField(max_length=255, blank=True, null=True)
     bio = models.TextField(blank=True, null=True)
+    # Resolved from `location` on save (utils/geo.py)
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['geohash'], name='user_geohash_idx'),
+        ]
 
     def __str__(self):
         return self.username
+
+    def save(self, *args, **kwargs):
+        self.set_coordinates()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'location' in update_fields:
+            kwargs['update_fields'] = {*update_fields, *GEO_FIELDS}
+        super().save(*args, **kwargs)
+
+    def set_coordinates(self):
+        self.latitude, self.longitude, self.geohash = locate(self.location)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth import authenticate
+from utils.fragments import FragmentCacheMixin
+from utils.sparse import SparseFieldsMixin
 from .models import User
 
 
@@ -45,7 +47,14 @@ class UserLoginSerializer(serializers.Serializer):
                 "Must include 'username' and 'password'.")
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, FragmentCacheMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'phone_number', 'location', 'bio')
+
+
+class PublicUserSerializer(UserSerializer):
+    """What anyone browsing the catalogue may see of a book's owner"""
+
+    class Meta(UserSerializer.Meta):
+        fields = ('id', 'username', 'location', 'bio')
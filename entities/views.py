@@ -8,21 +8,21 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
-import requests
+from utils.api_client import APIClient
+from utils.timing import SESSION_STAFF_KEY
 import json
 
 
 def register_view(request):
     if request.method == 'POST':
         try:
-            response = requests.post(
-                f'{get_base_url(request)}/api/auth/register/',
-                json={
+            response = APIClient(request).send(
+                'POST', '/auth/register/', {
                     'username': request.POST['username'],
                     'email': request.POST['email'],
                     'password': request.POST['password'],
                     'location': request.POST.get('location', '')
-                }
+                }, authenticate=False
             )
 
             if response.status_code == 201:
@@ -47,12 +47,11 @@ def register_view(request):
 def login_view(request):
     if request.method == 'POST':
         try:
-            response = requests.post(
-                f'{get_base_url(request)}/api/auth/login/',
-                json={
+            response = APIClient(request).send(
+                'POST', '/auth/login/', {
                     'username': request.POST['username'],
                     'password': request.POST['password']
-                }
+                }, authenticate=False
             )
 
             if response.status_code == 200:
@@ -61,6 +60,7 @@ def login_view(request):
                 request.session['access_token'] = data['access']
                 request.session['refresh_token'] = data['refresh']
                 request.session['user'] = data['user']
+                request.session[SESSION_STAFF_KEY] = data.get('is_staff', False)
                 request.session.modified = True
 
                 messages.success(
@@ -81,11 +81,7 @@ def logout_view(request):
     if 'access_token' in request.session:
         try:
             # Call logout API
-            requests.post(
-                f'{get_base_url(request)}/api/auth/logout/',
-                headers={
-                    'Authorization': f"Bearer {request.session['access_token']}"}
-            )
+            APIClient(request).send('POST', '/auth/logout/')
         except:
             pass  # Even if API call fails, clear session
 
@@ -95,14 +91,6 @@ def logout_view(request):
     return redirect('landing_page')
 
 
-def get_base_url(request):
-    """Get the base URL for API calls"""
-    if request.is_secure():
-        return f'https://{request.get_host()}'
-    else:
-        return f'http://{request.get_host()}'
-
-
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register_user(request):
@@ -134,6 +122,8 @@ def login_user(request):
 
         return Response({
             'user': UserSerializer(user).data,
+            # Not part of the user record other users see
+            'is_staff': user.is_staff,
             'refresh': str(refresh),
             'access': str(refresh.access_token),
         }, status=status.HTTP_200_OK)
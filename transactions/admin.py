@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import BorrowTransaction
+from django.utils import timezone
+from .models import BorrowTransaction, Notification
 
 
 @admin.register(BorrowTransaction)
@@ -12,3 +13,19 @@ class BorrowTransactionAdmin(admin.ModelAdmin):
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('book', 'borrower', 'lender')
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'recipient', 'status', 'attempts',
+                    'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    search_fields = ['recipient', 'subject']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    actions = ['requeue']
+
+    @admin.action(description='Requeue selected notifications')
+    def requeue(self, request, queryset):
+        queryset.exclude(status='SENT').update(
+            status='PENDING', attempts=0, claim_token='',
+            next_attempt_at=timezone.now())
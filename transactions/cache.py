@@ -0,0 +1,123 @@
+"""
+Per-user caches for the transaction read endpoints.
+
+Entries are dropped by the signal handlers in transactions/signals.py
+whenever a transaction the user takes part in is written, and by the
+transition code for writes that bypass signals (queryset.update()).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, OuterRef, Q
+from django.utils import timezone
+
+from books.models import Book
+from books.serializers import OwnerBookSerializer
+from utils.expressions import count_subquery
+from .models import BorrowTransaction
+from .serializers import BorrowTransactionSerializer
+
+STATS_TIMEOUT = getattr(settings, 'TRANSACTION_STATS_CACHE_TIMEOUT', 60 * 60)
+DASHBOARD_TIMEOUT = getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60 * 60)
+
+
+def stats_cache_key(user_id, today=None):
+    # The date is part of the key so overdue counts roll over at midnight
+    today = today or timezone.now().date()
+    return f'transactions:stats:{user_id}:{today.isoformat()}'
+
+
+def dashboard_cache_key(user_id, today=None):
+    # Serialized transactions carry is_overdue, which also changes by date
+    today = today or timezone.now().date()
+    return f'transactions:dashboard:{user_id}:{today.isoformat()}'
+
+
+def compute_transaction_stats(user):
+    """All stats counters in a single conditional-aggregation query"""
+    today = timezone.now().date()
+    return BorrowTransaction.objects.filter(
+        Q(borrower=user) | Q(lender=user)
+    ).aggregate(
+        total_borrowed=Count(
+            'id', filter=Q(borrower=user, status='COMPLETED')),
+        total_lent=Count(
+            'id', filter=Q(lender=user, status='COMPLETED')),
+        pending_requests=Count(
+            'id', filter=Q(lender=user, status='PENDING')),
+        active_borrowings=Count(
+            'id', filter=Q(borrower=user, status='ACCEPTED')),
+        overdue_books=Count(
+            'id', filter=Q(borrower=user, status='ACCEPTED', due_date__lt=today)),
+    )
+
+
+def get_transaction_stats(user):
+    key = stats_cache_key(user.pk)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_transaction_stats(user)
+        cache.set(key, stats, STATS_TIMEOUT)
+    return stats
+
+
+def compute_user_dashboard(user):
+    """
+    Dashboard document in three queries: recent transactions, the user's
+    books that have pending requests (annotated subqueries rather than a
+    JOIN + DISTINCT), and every counter as scalar subqueries of one statement.
+    """
+    recent_transactions = BorrowTransaction.objects.filter(
+        Q(borrower=user) | Q(lender=user)
+    ).select_related('book', 'book__owner', 'borrower', 'lender')[:5]
+
+    books_with_requests = Book.objects.filter(
+        owner=user
+    ).with_request_stats().filter(
+        has_pending=True
+    ).select_related('owner').order_by('-created_at')
+
+    transactions = BorrowTransaction.objects.order_by()
+    stats = get_user_model().objects.filter(pk=user.pk).values(
+        books_listed=count_subquery(Book.objects.filter(owner=OuterRef('pk'))),
+        active_borrowings=count_subquery(transactions.filter(
+            borrower=OuterRef('pk'), status='ACCEPTED')),
+        pending_decisions=count_subquery(transactions.filter(
+            lender=OuterRef('pk'), status='PENDING')),
+        total_lent=count_subquery(transactions.filter(
+            lender=OuterRef('pk'), status='COMPLETED')),
+    ).get()
+
+    return {
+        'recent_transactions': BorrowTransactionSerializer(recent_transactions, many=True).data,
+        'books_with_pending_requests': OwnerBookSerializer(books_with_requests, many=True).data,
+        'stats': stats,
+    }
+
+
+def get_user_dashboard(user):
+    key = dashboard_cache_key(user.pk)
+    dashboard = cache.get(key)
+    if dashboard is None:
+        dashboard = compute_user_dashboard(user)
+        cache.set(key, dashboard, DASHBOARD_TIMEOUT)
+    return dashboard
+
+
+def invalidate_user_caches(*user_ids):
+    keys = []
+    for user_id in set(user_ids):
+        if user_id:
+            keys += [stats_cache_key(user_id), dashboard_cache_key(user_id)]
+    if keys:
+        cache.delete_many(keys)
+
+
+def invalidate_book_caches(book_ids, *owner_ids):
+    """
+    Drop the caches that embed these books: their owners' dashboards and
+    those of everyone who has borrowed them. One query for any number of books.
+    """
+    borrower_ids = BorrowTransaction.objects.filter(
+        book_id__in=book_ids).order_by().values_list('borrower_id', flat=True).distinct()
+    invalidate_user_caches(*owner_ids, *borrower_ids)
@@ -1,43 +1,80 @@
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.db.models import Q
 from django.utils import timezone
-from transactions.models import BorrowTransaction
-from django.core.mail import send_mail
-from django.conf import settings
+from transactions.models import BorrowTransaction, Notification
+from transactions.notifications import build_overdue_notification
 
 
 class Command(BaseCommand):
-    help = 'Check for overdue books and send notifications'
+    help = 'Check for overdue books and queue notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Loans loaded and notified per batch')
+        parser.add_argument(
+            '--remind-every', type=int, default=3, metavar='DAYS',
+            help='Days before a borrower who was already notified is reminded again')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be queued without writing anything')
 
     def handle(self, *args, **options):
+        started = time.monotonic()
+        now = timezone.now()
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+        remind_before = now - timezone.timedelta(days=options['remind_every'])
+
+        # Only loans never notified, or whose last notice is old enough for a
+        # reminder; the watermark keeps reruns from re-sending everything.
         overdue_transactions = BorrowTransaction.objects.filter(
-            status='ACCEPTED',
-            due_date__lt=timezone.now().date()
-        )
+            status__in=['ACCEPTED', 'BORROWED'],
+            due_date__lt=now.date(),
+        ).filter(
+            Q(last_overdue_notice_at__isnull=True)
+            | Q(last_overdue_notice_at__lt=remind_before)
+        ).select_related('book', 'borrower').order_by('pk')
+
+        total = batches = 0
+        last_pk = 0
+        while True:
+            # Keyset batches on the pk rather than one long-lived cursor: the
+            # watermark update below changes rows matched by this query.
+            batch = list(overdue_transactions.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            batches += 1
+            total += len(batch)
 
-        for transaction in overdue_transactions:
-            # Send email to borrower
-            subject = f'Overdue Book: {transaction.book.title}'
-            message = f'''
-            Hello {transaction.borrower.username},
-            
-            The book "{transaction.book.title}" is overdue. 
-            It was due on {transaction.due_date}.
-            
-            Please return the book as soon as possible.
-            
-            Thank you,
-            BorrowedWords Team
-            '''
-
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [transaction.borrower.email],
-                fail_silently=True,
-            )
-
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Sent overdue notification for {transaction.book.title}')
-            )
+            if options['verbosity'] >= 2:
+                for transaction in batch:
+                    self.stdout.write(
+                        f'Overdue: {transaction.book.title} '
+                        f'(due {transaction.due_date}, {transaction.borrower.username})')
+
+            if not dry_run:
+                # Outbox rows and watermark commit together; the notification
+                # worker sends each batch over one mail connection.
+                with db_transaction.atomic():
+                    Notification.objects.bulk_create(
+                        [build_overdue_notification(transaction)
+                         for transaction in batch])
+                    BorrowTransaction.objects.filter(
+                        pk__in=[transaction.pk for transaction in batch]
+                    ).update(last_overdue_notice_at=now)
+
+            if len(batch) < batch_size:
+                break
+
+        elapsed = time.monotonic() - started
+        verb = 'Would queue' if dry_run else 'Queued'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{verb} {total} overdue notifications in {batches} batches '
+                f'({elapsed:.2f}s)')
+        )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.notifications import BATCH_SIZE, deliver_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued email notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Notifications sent per mail connection')
+        parser.add_argument(
+            '--poll-interval', type=float, default=5.0,
+            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain what is due now and exit instead of polling')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        try:
+            while True:
+                sent, retried, dead = deliver_batch(batch_size)
+                if sent or retried or dead:
+                    self.stdout.write(
+                        f'Sent {sent}, retrying {retried}, dead-lettered {dead}')
+                if sent + retried + dead < batch_size:
+                    # Outbox drained for now
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS('Notification worker stopped'))
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0003_hot_query_indexes'),
+        ('transactions', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowtransaction',
+            index=models.Index(fields=['lender', 'status'], name='txn_lender_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowtransaction',
+            index=models.Index(fields=['borrower', 'status'], name='txn_borrower_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowtransaction',
+            index=models.Index(fields=['status', 'due_date'], name='txn_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowtransaction',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['book'], name='txn_book_pending_idx'),
+        ),
+    ]
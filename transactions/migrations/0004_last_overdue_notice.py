@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 20:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0003_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowtransaction',
+            name='last_overdue_notice_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-17 21:11
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def date_existing_rows(apps, schema_editor):
+    # Best guess for rows that predate the column: their latest known event
+    BorrowTransaction = apps.get_model('transactions', 'BorrowTransaction')
+    BorrowTransaction.objects.update(
+        updated_at=Coalesce('return_date', 'accept_date', 'request_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_last_overdue_notice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowtransaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(date_existing_rows, migrations.RunPython.noop),
+    ]
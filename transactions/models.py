@@ -45,9 +45,25 @@ class BorrowTransaction(models.Model):
         null=True,
         blank=True
     )
+    updated_at = models.DateTimeField(auto_now=True)
+    # When the borrower was last reminded about this loan being overdue
+    last_overdue_notice_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         ordering = ['-request_date']  # Newest transactions first
+        indexes = [
+            # Dashboard/stats counters per side of the loan
+            models.Index(fields=['lender', 'status'],
+                         name='txn_lender_status_idx'),
+            models.Index(fields=['borrower', 'status'],
+                         name='txn_borrower_status_idx'),
+            # Overdue sweeps: status + due date range
+            models.Index(fields=['status', 'due_date'],
+                         name='txn_status_due_idx'),
+            # Book.has_pending_requests and the pending-requests lookups
+            models.Index(fields=['book'], name='txn_book_pending_idx',
+                         condition=models.Q(status='PENDING')),
+        ]
 
     def __str__(self):
         return f"{self.borrower.username} -> {self.book.title} ({self.status})"
@@ -90,3 +106,52 @@ class BorrowTransaction(models.Model):
 
         self.clean()
         super().save(*args, **kwargs)
+
+
+class Notification(models.Model):
+    """
+    Outbox row for an email. Written in the same database transaction as the
+    state change it announces and delivered later by run_notification_worker.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('DEAD', 'Dead'),
+    ]
+
+    transaction = models.ForeignKey(
+        BorrowTransaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
+    kind = models.CharField(max_length=30)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='PENDING'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    # When the row may next be picked up: retry backoff, or the lease taken
+    # by a worker while it is sending
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Worker poll: due pending rows, oldest first
+            models.Index(fields=['next_attempt_at', 'id'],
+                         name='notification_due_idx',
+                         condition=models.Q(status='PENDING')),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} -> {self.recipient} ({self.status})"
@@ -0,0 +1,154 @@
+"""
+Email outbox.
+
+Views and services never talk to the mail server. They save one of the
+outbox rows built below inside the same database transaction as the state
+change, so a notification exists if and only if the change was
+committed. `run_notification_worker` then drains the outbox with
+`deliver_batch()`: one mail connection per batch, exponential backoff on
+failure and a DEAD status once a message has used up its attempts.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .models import Notification
+
+BATCH_SIZE = getattr(settings, 'NOTIFICATION_BATCH_SIZE', 50)
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATION_MAX_ATTEMPTS', 5)
+RETRY_BASE_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 60)
+RETRY_MAX_SECONDS = getattr(settings, 'NOTIFICATION_RETRY_MAX_SECONDS', 6 * 60 * 60)
+# A worker that dies mid-batch leaves its rows claimed; they become due again
+# once the lease runs out
+LEASE_SECONDS = getattr(settings, 'NOTIFICATION_LEASE_SECONDS', 5 * 60)
+
+
+def build_return_notification(transaction):
+    """Unsaved outbox row telling the lender a book was marked returned"""
+    return Notification(
+        kind='book_returned',
+        transaction=transaction,
+        recipient=transaction.lender.email,
+        subject=f'Book Returned: {transaction.book.title}',
+        body=f'''
+    Hello {transaction.lender.username},
+
+    The borrower {transaction.borrower.username} has marked the book
+    "{transaction.book.title}" as returned.
+
+    Please confirm the return to complete the transaction.
+
+    Thank you for using BorrowedWords!
+    ''',
+    )
+
+
+def build_overdue_notification(transaction):
+    """Unsaved outbox row reminding the borrower of an overdue book"""
+    return Notification(
+        kind='book_overdue',
+        transaction=transaction,
+        recipient=transaction.borrower.email,
+        subject=f'Overdue Book: {transaction.book.title}',
+        body=f'''
+            Hello {transaction.borrower.username},
+
+            The book "{transaction.book.title}" is overdue.
+            It was due on {transaction.due_date}.
+
+            Please return the book as soon as possible.
+
+            Thank you,
+            BorrowedWords Team
+            ''',
+    )
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the given number of failed attempts"""
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def claim_batch(batch_size=BATCH_SIZE, now=None):
+    """
+    Lease up to `batch_size` due notifications to this worker. The claim is a
+    single guarded UPDATE, so two workers never pick up the same row.
+    """
+    now = now or timezone.now()
+    token = uuid.uuid4().hex
+    due = Notification.objects.filter(
+        status='PENDING', next_attempt_at__lte=now
+    ).order_by('next_attempt_at', 'id').values_list('pk', flat=True)[:batch_size]
+
+    with db_transaction.atomic():
+        claimed = Notification.objects.filter(
+            pk__in=list(due), status='PENDING', next_attempt_at__lte=now
+        ).update(
+            claim_token=token,
+            next_attempt_at=now + timezone.timedelta(seconds=LEASE_SECONDS),
+        )
+    if not claimed:
+        return []
+    return list(Notification.objects.filter(claim_token=token, status='PENDING'))
+
+
+def deliver_batch(batch_size=BATCH_SIZE, connection=None):
+    """
+    Send one batch of due notifications over a single mail connection.
+    Returns a (sent, retried, dead) tuple of counts.
+    """
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent, failed = [], []
+    try:
+        connection.open()
+    except Exception as e:
+        failed = [(notification, e) for notification in batch]
+    else:
+        try:
+            for notification in batch:
+                message = EmailMessage(
+                    notification.subject,
+                    notification.body,
+                    settings.DEFAULT_FROM_EMAIL,
+                    [notification.recipient],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except Exception as e:
+                    failed.append((notification, e))
+                else:
+                    sent.append(notification.pk)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    if sent:
+        Notification.objects.filter(pk__in=sent).update(
+            status='SENT', sent_at=now, claim_token='', last_error='')
+
+    retried = dead = 0
+    for notification, error in failed:
+        notification.attempts += 1
+        notification.claim_token = ''
+        notification.last_error = repr(error)
+        if notification.attempts >= MAX_ATTEMPTS:
+            notification.status = 'DEAD'
+            dead += 1
+        else:
+            notification.next_attempt_at = now + timezone.timedelta(
+                seconds=retry_delay(notification.attempts))
+            retried += 1
+    if failed:
+        Notification.objects.bulk_update(
+            [notification for notification, _ in failed],
+            ['attempts', 'claim_token', 'last_error', 'status', 'next_attempt_at'],
+        )
+    return len(sent), retried, dead
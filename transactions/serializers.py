@@ -1,10 +1,12 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import BorrowTransaction
 from books.serializers import BookSerializer
 from entities.serializers import UserSerializer
+from utils.sparse import SparseFieldsMixin
 
 
-class BorrowTransactionSerializer(serializers.ModelSerializer):
+class BorrowTransactionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     book = BookSerializer(read_only=True)
     borrower = UserSerializer(read_only=True)
     lender = UserSerializer(read_only=True)
@@ -12,6 +14,13 @@ class BorrowTransactionSerializer(serializers.ModelSerializer):
     days_borrowed = serializers.SerializerMethodField()
     estimated_fee = serializers.SerializerMethodField()
 
+    sparse_sources = {
+        'is_overdue': ['status', 'due_date'],
+        'days_borrowed': ['accept_date', 'return_date'],
+        'estimated_fee': ['final_rental_fee', 'accept_date', 'return_date',
+                          'book__daily_rental_price'],
+    }
+
     class Meta:
         model = BorrowTransaction
         fields = [
@@ -0,0 +1,158 @@
+"""
+Borrow transaction state machine.
+
+Every transition is a single guarded UPDATE (`... WHERE id = %s AND status =
+'PENDING' AND lender_id = %s`) run inside one atomic block together with the
+book availability change. Two concurrent requests for the same transition
+cannot both win: the loser's UPDATE matches no row and nothing is written.
+Only when the UPDATE misses do we read the row again to explain why.
+
+queryset.update() skips model signals, so the per-user caches are dropped
+explicitly once the block commits, and the catalogue version is bumped
+where a book's availability changes.
+"""
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from books.cache import bump_catalogue_version_on_commit
+from books.models import Book
+from .cache import invalidate_user_caches
+from .models import BorrowTransaction
+from .notifications import build_return_notification
+
+LOAN_PERIOD_DAYS = 14
+
+
+class TransitionError(Exception):
+    """A guarded transition matched no row; `reason` says why"""
+    NOT_FOUND = 'not_found'
+    FORBIDDEN = 'forbidden'
+    INVALID_STATUS = 'invalid_status'
+    BOOK_UNAVAILABLE = 'book_unavailable'
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _load(transaction_id):
+    return BorrowTransaction.objects.select_related(
+        'book', 'book__owner', 'borrower', 'lender'
+    ).get(pk=transaction_id)
+
+
+def _explain_miss(transaction_id, user, role):
+    """Work out why a guarded UPDATE matched nothing"""
+    current = BorrowTransaction.objects.filter(pk=transaction_id).values(
+        'borrower_id', 'lender_id').first()
+    if current is None:
+        raise TransitionError(TransitionError.NOT_FOUND)
+    if current[f'{role}_id'] != user.pk:
+        raise TransitionError(TransitionError.FORBIDDEN)
+    raise TransitionError(TransitionError.INVALID_STATUS)
+
+
+def _transition(transaction_id, user, role, from_status, **changes):
+    changes.setdefault('updated_at', timezone.now())
+    updated = BorrowTransaction.objects.filter(
+        pk=transaction_id, status=from_status, **{role: user}
+    ).update(**changes)
+    if not updated:
+        _explain_miss(transaction_id, user, role)
+
+
+def _book_of(transaction_id):
+    return BorrowTransaction.objects.filter(pk=transaction_id).values('book_id')
+
+
+def accept_request(transaction_id, lender, due_date=None):
+    """
+    PENDING -> ACCEPTED, take the book off the shelf and reject every other
+    pending request for it in bulk.
+    """
+    now = timezone.now()
+    due_date = due_date or now.date() + timezone.timedelta(days=LOAN_PERIOD_DAYS)
+
+    with db_transaction.atomic():
+        _transition(transaction_id, lender, 'lender', 'PENDING',
+                    status='ACCEPTED', accept_date=now, due_date=due_date,
+                    updated_at=now)
+
+        # Guarded as well: a second accepted loan for the same book loses here
+        if not Book.objects.filter(
+                pk__in=_book_of(transaction_id), is_available=True
+        ).update(is_available=False, updated_at=now):
+            raise TransitionError(TransitionError.BOOK_UNAVAILABLE)
+        bump_catalogue_version_on_commit()
+
+        competing = BorrowTransaction.objects.filter(
+            book__in=_book_of(transaction_id), status='PENDING'
+        ).exclude(pk=transaction_id)
+        rejected_borrowers = list(competing.values_list('borrower_id', flat=True))
+        competing.update(status='REJECTED', updated_at=now)
+
+        accepted = _load(transaction_id)
+        db_transaction.on_commit(lambda: invalidate_user_caches(
+            accepted.borrower_id, accepted.lender_id, *rejected_borrowers))
+    return accepted
+
+
+def reject_request(transaction_id, lender):
+    """PENDING -> REJECTED"""
+    with db_transaction.atomic():
+        _transition(transaction_id, lender, 'lender', 'PENDING', status='REJECTED')
+        rejected = _load(transaction_id)
+        db_transaction.on_commit(lambda: invalidate_user_caches(
+            rejected.borrower_id, rejected.lender_id))
+    return rejected
+
+
+def cancel_request(transaction_id, borrower):
+    """PENDING -> CANCELLED, by the borrower"""
+    with db_transaction.atomic():
+        _transition(transaction_id, borrower, 'borrower', 'PENDING', status='CANCELLED')
+        cancelled = _load(transaction_id)
+        db_transaction.on_commit(lambda: invalidate_user_caches(
+            cancelled.borrower_id, cancelled.lender_id))
+    return cancelled
+
+
+def mark_returned(transaction_id, borrower):
+    """
+    ACCEPTED -> RETURNED. The fee depends on the book price and accept date,
+    so the row is read first; the UPDATE stays guarded on the status. The
+    lender's email goes into the outbox in the same transaction.
+    """
+    with db_transaction.atomic():
+        try:
+            returned = _load(transaction_id)
+        except BorrowTransaction.DoesNotExist:
+            raise TransitionError(TransitionError.NOT_FOUND)
+
+        returned.status = 'RETURNED'
+        returned.return_date = timezone.now()
+        returned.final_rental_fee = returned.calculate_rental_fee()
+
+        _transition(transaction_id, borrower, 'borrower', 'ACCEPTED',
+                    status=returned.status,
+                    return_date=returned.return_date,
+                    final_rental_fee=returned.final_rental_fee)
+        build_return_notification(returned).save()
+        db_transaction.on_commit(lambda: invalidate_user_caches(
+            returned.borrower_id, returned.lender_id))
+    return returned
+
+
+def confirm_return(transaction_id, lender):
+    """RETURNED -> COMPLETED and put the book back on the shelf"""
+    now = timezone.now()
+    with db_transaction.atomic():
+        _transition(transaction_id, lender, 'lender', 'RETURNED', status='COMPLETED')
+        Book.objects.filter(pk__in=_book_of(transaction_id)).update(
+            is_available=True, updated_at=now)
+        bump_catalogue_version_on_commit()
+
+        completed = _load(transaction_id)
+        db_transaction.on_commit(lambda: invalidate_user_caches(
+            completed.borrower_id, completed.lender_id))
+    return completed
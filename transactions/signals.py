@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from books.cache import invalidation_deferred
+from books.models import Book
+from .cache import invalidate_book_caches, invalidate_user_caches
+from .models import BorrowTransaction
+
+
+@receiver(post_save, sender=BorrowTransaction)
+@receiver(post_delete, sender=BorrowTransaction)
+def invalidate_participant_caches(sender, instance, **kwargs):
+    """Any write to a transaction can move a counter for both participants"""
+    if not invalidation_deferred():
+        invalidate_user_caches(instance.borrower_id, instance.lender_id)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_caches_for_book(sender, instance, **kwargs):
+    """
+    The owner's dashboard counts/lists the book and borrowers' dashboards
+    embed it in their recent transactions.
+    """
+    if not invalidation_deferred():
+        invalidate_book_caches([instance.pk], instance.owner_id)
@@ -1,3 +1,499 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from books.models import Book
+from books.serializers import BookSerializer
+from entities.models import User
+from utils.testing import QueryPlanAssertions
+from . import notifications, services
+from .models import BorrowTransaction, Notification
+
+
+class TransactionQueryPlanTests(QueryPlanAssertions, TestCase):
+    """
+    Shapes used by transaction_stats, user_dashboard, check_overdue_books and
+    Book.has_pending_requests. Counts drop the default ordering, so the plans
+    are checked on unordered querysets.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+
+    def test_lender_status(self):
+        self.assertUsesIndex(
+            BorrowTransaction.objects.filter(
+                lender=self.lender, status='PENDING').order_by(),
+            'txn_lender_status_idx')
+
+    def test_borrower_status(self):
+        self.assertUsesIndex(
+            BorrowTransaction.objects.filter(
+                borrower=self.borrower, status='COMPLETED').order_by(),
+            'txn_borrower_status_idx')
+
+    def test_status_due_date(self):
+        self.assertUsesIndex(
+            BorrowTransaction.objects.filter(
+                status='ACCEPTED', due_date__lt=timezone.now().date()).order_by(),
+            'txn_status_due_idx')
+
+    def test_borrower_overdue(self):
+        self.assertUsesIndex(
+            BorrowTransaction.objects.filter(
+                borrower=self.borrower, status='ACCEPTED',
+                due_date__lt=timezone.now().date()).order_by())
+
+    def test_book_pending_requests(self):
+        self.assertUsesIndex(
+            self.book.transactions.filter(status='PENDING').order_by(),
+            'txn_book_pending_idx')
+
+
+class TransactionStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.borrower)
+
+    def borrow(self, status, **kwargs):
+        return BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.lender,
+            status=status, **kwargs)
+
+    def test_stats_are_one_query_then_cached(self):
+        self.borrow('COMPLETED')
+        self.borrow('ACCEPTED', due_date=timezone.now().date() - timedelta(days=1))
+
+        with self.assertNumQueries(1):
+            first = self.api.get('/api/transactions/stats/').json()
+        with self.assertNumQueries(0):
+            second = self.api.get('/api/transactions/stats/').json()
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, {
+            'total_borrowed': 1, 'total_lent': 0, 'pending_requests': 0,
+            'active_borrowings': 1, 'overdue_books': 1,
+        })
+
+    def test_status_change_invalidates_both_participants(self):
+        transaction = self.borrow('PENDING')
+        lender_api = APIClient()
+        lender_api.force_authenticate(self.lender)
+
+        self.assertEqual(
+            lender_api.get('/api/transactions/stats/').json()['pending_requests'], 1)
+        self.api.get('/api/transactions/stats/')
+
+        transaction.status = 'ACCEPTED'
+        transaction.save()
+
+        self.assertEqual(
+            lender_api.get('/api/transactions/stats/').json()['pending_requests'], 0)
+        self.assertEqual(
+            self.api.get('/api/transactions/stats/').json()['active_borrowings'], 1)
+
+
+class UserDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+        Book.objects.create(owner=cls.lender, title='Emma', author='Austen')
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.lender)
+
+    def test_dashboard_queries_and_cache(self):
+        BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.lender)
+
+        with self.assertNumQueries(3):
+            data = self.api.get('/api/transactions/dashboard/').json()
+        with self.assertNumQueries(0):
+            self.api.get('/api/transactions/dashboard/')
+
+        self.assertEqual(data['stats'], {
+            'books_listed': 2, 'active_borrowings': 0,
+            'pending_decisions': 1, 'total_lent': 0,
+        })
+        self.assertEqual(
+            [book['title'] for book in data['books_with_pending_requests']], ['Dune'])
+        self.assertEqual(len(data['recent_transactions']), 1)
+
+    def test_book_and_transaction_writes_invalidate(self):
+        self.api.get('/api/transactions/dashboard/')
+        Book.objects.create(owner=self.lender, title='Ulysses', author='Joyce')
+        data = self.api.get('/api/transactions/dashboard/').json()
+        self.assertEqual(data['stats']['books_listed'], 3)
+
+        BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.lender)
+        data = self.api.get('/api/transactions/dashboard/').json()
+        self.assertEqual(data['stats']['pending_decisions'], 1)
+
+
+class TransitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.other = User.objects.create_user('other', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.lender)
+        self.request = BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.lender)
+
+    def accept_url(self, transaction):
+        return f'/api/transactions/{transaction.pk}/accept/'
+
+    def test_accept_rejects_competing_requests(self):
+        competing = BorrowTransaction.objects.create(
+            book=self.book, borrower=self.other, lender=self.lender)
+
+        response = self.api.post(self.accept_url(self.request))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ACCEPTED')
+
+        self.request.refresh_from_db()
+        self.assertIsNotNone(self.request.accept_date)
+        self.assertIsNotNone(self.request.due_date)
+        competing.refresh_from_db()
+        self.assertEqual(competing.status, 'REJECTED')
+        self.book.refresh_from_db()
+        self.assertFalse(self.book.is_available)
+
+        # The request is no longer pending, so a replay is refused
+        response = self.api.post(self.accept_url(self.request))
+        self.assertEqual(response.status_code, 400)
+
+    def test_accept_when_book_already_on_loan(self):
+        competing = BorrowTransaction.objects.create(
+            book=self.book, borrower=self.other, lender=self.lender)
+        Book.objects.filter(pk=self.book.pk).update(is_available=False)
+
+        response = self.api.post(self.accept_url(competing))
+        self.assertEqual(response.status_code, 409)
+        competing.refresh_from_db()
+        self.assertEqual(competing.status, 'PENDING')
+
+    def test_only_the_lender_can_accept(self):
+        self.api.force_authenticate(self.borrower)
+        response = self.api.post(self.accept_url(self.request))
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(
+            self.api.post('/api/transactions/999999/accept/').status_code, 404)
+
+        self.request.refresh_from_db()
+        self.assertEqual(self.request.status, 'PENDING')
+
+    def test_full_loan_cycle(self):
+        borrower_api = APIClient()
+        borrower_api.force_authenticate(self.borrower)
+        base = f'/api/transactions/{self.request.pk}'
+
+        self.assertEqual(self.api.post(f'{base}/accept/').status_code, 200)
+        self.assertEqual(borrower_api.post(f'{base}/mark-returned/').status_code, 200)
+        response = self.api.post(f'{base}/confirm-return/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['transaction']['status'], 'COMPLETED')
+
+        self.book.refresh_from_db()
+        self.assertTrue(self.book.is_available)
+        self.assertEqual(borrower_api.post(f'{base}/cancel/').status_code, 400)
+
+
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError('SMTP server unavailable')
+
+
+class NotificationOutboxTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user(
+            'lender', email='lender@example.com', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+
+    def setUp(self):
+        self.loan = BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.lender,
+            status='ACCEPTED', accept_date=timezone.now())
+        self.api = APIClient()
+        self.api.force_authenticate(self.borrower)
+
+    def mark_returned(self):
+        return self.api.post(f'/api/transactions/{self.loan.pk}/mark-returned/')
+
+    def test_mark_returned_queues_instead_of_sending(self):
+        self.assertEqual(self.mark_returned().status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.kind, 'book_returned')
+        self.assertEqual(notification.recipient, 'lender@example.com')
+
+        call_command('run_notification_worker', '--once', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, 'Book Returned: Dune')
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'SENT')
+
+    def test_failed_transition_queues_nothing(self):
+        BorrowTransaction.objects.filter(pk=self.loan.pk).update(status='PENDING')
+        self.assertEqual(self.mark_returned().status_code, 400)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_retry_backoff_then_dead_letter(self):
+        self.mark_returned()
+        backend = FailingEmailBackend()
+
+        self.assertEqual(notifications.deliver_batch(connection=backend), (0, 1, 0))
+        notification = Notification.objects.get()
+        self.assertEqual(notification.attempts, 1)
+        self.assertEqual(notification.claim_token, '')
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        self.assertIn('SMTP server unavailable', notification.last_error)
+
+        # Not due again until the backoff has passed
+        self.assertEqual(notifications.deliver_batch(connection=backend), (0, 0, 0))
+
+        for _ in range(2, notifications.MAX_ATTEMPTS + 1):
+            Notification.objects.update(next_attempt_at=timezone.now())
+            notifications.deliver_batch(connection=backend)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'DEAD')
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_batch_reuses_one_connection(self):
+        for _ in range(3):
+            notifications.build_return_notification(self.loan).save()
+
+        opened = []
+
+        class CountingBackend(EmailBackend):
+            def open(self):
+                opened.append(self)
+                return super().open()
+
+        self.assertEqual(
+            notifications.deliver_batch(batch_size=10, connection=CountingBackend()),
+            (3, 0, 0))
+        self.assertEqual(len(opened), 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class CheckOverdueBooksTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user(
+            'borrower', email='borrower@example.com', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+        yesterday = timezone.now().date() - timedelta(days=1)
+        for status in ('ACCEPTED', 'BORROWED', 'RETURNED'):
+            BorrowTransaction.objects.create(
+                book=cls.book, borrower=cls.borrower, lender=cls.lender,
+                status=status, due_date=yesterday)
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('check_overdue_books', *args, stdout=out)
+        return out.getvalue()
+
+    def test_queues_each_overdue_loan_once(self):
+        # Per batch: select, then insert + update in a savepoint; plus the
+        # final empty select
+        with self.assertNumQueries(11):
+            output = self.run_command('--batch-size', '1')
+        self.assertIn('Queued 2 overdue notifications in 2 batches', output)
+        self.assertEqual(
+            Notification.objects.filter(
+                kind='book_overdue', recipient='borrower@example.com').count(), 2)
+
+        self.assertIn('Queued 0 overdue', self.run_command())
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_reminds_after_interval(self):
+        self.run_command()
+        BorrowTransaction.objects.update(
+            last_overdue_notice_at=timezone.now() - timedelta(days=4))
+        self.assertIn('Queued 2 overdue', self.run_command('--remind-every', '3'))
+
+    def test_dry_run_writes_nothing(self):
+        self.assertIn('Would queue 2 overdue', self.run_command('--dry-run'))
+        self.assertFalse(Notification.objects.exists())
+        self.assertFalse(
+            BorrowTransaction.objects.filter(last_overdue_notice_at__isnull=False).exists())
+
+
+class TransactionConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.lender)
+        self.loan = BorrowTransaction.objects.create(
+            book=self.book, borrower=self.borrower, lender=self.lender)
+
+    def revalidate(self, url, response):
+        return self.api.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code
+
+    def test_transition_invalidates_detail(self):
+        url = f'/api/transactions/{self.loan.pk}/'
+        first = self.api.get(url)
+        self.assertEqual(self.revalidate(url, first), 304)
+
+        services.accept_request(self.loan.pk, self.lender)
+        self.assertEqual(self.revalidate(url, first), 200)
+
+    def test_nested_book_change_invalidates_list(self):
+        url = '/api/transactions/'
+        first = self.api.get(url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.revalidate(url, first), 304)
+
+        self.book.daily_rental_price = 2
+        self.book.save()
+        self.assertEqual(self.revalidate(url, first), 200)
+
+    def test_nested_user_change_invalidates(self):
+        for url in ('/api/transactions/', f'/api/transactions/{self.loan.pk}/',
+                    f'/api/transactions/{self.loan.pk}/?fields=id,borrower.location'):
+            first = self.api.get(url)
+            self.assertEqual(self.revalidate(url, first), 304)
+
+            self.borrower.location = f'Nairobi {url}'
+            self.borrower.save()
+            self.assertEqual(self.revalidate(url, first), 200, url)
+            self.assertEqual(self.revalidate(url, self.api.get(url)), 304)
+
+
+class FragmentCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert')
+        borrowers = [User.objects.create_user(f'borrower{i}', password='pass12345!')
+                     for i in range(3)]
+        for borrower in borrowers:
+            BorrowTransaction.objects.create(
+                book=cls.book, borrower=borrower, lender=cls.lender, status='REJECTED')
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.lender)
+
+    def list_transactions(self):
+        # get_cover_images runs once per BookSerializer.to_representation
+        with mock.patch.object(BookSerializer, 'get_cover_images',
+                               autospec=True, return_value=None) as book_calls:
+            results = self.api.get('/api/transactions/').json()['results']
+        return results, book_calls.call_count
+
+    def test_shared_book_and_lender_serialized_once(self):
+        results, book_calls = self.list_transactions()
+        self.assertEqual(len(results), 3)
+        self.assertEqual(book_calls, 1)
+        self.assertEqual({row['lender']['username'] for row in results}, {'lender'})
+
+        # The next response reuses the stored fragment
+        _, book_calls = self.list_transactions()
+        self.assertEqual(book_calls, 0)
+
+    def test_save_and_owner_rename_invalidate(self):
+        self.list_transactions()
+        self.book.title = 'Dune Messiah'
+        self.book.save()
+        results, book_calls = self.list_transactions()
+        self.assertEqual(book_calls, 1)
+        self.assertEqual(results[0]['book']['title'], 'Dune Messiah')
+
+        self.lender.username = 'paul'
+        self.lender.save()
+        results, _ = self.list_transactions()
+        self.assertEqual(results[0]['book']['owner'], 'paul')
+        self.assertEqual(results[0]['lender']['username'], 'paul')
+
+    def test_scheme_is_part_of_the_key(self):
+        def cover(**extra):
+            response = self.api.get('/api/transactions/', **extra)
+            return response.json()['results'][0]['book']['cover_image']
+
+        self.assertTrue(cover().startswith('http://testserver/'))
+        self.assertTrue(cover(secure=True).startswith('https://testserver/'))
+        self.assertTrue(cover().startswith('http://testserver/'))
+
+
+class TransactionSparseFieldsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.lender = User.objects.create_user('lender', password='pass12345!')
+        cls.borrower = User.objects.create_user('borrower', password='pass12345!')
+        cls.book = Book.objects.create(owner=cls.lender, title='Dune', author='Herbert',
+                                       daily_rental_price=2)
+        cls.loan = BorrowTransaction.objects.create(
+            book=cls.book, borrower=cls.borrower, lender=cls.lender, status='ACCEPTED',
+            accept_date=timezone.now() - timedelta(days=3),
+            due_date=timezone.localdate() - timedelta(days=1))
+
+    def setUp(self):
+        cache.clear()
+        self.api = APIClient()
+        self.api.force_authenticate(self.borrower)
+
+    def test_list_reads_only_selected_columns(self):
+        url = ('/api/transactions/?fields=id,status,is_overdue,estimated_fee,'
+               'book.title,lender.username')
+        with self.assertNumQueries(2) as queries:
+            response = self.api.get(url)
+        self.assertEqual(response.json()['results'], [{
+            'id': self.loan.pk, 'book': {'title': 'Dune'}, 'lender': {'username': 'lender'},
+            'status': 'ACCEPTED', 'is_overdue': True, 'estimated_fee': 6.0}])
+        page_sql = queries.captured_queries[-1]['sql']
+        for column in ('"description"', '"password"', '"email"', '"cover_renditions"'):
+            self.assertNotIn(column, page_sql)
+
+    def test_sparse_fragments_do_not_leak_into_full_responses(self):
+        self.api.get('/api/transactions/?fields=id,book.title,borrower.username')
+        result = self.api.get('/api/transactions/').json()['results'][0]
+        self.assertEqual(result['book']['author'], 'Herbert')
+        self.assertIn('email', result['borrower'])
 
-# Create your tests here.
+    def test_detail_supports_fields(self):
+        response = self.api.get(f'/api/transactions/{self.loan.pk}/?fields=id,days_borrowed')
+        self.assertEqual(response.json(), {'id': self.loan.pk, 'days_borrowed': 3})
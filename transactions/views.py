@@ -1,26 +1,46 @@
+import logging
+
 from rest_framework import generics, permissions, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db.models import Q
 from django.shortcuts import redirect
 from django.contrib import messages
-from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
 
 from utils.api_client import APIClient
+from utils.conditional import ConditionalGetMixin
 from utils.decorators import jwt_login_required
+from utils.log import payload
+from utils.pagination import KeysetPagination
+from utils.sparse import SparseQuerysetMixin
 from .models import BorrowTransaction
+from . import services
+from .cache import get_transaction_stats, get_user_dashboard
+from .services import TransitionError
 from .serializers import BorrowTransactionSerializer, BorrowTransactionCreateSerializer
 from .permissions import IsTransactionParticipant, IsLender, IsBorrower
-from books.models import Book
-from books.serializers import BookSerializer
+
+logger = logging.getLogger(__name__)
 
 # ===== API VIEWS (for DRF API endpoints) =====
 
 
-class TransactionListView(generics.ListCreateAPIView):
+class TransactionPagination(KeysetPagination):
+    ordering = ('-request_date',)
+
+
+class TransactionListView(SparseQuerysetMixin, ConditionalGetMixin,
+                          generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TransactionPagination
+    # The nested book and users are part of each item
+    last_modified_fields = ('updated_at', 'book__updated_at',
+                            'borrower__updated_at', 'lender__updated_at')
+    varies_by_date = True
+    sparse_required_columns = ('request_date',)  # the cursor
+
+    def get_etag_parts(self):
+        return super().get_etag_parts() + [self.request.user.pk]
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -33,7 +53,7 @@ class TransactionListView(generics.ListCreateAPIView):
 
         queryset = BorrowTransaction.objects.filter(
             Q(borrower=user) | Q(lender=user)
-        ).select_related('book', 'borrower', 'lender')
+        ).select_related('book__owner', 'borrower', 'lender')
 
         if transaction_type == 'outgoing':
             queryset = queryset.filter(borrower=user)
@@ -43,36 +63,51 @@ class TransactionListView(generics.ListCreateAPIView):
         return queryset
 
 
-class TransactionDetailView(generics.RetrieveAPIView):
-    queryset = BorrowTransaction.objects.all()
+class TransactionDetailView(SparseQuerysetMixin, ConditionalGetMixin,
+                            generics.RetrieveAPIView):
+    queryset = BorrowTransaction.objects.select_related('book__owner', 'borrower', 'lender')
+    last_modified_fields = ('updated_at', 'book__updated_at',
+                            'borrower__updated_at', 'lender__updated_at')
+    varies_by_date = True
+    # Validators and IsTransactionParticipant
+    sparse_required_columns = last_modified_fields + ('borrower', 'lender')
     serializer_class = BorrowTransactionSerializer
     permission_classes = [
         permissions.IsAuthenticated, IsTransactionParticipant]
 
 
-@api_view(['POST'])
-@permission_classes([permissions.IsAuthenticated, IsLender])
-def api_accept_request(request, transaction_id):
-    """API endpoint for accepting requests"""
-    try:
-        transaction = BorrowTransaction.objects.get(id=transaction_id)
-    except BorrowTransaction.DoesNotExist:
+def transition_error_response(error, invalid_status_message):
+    """Map a TransitionError from transactions.services to an API response"""
+    if error.reason == TransitionError.NOT_FOUND:
         return Response(
             {'error': 'Transaction not found'},
             status=status.HTTP_404_NOT_FOUND
         )
-
-    if transaction.status != 'PENDING':
+    if error.reason == TransitionError.FORBIDDEN:
         return Response(
-            {'error': 'This request has already been processed'},
-            status=status.HTTP_400_BAD_REQUEST
+            {'error': 'You do not have permission to perform this action.'},
+            status=status.HTTP_403_FORBIDDEN
         )
+    if error.reason == TransitionError.BOOK_UNAVAILABLE:
+        return Response(
+            {'error': 'This book is already on loan'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return Response(
+        {'error': invalid_status_message},
+        status=status.HTTP_400_BAD_REQUEST
+    )
 
-    transaction.status = 'ACCEPTED'
-    transaction.save()
 
-    transaction.book.is_available = False
-    transaction.book.save()
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated, IsLender])
+def api_accept_request(request, transaction_id):
+    """API endpoint for accepting requests"""
+    try:
+        transaction = services.accept_request(transaction_id, request.user)
+    except TransitionError as e:
+        return transition_error_response(
+            e, 'This request has already been processed')
 
     serializer = BorrowTransactionSerializer(transaction)
     return Response(serializer.data)
@@ -83,21 +118,10 @@ def api_accept_request(request, transaction_id):
 def api_reject_request(request, transaction_id):
     """API endpoint for rejecting requests"""
     try:
-        transaction = BorrowTransaction.objects.get(id=transaction_id)
-    except BorrowTransaction.DoesNotExist:
-        return Response(
-            {'error': 'Transaction not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
-
-    if transaction.status != 'PENDING':
-        return Response(
-            {'error': 'This request has already been processed'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
-    transaction.status = 'REJECTED'
-    transaction.save()
+        transaction = services.reject_request(transaction_id, request.user)
+    except TransitionError as e:
+        return transition_error_response(
+            e, 'This request has already been processed')
 
     serializer = BorrowTransactionSerializer(transaction)
     return Response(serializer.data)
@@ -108,27 +132,10 @@ def api_reject_request(request, transaction_id):
 def api_mark_returned(request, transaction_id):
     """API endpoint for marking books as returned"""
     try:
-        transaction = BorrowTransaction.objects.get(id=transaction_id)
-    except BorrowTransaction.DoesNotExist:
-        return Response(
-            {'error': 'Transaction not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
-
-    if transaction.status != 'ACCEPTED':
-        return Response(
-            {'error': 'Can only mark returned books that are currently borrowed'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
-    transaction.status = 'RETURNED'
-    transaction.return_date = timezone.now()
-    transaction.save()
-
-    try:
-        send_return_notification(transaction)
-    except Exception as e:
-        print(f"Email notification failed: {e}")
+        transaction = services.mark_returned(transaction_id, request.user)
+    except TransitionError as e:
+        return transition_error_response(
+            e, 'Can only mark returned books that are currently borrowed')
 
     serializer = BorrowTransactionSerializer(transaction)
     return Response({
@@ -142,27 +149,10 @@ def api_mark_returned(request, transaction_id):
 def api_confirm_return(request, transaction_id):
     """API endpoint for confirming returns"""
     try:
-        transaction = BorrowTransaction.objects.get(id=transaction_id)
-    except BorrowTransaction.DoesNotExist:
-        return Response(
-            {'error': 'Transaction not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
-
-    if transaction.status != 'RETURNED':
-        return Response(
-            {'error': 'Can only confirm return for books marked as returned'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
-    transaction.status = 'COMPLETED'
-    transaction.save()
-
-    transaction.book.is_available = True
-    transaction.book.save()
-
-    transaction.final_rental_fee = transaction.calculate_rental_fee()
-    transaction.save()
+        transaction = services.confirm_return(transaction_id, request.user)
+    except TransitionError as e:
+        return transition_error_response(
+            e, 'Can only confirm return for books marked as returned')
 
     serializer = BorrowTransactionSerializer(transaction)
     return Response({
@@ -177,21 +167,9 @@ def api_confirm_return(request, transaction_id):
 def api_cancel_request(request, transaction_id):
     """API endpoint for canceling requests"""
     try:
-        transaction = BorrowTransaction.objects.get(id=transaction_id)
-    except BorrowTransaction.DoesNotExist:
-        return Response(
-            {'error': 'Transaction not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
-
-    if transaction.status != 'PENDING':
-        return Response(
-            {'error': 'Can only cancel pending requests'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
-
-    transaction.status = 'CANCELLED'
-    transaction.save()
+        transaction = services.cancel_request(transaction_id, request.user)
+    except TransitionError as e:
+        return transition_error_response(e, 'Can only cancel pending requests')
 
     serializer = BorrowTransactionSerializer(transaction)
     return Response({
@@ -208,7 +186,7 @@ def accept_request(request, transaction_id):
     try:
         api_client = APIClient(request)
         response = api_client.post(f'/transactions/{transaction_id}/accept/')
-        print(f"DEBUG - Accept response: {response}")
+        logger.debug('Accept %s response: %s', transaction_id, payload(response))
 
         if isinstance(response, dict):
             if 'id' in response:
@@ -223,8 +201,8 @@ def accept_request(request, transaction_id):
         else:
             messages.error(request, '❌ Unexpected response from server')
 
-    except Exception as e:
-        print(f"DEBUG - Accept error: {e}")
+    except Exception:
+        logger.exception('Error accepting request %s', transaction_id)
         messages.error(request, '❌ Error accepting request')
 
     return redirect('transaction_list')
@@ -236,7 +214,7 @@ def reject_request(request, transaction_id):
     try:
         api_client = APIClient(request)
         response = api_client.post(f'/transactions/{transaction_id}/reject/')
-        print(f"DEBUG - Reject response: {response}")
+        logger.debug('Reject %s response: %s', transaction_id, payload(response))
 
         if isinstance(response, dict):
             if 'id' in response:
@@ -250,8 +228,8 @@ def reject_request(request, transaction_id):
         else:
             messages.error(request, '❌ Unexpected response from server')
 
-    except Exception as e:
-        print(f"DEBUG - Reject error: {e}")
+    except Exception:
+        logger.exception('Error rejecting request %s', transaction_id)
         messages.error(request, '❌ Error rejecting request')
 
     return redirect('transaction_list')
@@ -264,7 +242,7 @@ def mark_returned(request, transaction_id):
         api_client = APIClient(request)
         response = api_client.post(
             f'/transactions/{transaction_id}/mark-returned/')
-        print(f"DEBUG - Mark returned response: {response}")
+        logger.debug('Mark returned %s response: %s', transaction_id, payload(response))
 
         if isinstance(response, dict):
             # if 'id' in response:
@@ -279,8 +257,8 @@ def mark_returned(request, transaction_id):
         else:
             messages.error(request, '❌ Unexpected response from server')
 
-    except Exception as e:
-        print(f"DEBUG - Mark returned error: {e}")
+    except Exception:
+        logger.exception('Error marking transaction %s as returned', transaction_id)
         messages.error(request, '❌ Error marking book as returned')
 
     return redirect('transaction_list')
@@ -293,7 +271,7 @@ def confirm_return(request, transaction_id):
         api_client = APIClient(request)
         response = api_client.post(
             f'/transactions/{transaction_id}/confirm-return/')
-        print(f"DEBUG - Confirm return response: {response}")
+        logger.debug('Confirm return %s response: %s', transaction_id, payload(response))
 
         if isinstance(response, dict):
             # if 'id' in response:
@@ -308,8 +286,8 @@ def confirm_return(request, transaction_id):
         else:
             messages.error(request, '❌ Unexpected response from server')
 
-    except Exception as e:
-        print(f"DEBUG - Confirm return error: {e}")
+    except Exception:
+        logger.exception('Error confirming return of transaction %s', transaction_id)
         messages.error(request, '❌ Error confirming return')
 
     return redirect('transaction_list')
@@ -321,7 +299,7 @@ def cancel_request(request, transaction_id):
     try:
         api_client = APIClient(request)
         response = api_client.post(f'/transactions/{transaction_id}/cancel/')
-        print(f"DEBUG - Cancel response: {response}")
+        logger.debug('Cancel %s response: %s', transaction_id, payload(response))
 
         if isinstance(response, dict):
             # if 'id' in response:
@@ -335,82 +313,22 @@ def cancel_request(request, transaction_id):
         else:
             messages.error(request, '❌ Unexpected response from server')
 
-    except Exception as e:
-        print(f"DEBUG - Cancel error: {e}")
+    except Exception:
+        logger.exception('Error cancelling request %s', transaction_id)
         messages.error(request, '❌ Error cancelling request')
 
     return redirect('transaction_list')
 
-# ===== HELPER FUNCTIONS =====
-
-
-def send_return_notification(transaction):
-    """Send email notification to lender"""
-    subject = f'Book Returned: {transaction.book.title}'
-    message = f'''
-    Hello {transaction.lender.username},
-    
-    The borrower {transaction.borrower.username} has marked the book 
-    "{transaction.book.title}" as returned.
-    
-    Please confirm the return to complete the transaction.
-    
-    Thank you for using BorrowedWords!
-    '''
-
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [transaction.lender.email],
-        fail_silently=True,
-    )
-
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def transaction_stats(request):
-    """Get transaction statistics"""
-    user = request.user
-
-    stats = {
-        'total_borrowed': BorrowTransaction.objects.filter(borrower=user, status='COMPLETED').count(),
-        'total_lent': BorrowTransaction.objects.filter(lender=user, status='COMPLETED').count(),
-        'pending_requests': BorrowTransaction.objects.filter(lender=user, status='PENDING').count(),
-        'active_borrowings': BorrowTransaction.objects.filter(borrower=user, status='ACCEPTED').count(),
-        'overdue_books': BorrowTransaction.objects.filter(
-            borrower=user,
-            status='ACCEPTED',
-            due_date__lt=timezone.now().date()
-        ).count(),
-    }
-
-    return Response(stats)
+    """Get transaction statistics (one aggregate query, cached per user)"""
+    return Response(get_transaction_stats(request.user))
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def user_dashboard(request):
-    """Get user dashboard data"""
-    user = request.user
-
-    recent_transactions = BorrowTransaction.objects.filter(
-        Q(borrower=user) | Q(lender=user)
-    ).select_related('book', 'borrower', 'lender')[:5]
-
-    books_with_requests = Book.objects.filter(
-        owner=user,
-        transactions__status='PENDING'
-    ).distinct()
-
-    dashboard_data = {
-        'recent_transactions': BorrowTransactionSerializer(recent_transactions, many=True).data,
-        'books_with_pending_requests': BookSerializer(books_with_requests, many=True).data,
-        'stats': {
-            'books_listed': Book.objects.filter(owner=user).count(),
-            'active_borrowings': BorrowTransaction.objects.filter(borrower=user, status='ACCEPTED').count(),
-            'pending_decisions': BorrowTransaction.objects.filter(lender=user, status='PENDING').count(),
-        }
-    }
-
-    return Response(dashboard_data)
+    """Get user dashboard data (cached per user, see transactions/cache.py)"""
+    return Response(get_user_dashboard(request.user))
@@ -1,17 +1,151 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from django.contrib import messages
+from django.urls import resolve, Resolver404
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
+
+from utils.log import payload
+from utils.timing import timed
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_INPROCESS = 'inprocess'
+TRANSPORT_HTTP = 'http'
+
+_http_adapter = None
+_http_adapter_lock = threading.Lock()
+_http_local = threading.local()
+
+
+def get_http_adapter():
+    """Process-wide connection pool shared by every thread's session"""
+    global _http_adapter
+    if _http_adapter is None:
+        with _http_adapter_lock:
+            if _http_adapter is None:
+                pool_size = getattr(settings, 'API_CLIENT_POOL_SIZE', 10)
+                _http_adapter = HTTPAdapter(
+                    pool_connections=pool_size,
+                    pool_maxsize=pool_size,
+                    pool_block=False,
+                )
+    return _http_adapter
+
+
+def get_http_session():
+    """
+    Keep-alive session for the HTTP transport.
+
+    Sessions are per thread (requests.Session itself is not thread-safe) but
+    mount the same adapter, so connections are pooled across the process.
+    Cookies are never stored, otherwise one user's API cookies could be
+    replayed on another user's request handled by the same thread.
+    """
+    session = getattr(_http_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        session.headers['Connection'] = 'keep-alive'
+        adapter = get_http_adapter()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _http_local.session = session
+    return session
+
+
+class ValidatorCache:
+    """
+    Bounded LRU of GET responses by (caller, URL): the ETag the API sent and
+    the data that came with it. The next GET of the URL sends If-None-Match,
+    and a 304 is answered from here without the API serializing anything.
+    Shared by every APIClient in the process; entries are never mutated,
+    so callers get the stored object back as-is.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, etag, data):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._entries[key] = (etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+validator_cache = ValidatorCache(
+    getattr(settings, 'API_CLIENT_VALIDATOR_CACHE_SIZE', 256))
+
+
+def get_http_timeout():
+    """(connect, read) timeout tuple for the HTTP transport"""
+    return (
+        getattr(settings, 'API_CLIENT_CONNECT_TIMEOUT', 3.05),
+        getattr(settings, 'API_CLIENT_READ_TIMEOUT', 15),
+    )
+
+
+class InProcessResponse:
+    """Minimal stand-in for requests.Response returned by the in-process transport"""
+
+    def __init__(self, status_code, data, headers=None):
+        self.status_code = status_code
+        self.data = data
+        self.headers = headers or {}
+
+    def json(self):
+        return self.data
+
+    @property
+    def text(self):
+        if self.data is None:
+            return ''
+        return json.dumps(self.data, cls=JSONEncoder)
 
 
 class APIClient:
-    def __init__(self, request):
+    def __init__(self, request, transport=None):
         self.request = request
+        self.transport = transport or getattr(
+            settings, 'API_CLIENT_TRANSPORT', TRANSPORT_INPROCESS)
         self.base_url = self.get_base_url()
+        self._factory = None
+        self._session_user = None
+        self._session_user_token = None
 
     def get_base_url(self):
         """Get the base URL for API calls"""
         try:
-            if hasattr(settings, 'ON_PYTHONANYWHERE') and settings.ON_PYTHONANYWHERE:
+            if getattr(settings, 'API_BASE_URL', None):
+                return settings.API_BASE_URL.rstrip('/')
+            elif hasattr(settings, 'ON_PYTHONANYWHERE') and settings.ON_PYTHONANYWHERE:
                 return 'https://milagro.pythonanywhere.com'
             elif hasattr(self.request, 'is_secure') and hasattr(self.request, 'get_host'):
                 if self.request.is_secure():
@@ -28,28 +162,27 @@ class APIClient:
         try:
             refresh_token = self.request.session.get('refresh_token')
             if not refresh_token:
-                print("DEBUG - No refresh token available")
+                logger.debug('No refresh token available')
                 return False
 
-            print("DEBUG - Attempting token refresh...")
-            response = requests.post(
-                f'{self.base_url}/api/auth/token/refresh/',
-                json={'refresh': refresh_token}
-            )
+            logger.debug('Attempting token refresh')
+            response = self.send(
+                'POST', '/auth/token/refresh/', {'refresh': refresh_token},
+                authenticate=False)
 
             if response.status_code == 200:
                 data = response.json()
                 self.request.session['access_token'] = data['access']
                 self.request.session.modified = True
-                print("DEBUG - Token refreshed successfully")
+                logger.debug('Token refreshed successfully')
                 return True
             else:
-                print(
-                    f"DEBUG - Token refresh failed: {response.status_code} - {response.text}")
+                logger.info('Token refresh failed: %s - %s',
+                            response.status_code, payload(response.text))
                 return False
 
-        except Exception as e:
-            print(f"DEBUG - Token refresh error: {e}")
+        except Exception:
+            logger.exception('Token refresh error')
             return False
 
     def get_headers(self):
@@ -61,54 +194,175 @@ class APIClient:
             access_token = self.request.session.get('access_token')
             if access_token:
                 headers['Authorization'] = f"Bearer {access_token}"
-                print(f"DEBUG - Authorization header set with token")
+                logger.debug('Authorization header set with token')
             else:
-                print("DEBUG - No access token in session")
+                logger.debug('No access token in session')
         else:
-            print("DEBUG - No User in session (public request))")
+            logger.debug('No user in session (public request)')
 
         return headers
 
     def handle_authentication_error(self, response):
         """Handle authentication errors and attempt token refresh"""
         if response.status_code == 401:
-            print("DEBUG - Authentication error detected")
+            logger.debug('Authentication error detected')
             if 'token_not_valid' in response.text or 'expired' in response.text.lower():
-                print("DEBUG - Token appears to be expired, attempting refresh...")
+                logger.debug('Token appears to be expired, attempting refresh')
                 if self.refresh_token():
                     return True  # Token was refreshed
                 else:
-                    print("DEBUG - Token refresh failed, clearing session")
+                    logger.info('Token refresh failed, clearing session')
                     # Clear invalid session
                     if hasattr(self.request, 'session'):
                         self.request.session.flush()
             else:
-                print("DEBUG - Other authentication error")
+                logger.debug('Other authentication error')
         return False
 
+    def send(self, method, endpoint, data=None, authenticate=True):
+        """
+        Dispatch a single API call over the configured transport and return
+        the raw response (requests.Response or InProcessResponse).
+        """
+        method = method.upper()
+        if method not in ('GET', 'POST', 'PUT', 'PATCH', 'DELETE'):
+            raise ValueError(f'Unsupported method: {method}')
+
+        with timed('api'):
+            if method != 'GET':
+                return self._dispatch(method, endpoint, data, authenticate)
+            return self._send_conditional(endpoint, authenticate)
+
+    def _dispatch(self, method, endpoint, data, authenticate, extra_headers=None):
+        if self.transport == TRANSPORT_HTTP:
+            return self._send_http(method, endpoint, data, authenticate, extra_headers)
+        return self._send_inprocess(method, endpoint, data, authenticate, extra_headers)
+
+    def _send_conditional(self, endpoint, authenticate):
+        """GET with If-None-Match from the validator cache; a 304 comes back
+        as a 200 carrying the cached data"""
+        key = self._validator_key(endpoint, authenticate)
+        cached = validator_cache.get(key)
+        extra_headers = {'If-None-Match': cached[0]} if cached else None
+
+        response = self._dispatch('GET', endpoint, None, authenticate, extra_headers)
+        if response.status_code == 304 and cached:
+            logger.debug('Not modified: /api%s', endpoint)
+            return InProcessResponse(200, cached[1], {'ETag': cached[0]})
+
+        etag = response.headers.get('ETag')
+        if response.status_code == 200 and etag:
+            try:
+                validator_cache.set(key, etag, response.json())
+            except ValueError:
+                pass
+        return response
+
+    def _validator_key(self, endpoint, authenticate):
+        """Cache key per URL and per caller; the token is hashed, not kept"""
+        token = ''
+        if authenticate and hasattr(self.request, 'session') and self.request.session.get('user'):
+            token = self.request.session.get('access_token') or ''
+        caller = hashlib.sha256(token.encode()).hexdigest() if token else ''
+        return (self.transport, self.base_url, endpoint, caller)
+
+    def _send_http(self, method, endpoint, data, authenticate, extra_headers=None):
+        full_url = f"{self.base_url}/api{endpoint}"
+        headers = self.get_headers() if authenticate else {
+            'Content-Type': 'application/json'}
+        if extra_headers:
+            headers.update(extra_headers)
+
+        session = get_http_session()
+        if method in ('GET', 'DELETE'):
+            return session.request(method, full_url, headers=headers,
+                                   timeout=get_http_timeout())
+        return session.request(method, full_url, json=data, headers=headers,
+                               timeout=get_http_timeout())
+
+    def _send_inprocess(self, method, endpoint, data, authenticate, extra_headers=None):
+        """Resolve the API view and call it directly, skipping the HTTP loopback"""
+        path = f"/api{endpoint}"
+        try:
+            match = resolve(urlsplit(path).path)
+        except Resolver404:
+            return InProcessResponse(404, {'detail': 'Not found.'})
+
+        if self._factory is None:
+            self._factory = APIRequestFactory()
+
+        extra = {}
+        for name, value in (extra_headers or {}).items():
+            extra['HTTP_' + name.upper().replace('-', '_')] = value
+        if hasattr(self.request, 'get_host'):
+            extra['HTTP_HOST'] = self.request.get_host()
+            extra['secure'] = self.request.is_secure()
+
+        access_token = None
+        if authenticate and hasattr(self.request, 'session') and self.request.session.get('user'):
+            access_token = self.request.session.get('access_token')
+
+        if method in ('GET', 'DELETE'):
+            api_request = self._factory.generic(method, path, **extra)
+        else:
+            api_request = self._factory.generic(
+                method, path, json.dumps(data or {}, cls=JSONEncoder),
+                content_type='application/json', **extra)
+
+        if access_token:
+            user = self._get_session_user(access_token)
+            if user is not None:
+                force_authenticate(api_request, user=user)
+            else:
+                # Let the API produce its usual 401 so the refresh flow kicks in
+                api_request.META['HTTP_AUTHORIZATION'] = f"Bearer {access_token}"
+
+        api_request.resolver_match = match
+        response = match.func(api_request, *match.args, **match.kwargs)
+
+        headers = {'ETag': response['ETag']} if response.has_header('ETag') else None
+        if hasattr(response, 'render'):
+            # Render like the HTTP transport would, so callers see the same
+            # JSON types (Decimal and datetime values become strings)
+            response.render()
+
+        content = getattr(response, 'content', b'')
+        try:
+            payload = json.loads(content) if content else None
+        except ValueError:
+            payload = {'error': f"HTTP {response.status_code}",
+                       'detail': content[:200].decode(errors='replace')}
+        return InProcessResponse(response.status_code, payload, headers)
+
+    def _get_session_user(self, access_token):
+        """Validate the session's access token once per client and cache the user"""
+        if self._session_user_token == access_token:
+            return self._session_user
+
+        authenticator = JWTAuthentication()
+        try:
+            validated_token = authenticator.get_validated_token(access_token)
+            user = authenticator.get_user(validated_token)
+        except (InvalidToken, AuthenticationFailed):
+            user = None
+
+        self._session_user = user
+        self._session_user_token = access_token
+        return user
+
     def make_authenticated_request(self, method, endpoint, data=None, max_retries=1):
         """Make an authenticated request with automatic token refresh"""
         for attempt in range(max_retries + 1):
             try:
-                headers = self.get_headers()
-                full_url = f"{self.base_url}/api{endpoint}"
-
-                print(f"DEBUG - Attempt {attempt + 1}: {method} {full_url}")
-
-                if method.upper() == 'GET':
-                    response = requests.get(full_url, headers=headers)
-                elif method.upper() == 'POST':
-                    response = requests.post(
-                        full_url, json=data, headers=headers)
-                elif method.upper() == 'PUT':
-                    response = requests.put(
-                        full_url, json=data, headers=headers)
-                elif method.upper() == 'DELETE':
-                    response = requests.delete(full_url, headers=headers)
-                else:
+                logger.debug('Attempt %d: %s /api%s (%s)',
+                             attempt + 1, method, endpoint, self.transport)
+
+                try:
+                    response = self.send(method, endpoint, data)
+                except ValueError:
                     return {'error': f'Unsupported method: {method}'}
 
-                print(f"DEBUG - Response status: {response.status_code}")
+                logger.debug('Response status: %s', response.status_code)
 
                 # If authentication error and we haven't retried yet, try refreshing token
                 if response.status_code == 401 and attempt < max_retries:
@@ -118,7 +372,7 @@ class APIClient:
                 return self._handle_response(response)
 
             except Exception as e:
-                print(f"DEBUG - Request exception: {e}")
+                logger.exception('API %s /api%s failed', method, endpoint)
                 return {'error': str(e)}
 
         return {'error': 'Authentication failed after retry'}
@@ -126,19 +380,15 @@ class APIClient:
     def get(self, endpoint):
         """Make GET request - works for both authenticated and public endpoints"""
         try:
-            full_url = f"{self.base_url}/api{endpoint}"
-            if settings.DEBUG:
-                print(f"DEBUG - API GET: {full_url}")
+            logger.debug('API GET: /api%s (%s)', endpoint, self.transport)
 
-            response = requests.get(full_url, headers=self.get_headers())
+            response = self.send('GET', endpoint)
 
-            if settings.DEBUG:
-                print(f"DEBUG - Response status: {response.status_code}")
+            logger.debug('Response status: %s', response.status_code)
 
             return self._handle_response(response)
         except Exception as e:
-            if settings.DEBUG:
-                print(f"DEBUG - API GET Exception: {e}")
+            logger.exception('API GET /api%s failed', endpoint)
             return {'error': str(e)}
 
     def post(self, endpoint, data=None):
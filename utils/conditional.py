@@ -0,0 +1,136 @@
+"""
+Conditional GET for DRF views.
+
+`ConditionalGetMixin` answers `If-None-Match` / `If-Modified-Since` with a 304
+before anything is serialized:
+
+  detail views  validators come from the object get_object() already loaded
+                (permissions still run first), so a 304 costs no extra query
+  list views    one aggregate, MAX(updated_at) and COUNT(*) over the filtered
+                queryset, runs before the page query; any insert, edit or
+                delete in the result set changes one of the two. Lists send
+                no Last-Modified: a row deleted or filtered out of the list
+                leaves MAX(updated_at) where it was, so If-Modified-Since
+                would answer 304 for a list that lost a row
+
+ETags are weak (W/"..."): they identify the data, not the exact bytes, and
+also cover the URL, the negotiated media type and whatever else the view
+adds in `get_etag_parts()`, such as the user for per-user lists.
+"""
+import hashlib
+from datetime import datetime, time
+
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    digest = hashlib.blake2b(
+        '\x1f'.join(str(part) for part in parts).encode(), digest_size=12)
+    return f'W/"{digest.hexdigest()}"'
+
+
+def start_of_today():
+    return timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+
+def check_not_modified(request, headers):
+    """
+    The 304 (or 412) to send instead of the response whose validators are
+    `headers`, or None. Works from stored headers too, e.g. a cached page.
+    """
+    last_modified = headers.get('Last-Modified')
+    response = get_conditional_response(
+        request, etag=headers.get('ETag'),
+        last_modified=last_modified and parse_http_date(last_modified))
+    if response is not None:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+class ConditionalGetMixin:
+    # Field(s) whose newest value dates the representation; related fields
+    # (e.g. 'book__updated_at') are allowed
+    last_modified_fields = ('updated_at',)
+    # Representation depends on today's date (overdue flags, running fees)
+    varies_by_date = False
+
+    def get_etag_parts(self):
+        request = self.request
+        parts = [request.get_full_path(), request.accepted_media_type,
+                 request.user.is_authenticated]
+        if self.varies_by_date:
+            parts.append(timezone.localdate())
+        return parts
+
+    def get_object_last_modified(self, obj):
+        values = []
+        for path in self.last_modified_fields:
+            value = obj
+            for attr in path.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return max(values)
+
+    def get_list_validators(self, queryset):
+        """(last_modified, count) of everything the list could return"""
+        aggregates = {f'_max{i}': Max(field)
+                      for i, field in enumerate(self.last_modified_fields)}
+        row = queryset.order_by().aggregate(_count=Count('pk'), **aggregates)
+        dates = [row[key] for key in aggregates if row[key] is not None]
+        return (max(dates) if dates else None), row['_count']
+
+    def conditional_response(self, last_modified, *extra, send_last_modified=True):
+        """
+        Validator headers for the response, and the 304 (or 412) to send
+        instead when the client's copy is current.
+        """
+        if self.varies_by_date and last_modified:
+            # Yesterday's copy is stale even if no row changed since
+            last_modified = max(last_modified, start_of_today())
+        etag = make_etag(*self.get_etag_parts(),
+                         last_modified and last_modified.isoformat(), *extra)
+        # HTTP dates have whole seconds; the ETag carries the microseconds
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        headers = {'ETag': etag}
+        if timestamp is not None and send_last_modified:
+            headers['Last-Modified'] = http_date(timestamp)
+        return headers, check_not_modified(self.request, headers)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        last_modified, count = self.get_list_validators(queryset)
+        # The ETag covers the count as well; see the module docstring
+        headers, not_modified = self.conditional_response(
+            last_modified, count, send_last_modified=False)
+        if not_modified is not None:
+            return not_modified
+
+        # Same as ListModelMixin.list, minus the filter_queryset done above
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.serialize_page(page))
+        else:
+            response = Response(self.serialize_page(queryset))
+        return self.add_validators(response, headers)
+
+    def serialize_page(self, objects):
+        return self.get_serializer(objects, many=True).data
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        headers, not_modified = self.conditional_response(
+            self.get_object_last_modified(instance), instance.pk)
+        if not_modified is not None:
+            return not_modified
+        response = Response(self.get_serializer(instance).data)
+        return self.add_validators(response, headers)
+
+    def add_validators(self, response, headers):
+        for name, value in headers.items():
+            response[name] = value
+        return response
@@ -0,0 +1,11 @@
+from django.db.models import Func, IntegerField, Subquery
+
+
+def count_subquery(queryset):
+    """
+    COUNT(*) of a correlated queryset as a scalar subquery. Unlike
+    Count() on a join it adds no GROUP BY, so it composes with other
+    annotations and always yields a number (0 when nothing matches).
+    """
+    counted = queryset.order_by().values(_count=Func('pk', function='COUNT'))
+    return Subquery(counted, output_field=IntegerField())
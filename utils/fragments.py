@@ -0,0 +1,85 @@
+"""
+Per-object serialized fragment cache.
+
+`FragmentCacheMixin` makes a ModelSerializer remember the dict it produced
+for each object, keyed by (serializer, pk, updated_at). A transaction list
+embeds the same book and the same lender in row after row; with the mixin
+each distinct object is serialized once per response (a memo kept on the
+root serializer) and, across responses, once per change: any save moves
+`updated_at`, which moves the key, so stale fragments are never read again
+and just expire.
+
+Only use it on serializers whose output depends on nothing but the
+object's own columns, plus whatever else bumps its `updated_at`. A
+serializer trimmed or expanded by ?fields=/?expand= (utils/sparse.py) files
+its fragments under the shape it actually renders.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.serializers import BaseSerializer
+
+FRAGMENT_CACHE_TIMEOUT = getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60 * 60)
+# Bump when a cached serializer's output changes without its field list
+# changing (e.g. a SerializerMethodField body), to retire stored fragments
+FRAGMENT_CACHE_VERSION = 1
+
+
+class FragmentCacheMixin:
+    fragment_cache = True
+
+    @classmethod
+    def fragment_prefix(cls):
+        prefix = cls.__dict__.get('_fragment_prefix')
+        if prefix is None:
+            signature = repr((FRAGMENT_CACHE_VERSION, cls.__module__, cls.__qualname__,
+                              tuple(cls.Meta.fields)))
+            prefix = 'fragment:' + hashlib.sha256(signature.encode()).hexdigest()[:16]
+            cls._fragment_prefix = prefix
+        return prefix
+
+    def fragment_shape(self):
+        """'' for the full field set, else a digest of the fields rendered"""
+        shape = self.__dict__.get('_fragment_shape')
+        if shape is None:
+            cls = type(self)
+            if '_full_shape' not in cls.__dict__:
+                cls._full_shape = _shape(cls())
+            fields = _shape(self)
+            shape = '' if fields == cls._full_shape else (
+                ':' + hashlib.sha256(repr(fields).encode()).hexdigest()[:16])
+            self._fragment_shape = shape
+        return shape
+
+    def fragment_key(self, instance):
+        # File/image URLs are absolute (scheme and host) when a request is
+        # in the context
+        request = self.context.get('request')
+        origin = request.build_absolute_uri('/') if request is not None else ''
+        return (f'{self.fragment_prefix()}{self.fragment_shape()}:{origin}:{instance.pk}:'
+                f'{instance.updated_at.isoformat()}')
+
+    def to_representation(self, instance):
+        if (not self.fragment_cache or instance.pk is None
+                or getattr(instance, 'updated_at', None) is None):
+            return super().to_representation(instance)
+
+        # One memo per response, shared by every nested serializer in it
+        memo = self.root.__dict__.setdefault('_fragment_memo', {})
+        key = self.fragment_key(instance)
+        data = memo.get(key)
+        if data is None:
+            data = cache.get(key)
+            if data is None:
+                data = super().to_representation(instance)
+                cache.set(key, data, FRAGMENT_CACHE_TIMEOUT)
+            memo[key] = data
+        return data
+
+
+def _shape(serializer):
+    serializer = getattr(serializer, 'child', serializer)
+    return tuple((name, type(field).__name__,
+                  _shape(field) if isinstance(field, BaseSerializer) else None)
+                 for name, field in serializer.fields.items())
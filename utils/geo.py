@@ -0,0 +1,239 @@
+"""
+Offline geocoding, geohashes and radius queries.
+
+Free-text locations ("Westlands, Nairobi") are resolved against the bundled
+gazetteer (utils/gazetteer.csv, or GAZETTEER_FILE) to town-level
+coordinates; nothing calls out to a geocoding service. Models that store the
+result keep `latitude`, `longitude` and an indexed `geohash` column.
+
+`within_radius()` finds rows near a point in two steps. First it prunes with
+the geohash index: the circle's bounding box is covered with the smallest
+cells that take at most MAX_COVER_CELLS of them, each queried as a range on
+the column. Then it computes the exact haversine distance and keeps the rows
+inside the radius.
+"""
+import csv
+import functools
+import math
+import operator
+import re
+import unicodedata
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import FloatField, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+
+GAZETTEER_FILE = getattr(settings, 'GAZETTEER_FILE',
+                         Path(__file__).resolve().parent / 'gazetteer.csv')
+NEAR_DEFAULT_RADIUS_KM = getattr(settings, 'NEAR_DEFAULT_RADIUS_KM', 10)
+NEAR_MAX_RADIUS_KM = getattr(settings, 'NEAR_MAX_RADIUS_KM', 500)
+
+GEO_FIELDS = ('latitude', 'longitude', 'geohash')
+# ~5 m cells; any shorter prefix is a range on the same index
+GEOHASH_PRECISION = 9
+# Index ranges per radius query; more cells hug the circle more tightly
+MAX_COVER_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True  # bits alternate longitude, latitude
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        if coordinate >= middle:
+            value = value * 2 + 1
+            interval[0] = middle
+        else:
+            value *= 2
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(degrees of latitude, degrees of longitude) spanned by one cell"""
+    lat_bits = precision * 5 // 2
+    lon_bits = precision * 5 - lat_bits
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_prefixes(latitude, longitude, radius_km):
+    """
+    Geohash prefixes whose cells cover the circle, or [] when the circle is
+    too large (or too close to a pole) for pruning to help.
+    """
+    lat_span = math.degrees(radius_km / EARTH_RADIUS_KM)
+    # Widest point of the circle: the parallel furthest from the equator
+    far_latitude = min(abs(latitude) + lat_span, 90.0)
+    cos_far = math.cos(math.radians(far_latitude))
+    if cos_far < 1e-6:
+        return []
+    lon_span = lat_span / cos_far
+    if lon_span >= 90:
+        return []
+    south, north = max(latitude - lat_span, -90.0), min(latitude + lat_span, 90.0)
+    west, east = longitude - lon_span, longitude + lon_span
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        cell_lat, cell_lon = cell_size(precision)
+        # Cells touched by the box, counting partial cells at both edges
+        rows = math.floor(north / cell_lat) - math.floor(south / cell_lat) + 1
+        columns = math.floor(east / cell_lon) - math.floor(west / cell_lon) + 1
+        if rows * columns <= MAX_COVER_CELLS:
+            break
+    else:
+        return []
+
+    prefixes = set()
+    for row in range(rows):
+        lat = min((math.floor(south / cell_lat) + row + 0.5) * cell_lat, 89.999999)
+        for column in range(columns):
+            lon = (math.floor(west / cell_lon) + column + 0.5) * cell_lon
+            prefixes.add(encode(lat, (lon + 180) % 360 - 180, precision))
+    return sorted(prefixes)
+
+
+def normalize_place(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    text = re.sub(r"['’]", '', text.lower())
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+@functools.lru_cache(maxsize=None)
+def gazetteer():
+    """{normalized name or alias: (latitude, longitude)}; first entry wins"""
+    places = {}
+    with open(GAZETTEER_FILE, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            point = (float(row['latitude']), float(row['longitude']))
+            for name in [row['name'], *(row.get('aliases') or '').split('|')]:
+                key = normalize_place(name)
+                if key:
+                    places.setdefault(key, point)
+    return places
+
+
+def geocode(text):
+    """
+    (latitude, longitude) for a free-text location, or None. Tries the whole
+    text, then each comma-separated part in order ("Westlands, Nairobi"),
+    each also with trailing words dropped ("Nairobi Kenya").
+    """
+    places = gazetteer()
+    for candidate in [text or '', *(text or '').split(',')]:
+        words = normalize_place(candidate).split()
+        for end in range(len(words), 0, -1):
+            point = places.get(' '.join(words[:end]))
+            if point is not None:
+                return point
+    return None
+
+
+def locate(text):
+    """Values for GEO_FIELDS: (latitude, longitude, geohash)"""
+    point = geocode(text) if text else None
+    if point is None:
+        return None, None, ''
+    return point[0], point[1], encode(*point)
+
+
+def parse_point(value):
+    """'lat,lon' or a gazetteer place name; ValueError if neither"""
+    parts = value.split(',')
+    if len(parts) == 2:
+        try:
+            latitude, longitude = float(parts[0]), float(parts[1])
+        except ValueError:
+            pass
+        else:
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError('Coordinates out of range.')
+            return latitude, longitude
+    point = geocode(value)
+    if point is None:
+        raise ValueError(f"Unknown place '{value}'.")
+    return point
+
+
+def distance_km(latitude, longitude):
+    """Haversine distance from the point to each row's latitude/longitude"""
+    lat = math.radians(latitude)
+    d_lat = Radians('latitude') - Value(lat)
+    d_lon = Radians('longitude') - Value(math.radians(longitude))
+    half_chord = (Power(Sin(d_lat / 2), 2)
+                  + Value(math.cos(lat)) * Cos(Radians('latitude'))
+                  * Power(Sin(d_lon / 2), 2))
+    # Least(): rounding can push the root a hair past asin's domain
+    return Value(2 * EARTH_RADIUS_KM) * ASin(
+        Least(Sqrt(half_chord), Value(1.0), output_field=FloatField()))
+
+
+def within_radius(queryset, latitude, longitude, radius_km, annotation='distance_km'):
+    """Rows within `radius_km` of the point, annotated with their distance"""
+    queryset = queryset.filter(latitude__isnull=False)
+    prefixes = covering_prefixes(latitude, longitude, radius_km)
+    if prefixes:
+        # Ranges rather than startswith: SQLite's LIKE is case-insensitive and
+        # can't use the index. '~' sorts after every geohash character.
+        queryset = queryset.filter(functools.reduce(operator.or_, (
+            Q(geohash__gte=prefix, geohash__lt=prefix + '~') for prefix in prefixes)))
+    return queryset.annotate(**{annotation: distance_km(latitude, longitude)}).filter(
+        **{f'{annotation}__lte': radius_km})
+
+
+class NearFilter(filters.BaseFilterBackend):
+    """
+    ?near=lat,lon (or a place name) &radius_km=10
+
+    Nearest first, unless the request asks for another ordering;
+    ?ordering=-distance puts the furthest first.
+    """
+    near_param = 'near'
+    radius_param = 'radius_km'
+    ordering_name = 'distance'
+    annotation = 'distance_km'
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.near_param, '').strip()
+        if not value:
+            return queryset
+        try:
+            latitude, longitude = parse_point(value)
+        except ValueError as e:
+            raise ValidationError({self.near_param: [str(e)]})
+        radius = self.get_radius(request)
+
+        queryset = within_radius(queryset, latitude, longitude, radius, self.annotation)
+        ordering = request.query_params.get(api_settings.ORDERING_PARAM, '').strip()
+        if ordering in ('', self.ordering_name, f'-{self.ordering_name}'):
+            descending = ordering.startswith('-')
+            queryset = queryset.order_by(('-' if descending else '') + self.annotation)
+        return queryset
+
+    def get_radius(self, request):
+        value = request.query_params.get(self.radius_param)
+        if not value:
+            return NEAR_DEFAULT_RADIUS_KM
+        try:
+            radius = float(value)
+        except ValueError:
+            radius = None
+        if radius is None or not 0 < radius <= NEAR_MAX_RADIUS_KM:
+            raise ValidationError({self.radius_param: [
+                f'Must be a number of kilometres up to {NEAR_MAX_RADIUS_KM}.']})
+        return radius
@@ -0,0 +1,104 @@
+"""
+Project logging helpers.
+
+Use a module logger with %-style arguments so nothing is formatted unless the
+record is actually emitted, and wrap API payloads in `payload()` so a debug
+dump is cut down to a bounded size instead of stringifying a whole page:
+
+    logger = logging.getLogger(__name__)
+    logger.debug('Books API response: %s', payload(books_data))
+
+Payload records can additionally be sampled (`PayloadSampleFilter`) and any
+record can be written as one JSON object per line (`JsonLinesFormatter`).
+Levels are set per module through `LOG_LEVELS`, see `parse_levels`.
+"""
+import json
+import logging
+import random
+import reprlib
+
+from django.conf import settings
+
+_payload_repr = reprlib.Repr()
+_payload_repr.maxlevel = 3
+_payload_repr.maxdict = 10
+_payload_repr.maxlist = 10
+_payload_repr.maxstring = 80
+_payload_repr.maxother = 80
+
+
+class payload:
+    """
+    Lazy, size-limited repr of an API payload for log arguments. Nothing is
+    rendered unless a handler formats the record, and then nested containers
+    and long strings are abbreviated before the result is cut to
+    settings.LOG_PAYLOAD_MAX_CHARS (None logs payloads in full).
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        max_chars = getattr(settings, 'LOG_PAYLOAD_MAX_CHARS', 1000)
+        if max_chars is None:
+            return repr(self.value)
+        text = _payload_repr.repr(self.value)
+        if len(text) > max_chars:
+            text = f'{text[:max_chars]}... [truncated]'
+        return text
+
+    __repr__ = __str__
+
+
+class PayloadSampleFilter(logging.Filter):
+    """Let through only `rate` of the records that carry a payload() dump"""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if self.rate >= 1 or not _has_payload(record):
+            return True
+        return random.random() < self.rate
+
+
+def _has_payload(record):
+    args = record.args
+    if isinstance(args, dict):
+        args = args.values()
+    return any(isinstance(arg, payload) for arg in args or ())
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, with any `extra=` fields merged in"""
+
+    reserved = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in self.reserved and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_levels(spec):
+    """
+    Turn "books.views=DEBUG,utils.api_client=WARNING" into LOGGING 'loggers'
+    entries
+    """
+    loggers = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            loggers[name.strip()] = {'level': level.strip().upper()}
+    return loggers
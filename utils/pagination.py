@@ -0,0 +1,222 @@
+import base64
+import json
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qs
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination keyed on the queryset ordering plus the primary key.
+
+    Each page is fetched with a `WHERE (created_at, id) < (:last_created_at,
+    :last_id)` style predicate instead of an OFFSET, so the cost of a page does
+    not grow with its position and rows inserted while a client is paging never
+    shift or duplicate results.
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE or 20
+    page_size_query_param = 'page_size'
+    limit_query_param = 'limit'
+    max_page_size = 100
+
+    # Used when the view/filters did not order the queryset explicitly
+    ordering = ('-created_at',)
+
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.annotations = set(queryset.query.annotations)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor['r'])
+
+        order_by = [_invert(field) if reverse else field
+                    for field in self.ordering]
+        queryset = queryset.order_by(*order_by)
+        if cursor:
+            queryset = queryset.filter(
+                self.get_position_filter(cursor['p'], reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        for param in (self.page_size_query_param, self.limit_query_param):
+            if not param or param not in request.query_params:
+                continue
+            try:
+                size = int(request.query_params[param])
+            except (TypeError, ValueError):
+                continue
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, queryset):
+        """Ordering fields for the keyset, always ending in the primary key"""
+        model = queryset.model
+        ordering = [field for field in queryset.query.order_by
+                    if isinstance(field, str) and field != '?']
+        if not ordering or not all(_is_keyset_field(queryset, f) for f in ordering):
+            ordering = list(self.ordering)
+
+        pk_name = model._meta.pk.name
+        names = {field.lstrip('-') for field in ordering}
+        if pk_name not in names and 'pk' not in names:
+            descending = ordering[-1].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return tuple(ordering)
+
+    def get_position_filter(self, position, reverse):
+        """(f1, f2, ..., pk) > (v1, v2, ..., id) expanded into plain lookups"""
+        condition = Q()
+        equal_so_far = Q()
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            descending = field.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal_so_far & Q(**{f'{name}__{lookup}': value})
+            equal_so_far &= Q(**{name: value})
+        return condition
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def encode_cursor(self, instance, reverse):
+        if isinstance(instance, dict):
+            # A .values() row; Field.value_to_string() wants attributes
+            instance = SimpleNamespace(_meta=self.model._meta, **instance)
+        position = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            if name in self.annotations:
+                position.append(getattr(instance, name))
+            else:
+                model_field = _get_field(instance._meta.model, name)
+                position.append(model_field.value_to_string(instance))
+
+        payload = json.dumps(
+            {'o': self.ordering, 'p': position, 'r': int(reverse)},
+            separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if list(cursor['o']) != list(self.ordering):
+                raise ValueError('Cursor belongs to a different ordering')
+            if len(cursor['p']) != len(self.ordering):
+                raise ValueError('Cursor position does not match the ordering')
+            cursor['p'] = [
+                value if field.lstrip('-') in self.annotations
+                else _get_field(model, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, cursor['p'])
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+
+def _invert(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _get_field(model, name):
+    if name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+
+def _is_keyset_field(queryset, field):
+    name = field.lstrip('-')
+    if name in queryset.query.annotations:
+        # Annotations such as a search rank; the value is stored as-is
+        return True
+    if '__' in name:
+        return False
+    try:
+        model_field = _get_field(queryset.model, name)
+    except FieldDoesNotExist:
+        return False
+    return model_field.concrete and not model_field.null
+
+
+def cursor_from_url(url):
+    """Pull the cursor query parameter out of a next/previous link"""
+    if not url:
+        return None
+    values = parse_qs(urlsplit(url).query).get(
+        KeysetPagination.cursor_query_param)
+    return values[0] if values else None
+
+
+def cursor_page_links(request, page):
+    """
+    Map the API's next/previous links onto the template page being rendered,
+    keeping the current filters in the query string.
+    """
+    links = {}
+    for name in ('next', 'previous'):
+        cursor = cursor_from_url(page.get(name)) if isinstance(page, dict) else None
+        if cursor:
+            params = request.GET.copy()
+            params[KeysetPagination.cursor_query_param] = cursor
+            links[f'{name}_page_url'] = f'?{params.urlencode()}'
+        else:
+            links[f'{name}_page_url'] = None
+    return links
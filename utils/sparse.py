@@ -0,0 +1,162 @@
+"""
+Sparse fieldsets and opt-in expansion.
+
+    ?fields=id,status,book.title,borrower.username
+    ?expand=book.owner
+
+`fields` keeps only the listed fields; a dotted name selects inside a nested
+serializer, and a nested field listed bare keeps all of its own fields.
+`expand` swaps a compact field for the full object it stands for (a book's
+`owner` username becomes the owner's record). Without either parameter
+responses are unchanged.
+
+`SparseFieldsMixin` applies the selection to each serializer in the tree.
+`SparseQuerysetMixin` does the matching on the view's queryset:
+`select_related` only for the relations that are rendered and `only()` for
+the columns that are, so trimming a field also stops it being read. A
+SerializerMethodField or model property names the columns it reads in the
+serializer's `sparse_sources`.
+"""
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def parse_field_tree(value):
+    """'id,book.title,book.author' -> {'id': {}, 'book': {'title': {}, 'author': {}}}"""
+    tree = {}
+    for path in (value or '').split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name.strip(), {})
+    return tree
+
+
+def _subtree(tree, path):
+    """The part of `tree` for the serializer at `path`; None means everything"""
+    if tree is None:
+        return None
+    for name in path:
+        if name not in tree:
+            return None if not tree else {}
+        tree = tree[name]
+    return tree or None
+
+
+def _is_serializer(field):
+    return isinstance(field, serializers.BaseSerializer)
+
+
+class SparseFieldsMixin:
+    # {field name: callable returning the serializer field to expand it into}
+    expandable_fields = {}
+    # {field name: model columns it reads}, for fields whose source is not a
+    # column of its own (method fields, properties, related objects)
+    sparse_sources = {}
+
+    def sparse_path(self):
+        path = []
+        node = self
+        while node is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return path[::-1]
+
+    def get_fields(self):
+        fields = super().get_fields()
+        context = self.context
+        if FIELDS_PARAM not in context and EXPAND_PARAM not in context:
+            return fields
+        path = self.sparse_path()
+
+        for name, subtree in (_subtree(context.get(EXPAND_PARAM), path) or {}).items():
+            # A leaf is expanded here; anything else names a nested serializer
+            if subtree and name in fields and _is_serializer(fields[name]):
+                continue
+            if subtree or name not in self.expandable_fields:
+                raise ValidationError({EXPAND_PARAM: [
+                    f"'{'.'.join(path + [name])}' cannot be expanded."]})
+            fields[name] = self.expandable_fields[name]()
+
+        wanted = _subtree(context.get(FIELDS_PARAM), path)
+        if wanted is None:
+            return fields
+        unknown = set(wanted) - set(fields)
+        if unknown:
+            raise ValidationError({FIELDS_PARAM: [
+                f"Unknown field '{'.'.join(path + [name])}'." for name in sorted(unknown)]})
+        for name, subfields in wanted.items():
+            if subfields and not _is_serializer(fields[name]):
+                raise ValidationError({FIELDS_PARAM: [
+                    f"'{'.'.join(path + [name])}' has no fields to select."]})
+        return {name: field for name, field in fields.items() if name in wanted}
+
+
+def queryset_plan(serializer, prefix=''):
+    """(columns, relations) that `serializer`'s selected fields read"""
+    model = serializer.Meta.model
+    columns = {f'{prefix}{model._meta.pk.attname}'}
+    if getattr(serializer, 'fragment_cache', False):
+        columns.add(f'{prefix}updated_at')  # part of the fragment key
+    relations = set()
+    sources = getattr(serializer, 'sparse_sources', {})
+    for name, field in serializer.fields.items():
+        if _is_serializer(field):
+            relation = field.source
+            child = field.child if hasattr(field, 'child') else field
+            relations.add(prefix + relation)
+            columns.add(prefix + relation)  # the FK itself
+            child_columns, child_relations = queryset_plan(child, f'{prefix}{relation}__')
+            columns |= child_columns
+            relations |= child_relations
+        elif name in sources:
+            for source in sources[name]:
+                columns.add(prefix + source)
+                if '__' in source:
+                    relations.add(prefix + source.rsplit('__', 1)[0])
+        elif field.source != '*':
+            columns.add(prefix + field.source.replace('.', '__'))
+    return columns, relations
+
+
+class SparseQuerysetMixin:
+    """
+    For generic views: put the parsed `fields`/`expand` trees in the
+    serializer context and trim the filtered queryset to what will be
+    rendered.
+    Columns the view reads besides the serializer's (validators, cursor
+    ordering, permission checks) go in `sparse_required_columns`.
+    """
+    sparse_required_columns = ()
+
+    def sparse_params(self):
+        params = self.request.query_params
+        return {key: parse_field_tree(params[key])
+                for key in (FIELDS_PARAM, EXPAND_PARAM) if params.get(key)}
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context.update(self.sparse_params())
+        return context
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method != 'GET' or not self.sparse_params():
+            return queryset
+        serializer = self.get_serializer_class()(context=self.get_serializer_context())
+        columns, relations = queryset_plan(serializer)
+        for column in self.sparse_required_columns:
+            columns.add(column)
+            if '__' in column:
+                relations.add(column.rsplit('__', 1)[0])
+        # select_related() without arguments would follow every FK
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*sorted(relations))
+        return queryset.only(*sorted(columns))
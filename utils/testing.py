@@ -0,0 +1,32 @@
+import re
+
+from django.db import connection
+
+
+class QueryPlanAssertions:
+    """TestCase mixin for checking SQLite query plans of hot queries"""
+
+    def get_query_plan(self, queryset):
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, index_name=None, allow_sort=True):
+        """
+        Fail if the plan scans a table without an index, doesn't use
+        `index_name` (when given), or sorts in a temp b-tree when `allow_sort`
+        is False.
+        """
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan checks are written for SQLite')
+
+        plan = self.get_query_plan(queryset)
+        table = queryset.model._meta.db_table
+
+        full_scan = re.search(rf'\bSCAN {re.escape(table)}\b(?! USING)', plan)
+        self.assertIsNone(full_scan, f'Full table scan of {table}:\n{plan}')
+        if index_name:
+            self.assertIn(index_name, plan,
+                          f'Expected {index_name} to be used:\n{plan}')
+        if not allow_sort:
+            self.assertNotIn('USE TEMP B-TREE', plan,
+                             f'Expected the index to provide the ordering:\n{plan}')
+        return plan
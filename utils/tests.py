@@ -0,0 +1,402 @@
+import base64
+import json
+import logging
+import math
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse, JsonResponse
+from django.test import (
+    LiveServerTestCase, RequestFactory, SimpleTestCase, TestCase, override_settings)
+from django.urls import include, path
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from books.models import Book
+from entities.models import User
+from transactions.models import BorrowTransaction
+from utils import geo
+from utils.api_client import (
+    APIClient as PageAPIClient, TRANSPORT_HTTP, TRANSPORT_INPROCESS, get_http_adapter,
+    get_http_session, get_http_timeout, validator_cache)
+from utils.log import JsonLinesFormatter, PayloadSampleFilter, payload
+from utils.pagination import KeysetPagination
+from utils.timing import SESSION_STAFF_KEY, wants_server_timing
+
+
+class PayloadLoggingTests(SimpleTestCase):
+    books = [{'id': i, 'title': 'x' * 500} for i in range(1000)]
+
+    def record(self, *args):
+        return logging.makeLogRecord({'msg': 'Books: %s', 'args': args})
+
+    @override_settings(LOG_PAYLOAD_MAX_CHARS=200)
+    def test_payload_is_truncated_when_formatted(self):
+        message = self.record(payload(self.books)).getMessage()
+        self.assertLess(len(message), 300)
+        self.assertTrue(message.endswith('[truncated]'))
+
+    def test_sampling_only_applies_to_payload_dumps(self):
+        sample_none = PayloadSampleFilter(rate=0)
+        self.assertFalse(sample_none.filter(self.record(payload(self.books))))
+        self.assertTrue(sample_none.filter(self.record(len(self.books))))
+
+    def test_json_lines_include_extra_fields(self):
+        record = self.record(3)
+        record.duration_ms = 12.5
+        entry = json.loads(JsonLinesFormatter().format(record))
+        self.assertEqual(entry['message'], 'Books: 3')
+        self.assertEqual(entry['duration_ms'], 12.5)
+
+
+@override_settings(REQUEST_TIMING_ENABLED=True, SERVER_TIMING_PUBLIC=False)
+class RequestTimingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!', is_staff=True)
+        cls.member = User.objects.create_user('member', password='pass12345!')
+        Book.objects.create(owner=cls.owner, title='Dune', author='Herbert')
+
+    def test_api_response_has_server_timing(self):
+        api = APIClient()
+        api.force_authenticate(self.owner)
+        with self.assertLogs('utils.timing', 'INFO') as logs:
+            response = api.get('/api/books/')
+
+        metrics = dict(
+            part.split(';', 1)[0:2] for part in response['Server-Timing'].split(', '))
+        self.assertIn('total', metrics)
+        self.assertIn('db', metrics)
+        self.assertIn('serializer', metrics)
+
+        record = logs.records[0]
+        self.assertEqual(record.path, '/api/books/')
+        self.assertEqual(record.status, 200)
+        self.assertGreater(record.db_queries, 0)
+
+    def test_template_view_times_api_calls_and_rendering(self):
+        self.client.post('/login/', {'username': 'owner', 'password': 'pass12345!'})
+        response = self.client.get('/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('api;dur=', response['Server-Timing'])
+        self.assertIn('template;dur=', response['Server-Timing'])
+
+    def test_staff_check_adds_no_query(self):
+        request = RequestFactory().get('/books/')
+        request.user = AnonymousUser()
+        request.session = {'user': {'id': self.owner.pk}, SESSION_STAFF_KEY: True}
+        with self.assertNumQueries(0):
+            self.assertTrue(wants_server_timing(request))
+            request.session[SESSION_STAFF_KEY] = False
+            self.assertFalse(wants_server_timing(request))
+
+    def test_header_only_for_staff_unless_public(self):
+        api = APIClient()
+        api.force_authenticate(self.member)
+        with self.assertLogs('utils.timing', 'INFO'):
+            response = api.get('/api/books/')
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertFalse(APIClient().get('/api/books/').has_header('Server-Timing'))
+        self.client.post('/login/', {'username': 'member', 'password': 'pass12345!'})
+        self.assertFalse(self.client.get('/books/').has_header('Server-Timing'))
+        self.assertIs(self.client.session[SESSION_STAFF_KEY], False)
+
+        with self.settings(SERVER_TIMING_PUBLIC=True):
+            self.assertTrue(api.get('/api/books/').has_header('Server-Timing'))
+
+    @override_settings(REQUEST_TIMING_ENABLED=False)
+    def test_no_header_or_log_when_disabled(self):
+        api = APIClient()
+        api.force_authenticate(self.owner)
+        with self.assertNoLogs('utils.timing', 'INFO'):
+            response = api.get('/api/books/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Server-Timing'))
+
+
+class GeohashTests(SimpleTestCase):
+    def test_encode_and_gazetteer(self):
+        self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(geo.geocode('Westlands, Nairobi'), (-1.2676, 36.8108))
+        self.assertEqual(geo.geocode('NAIROBI Kenya'), (-1.2864, 36.8172))
+        self.assertEqual(geo.geocode('Muranga'), geo.geocode("Murang'a"))
+        self.assertIsNone(geo.geocode('Atlantis'))
+
+    def test_prefixes_cover_the_circle(self):
+        for latitude, longitude, radius in ((-1.29, 36.82, 10), (59.9, 10.75, 3),
+                                            (0.0, 179.99, 25), (-33.9, 18.4, 120)):
+            prefixes = geo.covering_prefixes(latitude, longitude, radius)
+            self.assertTrue(prefixes)
+            for bearing in range(0, 360, 15):
+                # A point just inside the circle on this bearing
+                d = (radius * 0.999) / geo.EARTH_RADIUS_KM
+                lat1, lon1, b = map(math.radians, (latitude, longitude, bearing))
+                lat2 = math.asin(math.sin(lat1) * math.cos(d)
+                                 + math.cos(lat1) * math.sin(d) * math.cos(b))
+                lon2 = lon1 + math.atan2(math.sin(b) * math.sin(d) * math.cos(lat1),
+                                         math.cos(d) - math.sin(lat1) * math.sin(lat2))
+                point = geo.encode(math.degrees(lat2),
+                                   (math.degrees(lon2) + 180) % 360 - 180)
+                self.assertTrue(any(point.startswith(p) for p in prefixes),
+                                (latitude, longitude, radius, bearing))
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user('owner', password='pass12345!')
+        Book.objects.bulk_create(
+            [Book(owner=cls.owner, title=f'Book {i}', author='A') for i in range(7)])
+        # Equal timestamps: only the pk can order them
+        Book.objects.update(created_at=timezone.now())
+        cls.newest_first = list(Book.objects.order_by('-created_at', '-id'))
+
+    def paginate(self, url, queryset=None):
+        request = Request(APIRequestFactory().get(url))
+        paginator = KeysetPagination()
+        queryset = Book.objects.all() if queryset is None else queryset
+        page = paginator.paginate_queryset(queryset, request)
+        return page, paginator
+
+    def query(self, link):
+        return link[link.index('?'):]
+
+    def test_page_size_and_limit_are_parsed_and_capped(self):
+        for query, size in (('', KeysetPagination.page_size), ('?page_size=3', 3),
+                            ('?limit=2', 2), ('?page_size=500', 100),
+                            ('?page_size=0', KeysetPagination.page_size),
+                            ('?page_size=x&limit=4', 4), ('?limit=-1', KeysetPagination.page_size)):
+            _, paginator = self.paginate(f'/api/books/{query}')
+            self.assertEqual(paginator.page_size, size, query)
+
+    def test_equal_timestamps_break_ties_on_pk(self):
+        page, paginator = self.paginate('/api/books/?page_size=3')
+        self.assertEqual(paginator.ordering, ('-created_at', '-id'))
+        seen = list(page)
+        while paginator.get_next_link():
+            page, paginator = self.paginate(self.query(paginator.get_next_link()))
+            seen += page
+        self.assertEqual(seen, self.newest_first)
+
+    def test_previous_link_reverses(self):
+        first, paginator = self.paginate('/api/books/?page_size=3')
+        self.assertIsNone(paginator.get_previous_link())
+        second, paginator = self.paginate(self.query(paginator.get_next_link()))
+        back, paginator = self.paginate(self.query(paginator.get_previous_link()))
+        self.assertEqual(back, first)
+        self.assertIsNone(paginator.get_previous_link())
+        self.assertEqual(second, self.newest_first[3:6])
+
+        _, paginator = self.paginate('/api/books/?page_size=3',
+                                     Book.objects.order_by('title'))
+        self.assertEqual(paginator.ordering, ('title', 'id'))
+
+    def test_inserts_between_fetches_do_not_shift_pages(self):
+        first, paginator = self.paginate('/api/books/?page_size=3')
+        Book.objects.create(owner=self.owner, title='Newer', author='A')
+        second, _ = self.paginate(self.query(paginator.get_next_link()))
+        self.assertEqual(first + second, self.newest_first[:6])
+
+    def test_malformed_or_tampered_cursor_is_404(self):
+        _, paginator = self.paginate('/api/books/?page_size=3')
+        valid = parse_qs(urlsplit(paginator.get_next_link()).query)['cursor'][0]
+        decoded = json.loads(base64.urlsafe_b64decode(valid))
+
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        for cursor in ('not-base64!', encode(['a list']), encode({'o': decoded['o']}),
+                       encode({**decoded, 'o': ['title', 'id']}),
+                       encode({**decoded, 'p': decoded['p'][:1]}),
+                       encode({**decoded, 'p': ['yesterday', decoded['p'][1]]})):
+            with self.assertRaises(NotFound, msg=cursor):
+                self.paginate(f'/api/books/?cursor={cursor}')
+        self.assertEqual(APIClient().get('/api/books/?cursor=garbage').status_code, 404)
+
+
+def plain_text_view(request):
+    return HttpResponse('Teapot says no', status=418, content_type='text/plain')
+
+
+def plain_json_view(request):
+    return JsonResponse({'fee': '1.50', 'items': [1, 2]})
+
+
+def plain_cookie_view(request):
+    response = JsonResponse({'cookies': request.COOKIES})
+    response.set_cookie('api_session', request.GET.get('user', ''))
+    return response
+
+
+# ROOT_URLCONF for APIClientTransportTests: the project's URLs plus two
+# views that bypass DRF
+urlpatterns = [
+    path('api/plain/text/', plain_text_view),
+    path('api/plain/json/', plain_json_view),
+    path('api/plain/cookie/', plain_cookie_view),
+    path('', include('borrowedwords.urls')),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class APIClientTransportTests(LiveServerTestCase):
+    """The in-process transport must answer exactly like the HTTP one"""
+
+    def setUp(self):
+        validator_cache.clear()
+        self.addCleanup(validator_cache.clear)
+        # Drop pooled keep-alive connections before the live server stops
+        self.addCleanup(get_http_adapter().close)
+        self.lender = User.objects.create_user('lender', password='pass12345!')
+        self.borrower = User.objects.create_user('borrower', password='pass12345!')
+        self.book = Book.objects.create(owner=self.lender, title='Dune', author='Herbert',
+                                        daily_rental_price=Decimal('2.50'))
+
+    def page_request(self, user=None, access=None):
+        request = RequestFactory().get('/dashboard/')
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        if user is not None:
+            refresh = RefreshToken.for_user(user)
+            request.session.update({
+                'user': {'id': user.pk, 'username': user.username},
+                'access_token': access or str(refresh.access_token),
+                'refresh_token': str(refresh),
+            })
+        return request
+
+    def both(self, call, user=None, access=None):
+        """call(client) over each transport, each with a fresh page request"""
+        results = {}
+        with self.settings(API_BASE_URL=self.live_server_url):
+            for transport in (TRANSPORT_INPROCESS, TRANSPORT_HTTP):
+                request = self.page_request(user, access)
+                results[transport] = (call(PageAPIClient(request, transport=transport)),
+                                      request.session)
+        return results[TRANSPORT_INPROCESS], results[TRANSPORT_HTTP]
+
+    def test_decimals_render_like_http(self):
+        def confirm(client):
+            loan = BorrowTransaction.objects.create(
+                book=self.book, borrower=self.borrower, lender=self.lender,
+                status='RETURNED', final_rental_fee=Decimal('12.50'))
+            return client.post(f'/transactions/{loan.pk}/confirm-return/')
+
+        (inprocess, _), (http, _) = self.both(confirm, self.lender)
+        # DRF's JSON encoder writes a bare Decimal as a number
+        self.assertEqual(http['rental_fee'], 12.5)
+        self.assertIs(type(inprocess['rental_fee']), type(http['rental_fee']))
+        self.assertEqual(inprocess['rental_fee'], http['rental_fee'])
+        self.assertEqual(inprocess['transaction']['status'], 'COMPLETED')
+        self.assertEqual(http['transaction']['status'], 'COMPLETED')
+
+    def test_expired_token_is_refreshed_on_both(self):
+        expired = AccessToken.for_user(self.lender)
+        expired.set_exp(lifetime=-timedelta(minutes=1))
+
+        def create(client):
+            return client.post('/books/', {'title': 'Emma', 'author': 'Austen'})
+
+        (inprocess, inprocess_session), (http, http_session) = self.both(
+            create, self.lender, access=str(expired))
+        self.assertEqual(inprocess['title'], 'Emma')
+        self.assertEqual(http['title'], 'Emma')
+        for session in (inprocess_session, http_session):
+            self.assertNotEqual(session['access_token'], str(expired))
+
+    def test_invalid_token_is_refreshed_on_both(self):
+        def create(client):
+            return client.post('/books/', {'title': 'Emma', 'author': 'Austen'})
+
+        (inprocess, inprocess_session), (http, http_session) = self.both(
+            create, self.lender, access='not-a-token')
+        self.assertEqual(inprocess['title'], 'Emma')
+        self.assertEqual(http['title'], 'Emma')
+        for session in (inprocess_session, http_session):
+            self.assertNotEqual(session['access_token'], 'not-a-token')
+
+    def test_failed_refresh_flushes_session_on_both(self):
+        def create(client):
+            client.request.session['refresh_token'] = 'not-a-token'
+            return client.post('/books/', {'title': 'Emma', 'author': 'Austen'})
+
+        (inprocess, inprocess_session), (http, http_session) = self.both(
+            create, self.lender, access='not-a-token')
+        self.assertEqual(inprocess['code'], 'token_not_valid')
+        self.assertEqual(http, inprocess)
+        self.assertEqual(dict(inprocess_session), {})
+        self.assertEqual(dict(http_session), {})
+        self.assertFalse(Book.objects.filter(title='Emma').exists())
+
+    def test_error_statuses_match(self):
+        (inprocess, _), (http, _) = self.both(
+            lambda client: client.get('/transactions/999999/'), self.lender)
+        self.assertEqual(inprocess, http)
+        self.assertIn('detail', inprocess)
+
+        (inprocess, _), (http, _) = self.both(
+            lambda client: client.post('/books/', {'title': ''}), self.lender)
+        self.assertEqual(inprocess, http)
+        self.assertIn('title', inprocess)
+
+    def test_non_drf_views_match(self):
+        (inprocess, _), (http, _) = self.both(lambda client: client.get('/plain/json/'))
+        self.assertEqual(inprocess, {'fee': '1.50', 'items': [1, 2]})
+        self.assertEqual(http, inprocess)
+
+        (inprocess, _), (http, _) = self.both(lambda client: client.get('/plain/text/'))
+        self.assertEqual(inprocess, {'error': 'HTTP 418', 'detail': 'Teapot says no'})
+        self.assertEqual(http, inprocess)
+
+    def test_cookies_are_not_kept_between_users(self):
+        with self.settings(API_BASE_URL=self.live_server_url):
+            first = PageAPIClient(self.page_request(self.lender), transport=TRANSPORT_HTTP)
+            self.assertEqual(first.get('/plain/cookie/?user=lender'), {'cookies': {}})
+            second = PageAPIClient(self.page_request(self.borrower), transport=TRANSPORT_HTTP)
+            self.assertEqual(second.get('/plain/cookie/?user=borrower'), {'cookies': {}})
+        self.assertEqual(len(get_http_session().cookies), 0)
+
+
+class HTTPSessionTests(SimpleTestCase):
+
+    def in_thread(self, func):
+        result = []
+        thread = threading.Thread(target=lambda: result.append(func()))
+        thread.start()
+        thread.join()
+        return result[0]
+
+    def test_session_per_thread_sharing_one_adapter(self):
+        session = get_http_session()
+        self.assertIs(get_http_session(), session)
+        other = self.in_thread(get_http_session)
+        self.assertIsNot(other, session)
+        self.assertIsNot(self.in_thread(get_http_session), other)
+
+        adapter = get_http_adapter()
+        for each in (session, other):
+            self.assertIs(each.get_adapter('http://api.example/'), adapter)
+            self.assertIs(each.get_adapter('https://api.example/'), adapter)
+        self.assertIs(self.in_thread(get_http_adapter), adapter)
+
+    @override_settings(API_CLIENT_CONNECT_TIMEOUT=1.5, API_CLIENT_READ_TIMEOUT=7,
+                       API_BASE_URL='http://api.example')
+    def test_timeouts_come_from_settings(self):
+        self.assertEqual(get_http_timeout(), (1.5, 7))
+        request = RequestFactory().get('/books/')
+        with mock.patch.object(get_http_session(), 'request') as send:
+            send.return_value.status_code = 204
+            send.return_value.headers = {}
+            PageAPIClient(request, transport=TRANSPORT_HTTP).get('/books/')
+            PageAPIClient(request, transport=TRANSPORT_HTTP).post('/books/', {'title': 'x'})
+        self.assertEqual([call.kwargs['timeout'] for call in send.call_args_list],
+                         [(1.5, 7), (1.5, 7)])
@@ -0,0 +1,174 @@
+"""
+Per-request timing.
+
+`RequestTimingMiddleware` collects, for every request:
+
+  db          time in SQL, via connection.execute_wrapper, plus the query count
+  api         time in APIClient.send (every get/post/make_authenticated_request
+              goes through it), plus the call count
+  serializer  time building serializer .data
+  template    time rendering Django templates
+  total       wall time through the rest of the middleware stack
+
+and reports them in one `utils.timing` INFO log line whose fields are passed
+as `extra=` (JSON-lines handlers keep them as keys), and in a `Server-Timing`
+header for staff users (everyone with SERVER_TIMING_PUBLIC).
+
+It is off unless REQUEST_TIMING_ENABLED (default: DEBUG); when off, the
+middleware unloads itself and nothing is patched.
+
+Spans can overlap: an in-process APIClient call runs its own queries and
+serializers, so api time includes the db and serializer time it caused.
+Re-entrant spans of the same kind (nested serializers, includes) are counted
+once. Outside a request nothing is recorded.
+"""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('db', 'api', 'serializer', 'template')
+# Session key holding the template-view user's is_staff (entities.views.login_view)
+SESSION_STAFF_KEY = 'is_staff'
+
+_current = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    __slots__ = ('durations', 'counts', 'depth')
+
+    def __init__(self):
+        self.durations = dict.fromkeys(METRICS, 0.0)
+        self.counts = dict.fromkeys(METRICS, 0)
+        self.depth = dict.fromkeys(METRICS, 0)
+
+
+@contextmanager
+def timed(metric):
+    """Add the time spent in the block to the current request's `metric`"""
+    timings = _current.get()
+    if timings is None or timings.depth[metric]:
+        yield
+        return
+
+    timings.depth[metric] += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[metric] += time.perf_counter() - start
+        timings.counts[metric] += 1
+        timings.depth[metric] -= 1
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    with timed('db'):
+        return execute(sql, params, many, context)
+
+
+_installed = False
+
+
+def install():
+    """
+    Time DRF serializer output and Django template rendering. Both are
+    third-party code without a hook, so their entry points are wrapped once
+    per process.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.template.backends.django import Template
+    from rest_framework.serializers import BaseSerializer
+
+    render = Template.render
+
+    def timed_render(self, *args, **kwargs):
+        with timed('template'):
+            return render(self, *args, **kwargs)
+
+    Template.render = timed_render
+
+    data = BaseSerializer.data
+
+    def timed_data(self):
+        with timed('serializer'):
+            return data.fget(self)
+
+    BaseSerializer.data = property(timed_data)
+
+
+def server_timing_header(timings, total):
+    parts = [f'total;dur={total * 1000:.1f}']
+    for metric in METRICS:
+        count = timings.counts[metric]
+        if not count:
+            continue
+        entry = f'{metric};dur={timings.durations[metric] * 1000:.1f}'
+        if metric in ('db', 'api'):
+            noun = 'queries' if metric == 'db' else 'calls'
+            entry += f';desc="{count} {noun}"'
+        parts.append(entry)
+    return ', '.join(parts)
+
+
+def wants_server_timing(request):
+    """Timings reveal how the site works inside, so only staff see them"""
+    if getattr(settings, 'SERVER_TIMING_PUBLIC', False):
+        return True
+    # DRF copies the user it authenticated (JWT too) onto the HttpRequest
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    # Template views keep the API login in the session instead; login_view
+    # stores the staff bit there so no query is added to the timed request
+    session = getattr(request, 'session', None)
+    return bool(session is not None and session.get(SESSION_STAFF_KEY))
+
+
+class RequestTimingMiddleware:
+    """Put this first in MIDDLEWARE so `total` covers the whole stack"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_db_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+
+        if wants_server_timing(request):
+            response['Server-Timing'] = server_timing_header(timings, total)
+        if logger.isEnabledFor(logging.INFO):
+            fields = {'total_ms': round(total * 1000, 1)}
+            for metric in METRICS:
+                fields[f'{metric}_ms'] = round(timings.durations[metric] * 1000, 1)
+            fields['db_queries'] = timings.counts['db']
+            fields['api_calls'] = timings.counts['api']
+            logger.info(
+                '%s %s %s %.1fms (db %.1fms/%d queries, api %.1fms/%d calls)',
+                request.method, request.path, response.status_code,
+                fields['total_ms'], fields['db_ms'], fields['db_queries'],
+                fields['api_ms'], fields['api_calls'],
+                extra={'method': request.method, 'path': request.path,
+                       'status': response.status_code, **fields})
+        return response